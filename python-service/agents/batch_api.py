@@ -0,0 +1,148 @@
+"""
+离线批量分析模块（OpenAI 兼容 Batch API）
+
+夜间对整个股票池重新筛选时不需要实时返回结果。本模块把每只股票每个分析角色
+的请求写成一行 JSONL，上传后创建批处理任务（通常费用减半，且不占用实时接口的
+限流额度）。任务完成后下载结果，作为各股票的预填分析结果，只需在线运行 synthesizer。
+
+使用流程:
+1. batch_id = await submit_batch_analysis(symbols, stock_data_map)
+2. 定期调用 complete_batch_analysis(batch_id, symbols, stock_data_map)，
+   任务未完成时返回 None；批处理失败或过期时回退到实时分析
+"""
+
+import json
+from typing import Dict, List, Optional
+
+import litellm
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .crew_agents import (
+    AGENT_TEMPERATURES,
+    ANALYST_ROLES,
+    agent_max_tokens,
+    build_agent_contexts,
+    build_single_agent_messages,
+    get_llm,
+    run_crew_analyses,
+)
+
+# custom_id 中股票代码与角色的分隔符
+_CUSTOM_ID_SEP = "::"
+
+# 批处理终止但未成功的状态，此时回退到实时分析
+_BATCH_FAILED_STATUSES = ("failed", "expired", "cancelled")
+
+
+def build_batch_requests(
+    symbols: List[str], stock_data_map: Dict[str, dict], model: str
+) -> List[dict]:
+    """生成批处理请求（每只股票每个分析角色一行），消息内容与实时调用一致"""
+    requests = []
+    for symbol in symbols:
+        stock_data = stock_data_map[symbol]
+        stock_name = stock_data.get("basic", {}).get("name", symbol)
+        _, role_contexts = build_agent_contexts(symbol, stock_data)
+        for role in ANALYST_ROLES:
+            requests.append(
+                {
+                    "custom_id": f"{symbol}{_CUSTOM_ID_SEP}{role}",
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": model,
+                        "messages": build_single_agent_messages(
+                            role, stock_name, symbol, role_contexts[role]
+                        ),
+                        "temperature": AGENT_TEMPERATURES.get(role, 0.5),
+                        "max_tokens": agent_max_tokens(role),
+                    },
+                }
+            )
+    return requests
+
+
+def parse_batch_output(content: str) -> Dict[str, Dict[str, str]]:
+    """解析批处理输出文件，返回 {股票代码: {角色: 分析文本}}，失败的请求跳过
+
+    输出文件每只股票每个角色一行，逐行解析时优先使用 orjson。
+    """
+    results: Dict[str, Dict[str, str]] = {}
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        record = orjson.loads(line) if orjson is not None else json.loads(line)
+        response = record.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        try:
+            text = response["body"]["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            continue
+        symbol, _, role = record["custom_id"].rpartition(_CUSTOM_ID_SEP)
+        if text:
+            results.setdefault(symbol, {})[role] = text
+    return results
+
+
+async def submit_batch_analysis(
+    symbols: List[str], stock_data_map: Dict[str, dict]
+) -> str:
+    """上传批处理请求并创建批处理任务，返回 batch_id"""
+    llm = get_llm()
+    credentials = {"api_key": llm.api_key, "api_base": llm.api_base}
+    lines = build_batch_requests(symbols, stock_data_map, llm.model)
+    payload = "\n".join(json.dumps(line, ensure_ascii=False) for line in lines)
+
+    input_file = await litellm.acreate_file(
+        file=("analysis.jsonl", payload.encode("utf-8")),
+        purpose="batch",
+        **credentials,
+    )
+    batch = await litellm.acreate_batch(
+        completion_window="24h",
+        endpoint="/v1/chat/completions",
+        input_file_id=input_file.id,
+        **credentials,
+    )
+    print(f"[Batch] 已提交 {len(lines)} 个请求，batch_id: {batch.id}")
+    return batch.id
+
+
+async def fetch_batch_results(batch_id: str) -> Optional[Dict[str, Dict[str, str]]]:
+    """获取批处理结果
+
+    Returns:
+        {股票代码: {角色: 分析文本}}；任务仍在运行时返回 None，
+        失败/过期/取消时返回空字典
+    """
+    llm = get_llm()
+    credentials = {"api_key": llm.api_key, "api_base": llm.api_base}
+    batch = await litellm.aretrieve_batch(batch_id, **credentials)
+
+    if batch.status in _BATCH_FAILED_STATUSES:
+        print(f"[Batch] {batch_id} 状态为 {batch.status}，回退到实时分析")
+        return {}
+    if batch.status != "completed" or not batch.output_file_id:
+        return None
+
+    content = await litellm.afile_content(batch.output_file_id, **credentials)
+    return parse_batch_output(content.text)
+
+
+async def complete_batch_analysis(
+    batch_id: str, symbols: List[str], stock_data_map: Dict[str, dict]
+) -> Optional[Dict[str, dict]]:
+    """批处理完成后在线运行 synthesizer，缺失的分析角色实时补跑
+
+    Returns:
+        {symbol: 分析结果}；批处理仍在运行时返回 None
+    """
+    prefilled = await fetch_batch_results(batch_id)
+    if prefilled is None:
+        return None
+    return await run_crew_analyses(symbols, stock_data_map, prefilled=prefilled)
@@ -0,0 +1,205 @@
+"""
+Agent 响应缓存模块
+
+同一交易日内对相同股票数据的重复分析，会产生几乎相同的 Agent 输出。
+本模块提供基于文件的 TTL 缓存，命中时直接返回已缓存的分析文本，
+跳过对应的 LLM 调用。
+
+存储结构:
+- <cache_dir>/<symbol>/<role>.json
+- 每个文件保存 {"key", "created_at", "value"}，key 为输入数据的哈希
+- 最近读写的记录同时保存在进程内 LRU 中，命中时无需读取文件
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import xxhash  # 可选：非加密哈希，计算缓存 key 比 md5 快一个数量级
+except ImportError:
+    xxhash = None
+
+logger = logging.getLogger(__name__)
+
+
+# 各角色缓存有效期（秒）：技术面随行情变化较快，基本面/宏观变化较慢
+ROLE_CACHE_TTL = {
+    "value": 12 * 3600,
+    "technical": 6 * 3600,
+    "growth": 24 * 3600,
+    "fundamental": 24 * 3600,
+    "risk": 12 * 3600,
+    "macro": 24 * 3600,
+    # 综合报告的 key 包含全部分析输出，与变化最快的输入保持一致
+    "synthesizer": 6 * 3600,
+}
+
+DEFAULT_CACHE_TTL = 6 * 3600
+
+
+def hash_content(content: str) -> str:
+    """计算输入内容的缓存 key（仅用于索引，无需加密哈希；优先使用 xxh3）"""
+    data = content.encode("utf-8")
+    if xxhash is not None:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.md5(data).hexdigest()
+
+
+def _load_entry(path: Path) -> dict:
+    """读取缓存记录（优先使用 orjson 解析）"""
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _dump_entry(f, entry: dict) -> None:
+    """将缓存记录写入二进制文件对象（优先使用 orjson 序列化，输出 UTF-8 字节）"""
+    if orjson is not None:
+        f.write(orjson.dumps(entry))
+        return
+    f.write(json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+
+
+class FileCache:
+    """
+    基于文件的 Agent 响应缓存
+
+    每个 (symbol, role) 只保留最新一条记录，输入数据变化（key 不同）
+    或超过 TTL 时视为未命中。
+    """
+
+    def __init__(self, cache_dir: str, memory_size: int = 256):
+        """
+        初始化文件缓存
+
+        Args:
+            cache_dir: 缓存根目录
+            memory_size: 进程内 LRU 保留的记录数，0 表示只使用文件
+        """
+        self.cache_dir = Path(cache_dir)
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+        # 命中/未命中计数（进程内累计，供 /metrics 查看缓存效果）
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, symbol: str, role: str, entry: dict) -> None:
+        """将记录放入进程内 LRU，超出容量时淘汰最久未使用的记录"""
+        if self.memory_size <= 0:
+            return
+        self._memory[(symbol, role)] = entry
+        self._memory.move_to_end((symbol, role))
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _get_path(self, symbol: str, role: str) -> Path:
+        """生成缓存文件路径"""
+        safe_symbol = "".join(c if c.isalnum() or c in "._-" else "_" for c in symbol)
+        return self.cache_dir / safe_symbol / f"{role}.json"
+
+    def get(self, symbol: str, role: str, key: str) -> Optional[str]:
+        """
+        读取缓存
+
+        Args:
+            symbol: 股票代码
+            role: Agent 角色
+            key: 输入数据哈希
+
+        Returns:
+            缓存的分析文本，未命中返回 None
+        """
+        value = self._lookup(symbol, role, key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def _lookup(self, symbol: str, role: str, key: str) -> Optional[str]:
+        """按 (symbol, role) 查找记录，key 不一致或已过期时返回 None"""
+        entry = self._memory.get((symbol, role))
+        if entry is not None:
+            self._memory.move_to_end((symbol, role))
+        else:
+            path = self._get_path(symbol, role)
+            try:
+                entry = _load_entry(path)
+            except (OSError, ValueError):
+                return None
+            self._remember(symbol, role, entry)
+
+        if entry.get("key") != key:
+            return None
+
+        ttl = ROLE_CACHE_TTL.get(role, DEFAULT_CACHE_TTL)
+        if time.time() - entry.get("created_at", 0) > ttl:
+            return None
+
+        return entry.get("value")
+
+    def stats(self) -> dict:
+        """返回命中/未命中次数及命中率"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def set(self, symbol: str, role: str, key: str, value: str) -> None:
+        """
+        写入缓存
+
+        Args:
+            symbol: 股票代码
+            role: Agent 角色
+            key: 输入数据哈希
+            value: 分析文本
+        """
+        entry = {"key": key, "created_at": time.time(), "value": value}
+        self._remember(symbol, role, entry)
+        self._write(self._get_path(symbol, role), entry)
+
+    async def aset(self, symbol: str, role: str, key: str, value: str) -> None:
+        """
+        写入缓存（异步入口）
+
+        记录立即放入进程内 LRU，文件写入在线程池中执行，不阻塞事件循环。
+        参数同 set。
+        """
+        entry = {"key": key, "created_at": time.time(), "value": value}
+        self._remember(symbol, role, entry)
+        await asyncio.to_thread(self._write, self._get_path(symbol, role), entry)
+
+    def _write(self, path: Path, entry: dict) -> None:
+        """写入唯一的临时文件后原子替换，并发写入同一记录时互不覆盖临时文件"""
+        tmp_path = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                dir=path.parent, prefix=f".{path.stem}.", suffix=".tmp", delete=False
+            ) as f:
+                tmp_path = f.name
+                _dump_entry(f, entry)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("[FileCache] 写入缓存失败 %s: %s", path, e)
+            if tmp_path is not None:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp_path)
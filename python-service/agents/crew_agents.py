@@ -5,14 +5,100 @@ CrewAI多Agent分析模块
 支持多 LLM 提供商自动切换
 """
 
+import asyncio
+import bisect
+import contextlib
+import copy
+import functools
+import itertools
+import json
+import logging
+import operator
+import os
+import random
+import re
+import threading
+import time
+import weakref
+from types import MappingProxyType
+import httpx
 import litellm
-from typing import Dict, List, Optional, Tuple
+import numpy as np
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Tuple
+
+# CrewAI 默认为每个 Agent/Task 步骤上报 OpenTelemetry span，生产环境默认关闭
+# （须在导入 crewai 之前设置；显式设置 CREWAI_DISABLE_TELEMETRY=false 可重新开启）
+# 分析流程直接调用 UnifiedLLM，crewai 仅在 create_agent/create_tasks 中按需导入，
+# 避免服务启动时加载（导入耗时约 2 秒）
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+try:
+    import hyperscan  # 可选：批量解析历史输出时加速段落切分（pip install hyperscan）
+
+    _HYPERSCAN_AVAILABLE = True
+except ImportError:
+    hyperscan = None
+    _HYPERSCAN_AVAILABLE = False
+
+from .cache import FileCache, hash_content
 from .enhanced_prompts import (
+    JsonObjectScanner,
+    extract_json_object,
     get_agent_prompt,
+    format_multi_role_prompt,
+    format_multi_symbol_prompt,
+    parse_multi_role_output,
     parse_analysis_output,
     format_analysis_result,
 )
 from utils.config import config, LLM_PROVIDERS
+from utils.circuit_breaker import CircuitBreaker
+from utils.rate_limiter import AsyncRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+# LLM 调用失败时返回文本的前缀（此类结果不写入缓存）
+LLM_FAILURE_PREFIX = "无法生成分析"
+
+
+# 可重试的瞬时错误：限流、连接/超时、服务端 5xx
+_RETRYABLE_LLM_ERRORS = (
+    litellm.exceptions.RateLimitError,
+    litellm.exceptions.APIConnectionError,
+    litellm.exceptions.Timeout,
+    litellm.exceptions.InternalServerError,
+    litellm.exceptions.ServiceUnavailableError,
+)
+
+
+def estimate_request_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """估算单次请求占用的 token 数（输入 + 预留的输出上限），用于 TPM 限流
+
+    按字符数估算输入：中文约 1 字符/token，英文约 4 字符/token，
+    按字符计数偏保守，且无需加载分词器。
+    """
+    return sum(len(message.get("content") or "") for message in messages) + max_tokens
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """读取错误响应中的 Retry-After（秒），不存在或无法解析时返回 None"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return max(float(headers.get("retry-after", "")), 0.0)
+    except ValueError:
+        return None
 
 
 # 默认温度配置
@@ -26,6 +112,28 @@ AGENT_TEMPERATURES = {
     "synthesizer": 0.3,
 }
 
+# 各 Agent 输出长度上限（token）：分析Agent输出约 500-800 token，
+# 过大的上限只会让服务端预留多余的解码资源（实际生效值不超过 LLM_MAX_TOKENS）
+AGENT_MAX_TOKENS = {
+    "value": 1000,
+    "technical": 1000,
+    "growth": 1000,
+    "fundamental": 1000,
+    "risk": 1000,
+    "macro": 1000,
+    "synthesizer": 1500,
+}
+
+# 各分析Agent所需的数据上下文（只发送与该角色相关的数据块）
+AGENT_CONTEXT_SECTIONS = {
+    "value": ("basic", "financial", "industry"),
+    "technical": ("basic", "kline"),
+    "growth": ("basic", "financial", "industry"),
+    "fundamental": ("basic", "financial", "industry"),
+    "risk": ("basic", "kline", "financial"),
+    "macro": ("basic", "industry"),
+}
+
 # Agent 角色定义
 AGENT_DEFINITIONS = {
     "value": {
@@ -66,25 +174,161 @@ AGENT_DEFINITIONS = {
 }
 
 
+def _build_http_limits() -> httpx.Limits:
+    """根据配置构建 LLM HTTP 连接池限制"""
+    cfg = config()
+    return httpx.Limits(
+        max_connections=cfg.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=cfg.LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=cfg.LLM_HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def init_http_clients() -> None:
+    """初始化 litellm 共享的 HTTP 连接池
+
+    所有 Agent 复用同一组 keep-alive 连接，避免每次调用都重新进行 TCP + TLS
+    握手。启用 HTTP/2 时，6 个分析Agent的并发请求多路复用同一条连接，
+    只需一次 TLS 握手。在事件循环中调用时（服务 lifespan），记录连接池
+    所属的循环，见 run_sync。
+    """
+    global _HTTP_CLIENT_LOOP
+    cfg = config()
+    timeout = httpx.Timeout(cfg.LLM_HTTP_TIMEOUT, connect=10.0)
+    http2 = cfg.LLM_HTTP2 and _HTTP2_AVAILABLE
+    if litellm.client_session is None:
+        litellm.client_session = httpx.Client(
+            limits=_build_http_limits(), timeout=timeout, http2=http2
+        )
+    if litellm.aclient_session is None:
+        litellm.aclient_session = httpx.AsyncClient(
+            limits=_build_http_limits(), timeout=timeout, http2=http2
+        )
+        try:
+            _HTTP_CLIENT_LOOP = asyncio.get_running_loop()
+        except RuntimeError:
+            _HTTP_CLIENT_LOOP = None
+
+
+async def prewarm_http_clients() -> None:
+    """预热到主提供商的连接（服务启动时调用），失败时忽略
+
+    仅发送一个 HEAD 请求完成 TCP + TLS 握手，连接随后留在共享连接池中，
+    首个分析请求直接复用。
+    """
+    try:
+        llm = get_llm()
+        await litellm.aclient_session.head(llm.api_base)
+    except Exception as e:
+        logger.debug("[UnifiedLLM] 连接预热失败: %s", e)
+
+
+async def close_http_clients() -> None:
+    """关闭共享的 HTTP 连接池（服务关闭时调用）
+
+    同时清空 litellm 缓存的 OpenAI 客户端（它们引用已关闭的连接池）。
+    get_llm 只初始化一次连接池，重新启动服务时由 lifespan 调用
+    init_http_clients 重新安装；在此之前 litellm 使用其默认客户端。
+    """
+    litellm.in_memory_llm_clients_cache.flush_cache()
+    if litellm.client_session is not None:
+        litellm.client_session.close()
+        litellm.client_session = None
+    if litellm.aclient_session is not None:
+        await litellm.aclient_session.aclose()
+        litellm.aclient_session = None
+
+
+# 创建共享 AsyncClient 的事件循环（服务的事件循环），不在循环中创建时为 None
+_HTTP_CLIENT_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+# 同步调用方共用的后台事件循环（按需启动，进程内只有一个）
+_SYNC_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_SYNC_LOOP_LOCK = threading.Lock()
+
+
+def _get_sync_loop() -> asyncio.AbstractEventLoop:
+    """获取（必要时启动）同步调用方共用的后台事件循环"""
+    global _SYNC_LOOP
+    with _SYNC_LOOP_LOCK:
+        if _SYNC_LOOP is None or _SYNC_LOOP.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="llm-sync-loop", daemon=True
+            ).start()
+            _SYNC_LOOP = loop
+    return _SYNC_LOOP
+
+
+def run_sync(coro):
+    """在同步代码中运行协程并等待结果
+
+    共享的 AsyncClient 连接与首次使用它的事件循环绑定，每次 asyncio.run
+    新建循环会复用已关闭循环上的连接（Event loop is closed），且无法在
+    运行中的事件循环内调用。因此所有同步调用方都提交到同一个后台循环执行。
+
+    litellm 的 AsyncClient 与缓存的 HTTP 客户端是进程级全局对象，后台循环
+    与服务的事件循环共用时，同一连接池会被两个循环同时使用。因此同步入口
+    不能与异步服务运行在同一进程中（服务内请直接 await 对应的异步方法），
+    连接池属于仍在运行的其他事件循环时抛出 RuntimeError。
+    """
+    owner = _HTTP_CLIENT_LOOP
+    if owner is not None and owner.is_running() and owner is not _SYNC_LOOP:
+        coro.close()
+        raise RuntimeError(
+            "同步 LLM 入口不能与异步服务共用进程，请在事件循环中 await 异步方法"
+        )
+    return asyncio.run_coroutine_threadsafe(coro, _get_sync_loop()).result()
+
+
 class UnifiedLLM:
     """统一 LLM 包装类，支持多个提供商和自动故障转移"""
 
     # 备用提供商列表（按优先级排序）
     FALLBACK_PROVIDERS = ["deepseek", "zhipu", "qwen", "minimax"]
 
-    def __init__(self, temperature: float = 0.7, fallback: bool = True):
+    def __init__(
+        self,
+        temperature: float = 0.7,
+        fallback: bool = True,
+        max_tokens: Optional[int] = None,
+    ):
         """
         初始化统一 LLM 包装类
 
         Args:
             temperature: 温度参数 (0.0-2.0)
             fallback: 是否启用故障转移
+            max_tokens: 输出长度上限，None 表示使用提供商默认值
         """
         self.temperature = temperature
         self.fallback = fallback
+        self.max_tokens = max_tokens
         self._config = config()
         self._init_provider()
 
+        # 已校验的请求参数与备用提供商只解析一次，调用时直接复用
+        self._request_config = MappingProxyType(
+            {"model": self.model, "api_key": self.api_key, "api_base": self.api_base}
+        )
+        self._fallback_targets = self._resolve_fallback_targets()
+
+        # 出站请求限流（with_temperature 副本共享同一限流器）
+        self._rate_limiter, self._token_limiter = self._build_limiters()
+
+        # 配置了多个 API Key 时，每个 Key 使用独立的请求参数与限流器，按轮换分配
+        self._key_slots = self._build_key_slots()
+        self._key_cursor = itertools.count()
+
+        # 主提供商熔断器（所有 Agent 共享，提供商持续故障时直接转入故障转移）
+        self._circuit_breaker = CircuitBreaker(
+            self._config.LLM_CIRCUIT_FAILURE_THRESHOLD,
+            self._config.LLM_CIRCUIT_RESET_TIMEOUT,
+        )
+
+        # with_temperature 副本按 (温度, 输出上限) 复用（所有副本共享同一字典）
+        self._bound_copies: Dict[Tuple[float, Optional[int]], "UnifiedLLM"] = {}
+
     def _init_provider(self, preferred_provider: Optional[str] = None) -> bool:
         """
         初始化提供商配置
@@ -109,75 +353,311 @@ class UnifiedLLM:
                 else [self._config.LLM_PROVIDER]
             )
 
-        for provider_id in providers_to_try:
+        # 校验结果只取决于已加载的 API Key，与候选提供商无关，只需校验一次
+        is_valid, _, _ = self._config.validate_llm_config()
+
+        for provider_id in providers_to_try if is_valid else ():
             if provider_id not in LLM_PROVIDERS:
                 continue
 
-            provider_config = LLM_PROVIDERS[provider_id]
             api_key = self._get_api_key(provider_id)
-
             if not api_key:
                 continue
 
+            provider_config = LLM_PROVIDERS[provider_id]
             self.provider = provider_id
             self.model = provider_config["models"][0]  # 使用第一个模型
             self.api_key = api_key
             self.api_base = provider_config["api_base"]
-
-            # 验证配置
-            is_valid, _, message = self._config.validate_llm_config()
-            if is_valid:
-                print(
-                    f"[UnifiedLLM] 使用提供商: {provider_config['name']} ({self.model})"
-                )
-                return True
+            self.json_mode = provider_config.get("json_mode", False)
+            print(f"[UnifiedLLM] 使用提供商: {provider_config['name']} ({self.model})")
+            return True
 
         raise ValueError(
             f"无法找到可用的 LLM 提供商。所有提供商均未配置有效的 API Key。"
         )
 
-    def _get_api_key(self, provider_id: str) -> Optional[str]:
-        """获取指定提供商的 API Key"""
-        env_key = LLM_PROVIDERS[provider_id]["env_key"]
+    def _build_limiters(
+        self,
+    ) -> Tuple[Optional[AsyncRateLimiter], Optional[AsyncRateLimiter]]:
+        """按 RPM/TPM 配置创建一组限流器（配额按单个 API Key 计算）"""
+        rpm = self._config.LLM_REQUESTS_PER_MINUTE
+        tpm = self._config.LLM_TOKENS_PER_MINUTE
         return (
-            self._config.LLM_API_KEY
-            if provider_id == self._config.LLM_PROVIDER
-            else None
+            AsyncRateLimiter(rpm, 60.0) if rpm > 0 else None,
+            AsyncRateLimiter(tpm, 60.0) if tpm > 0 else None,
         )
 
-    def call(self, messages: List[Dict[str, str]]) -> str:
-        """调用 LLM API"""
+    def _build_key_slots(self) -> Tuple[Tuple[Mapping, Any, Any], ...]:
+        """为主提供商的额外 API Key 构建 (请求参数, RPM 限流器, TPM 限流器)
+
+        只有一个 Key 时返回空元组，调用时直接使用实例上的请求参数与限流器。
+        """
+        keys = self._config.LLM_API_KEYS
+        if self.provider != self._config.LLM_PROVIDER or len(keys) < 2:
+            return ()
+        slots = [(self._request_config, self._rate_limiter, self._token_limiter)]
+        for api_key in keys:
+            if api_key == self.api_key:
+                continue
+            request_config = MappingProxyType(
+                {**self._request_config, "api_key": api_key}
+            )
+            slots.append((request_config, *self._build_limiters()))
+        return tuple(slots)
+
+    def _next_key_slot(self) -> Tuple[Mapping, Any, Any]:
+        """轮换选择 API Key，优先选择当前仍有 RPM 余量的 Key"""
+        if not self._key_slots:
+            return self._request_config, self._rate_limiter, self._token_limiter
+        start = next(self._key_cursor)
+        count = len(self._key_slots)
+        for offset in range(count):
+            slot = self._key_slots[(start + offset) % count]
+            if slot[1] is None or slot[1].has_capacity():
+                return slot
+        return self._key_slots[start % count]
+
+    def _get_api_key(self, provider_id: str) -> Optional[str]:
+        """获取指定提供商的 API Key（取自已加载的配置，不再读取环境变量）"""
+        if provider_id == self._config.LLM_PROVIDER:
+            return self._config.LLM_API_KEY
+        return self._config.PROVIDER_API_KEYS.get(provider_id)
+
+    def _resolve_fallback_targets(self) -> Tuple[Tuple[str, Mapping], ...]:
+        """解析可用的备用提供商（排除当前提供商及未配置 API Key 的提供商）"""
+        targets = []
+        for provider_id in self.FALLBACK_PROVIDERS:
+            if provider_id == self.provider or provider_id not in LLM_PROVIDERS:
+                continue
+
+            api_key = self._get_api_key(provider_id)
+            if not api_key:
+                continue
+
+            provider_config = LLM_PROVIDERS[provider_id]
+            targets.append(
+                (
+                    provider_config["name"],
+                    MappingProxyType(
+                        {
+                            "model": provider_config["models"][0],
+                            "api_key": api_key,
+                            "api_base": provider_config["api_base"],
+                        }
+                    ),
+                )
+            )
+        return tuple(targets)
+
+    def with_temperature(
+        self, temperature: float, max_tokens: Optional[int] = None
+    ) -> "UnifiedLLM":
+        """返回绑定指定温度（及输出长度上限）的轻量副本，共享已解析的提供商配置
+
+        相同参数的副本只创建一次，之后直接复用。
+        """
+        if max_tokens is None:
+            max_tokens = self.max_tokens
+        key = (temperature, max_tokens)
+        bound = self._bound_copies.get(key)
+        if bound is None:
+            bound = copy.copy(self)
+            bound.temperature = temperature
+            bound.max_tokens = max_tokens
+            self._bound_copies[key] = bound
+        return bound
+
+    def call(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        response_format: Optional[Dict] = None,
+    ) -> str:
+        """调用 LLM API（同步入口，供非异步调用方使用，在共用的后台事件循环中执行）
+
+        不能在运行异步服务的进程中使用，服务内请 await acall，见 run_sync。
+        """
+        return run_sync(self.acall(messages, temperature, max_tokens, response_format))
+
+    async def acall(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        response_format: Optional[Dict] = None,
+    ) -> str:
+        """
+        异步调用 LLM API，等待网络响应期间不阻塞事件循环
+
+        Args:
+            messages: 消息列表
+            temperature: 本次调用的温度，默认使用实例温度
+            max_tokens: 本次调用的输出长度上限，默认使用实例设置
+            response_format: 输出格式约束（如 JSON 模式），仅在提供商支持时传入
+        """
         if not messages:
-            return "无法生成分析：缺少输入消息"
+            return f"{LLM_FAILURE_PREFIX}：缺少输入消息"
+
+        if temperature is None:
+            temperature = self.temperature
+
+        options = {"temperature": temperature}
+        if max_tokens is None:
+            max_tokens = self.max_tokens
+        if max_tokens is not None:
+            options["max_tokens"] = max_tokens
+        if response_format is not None:
+            options["response_format"] = response_format
+
+        if not self._circuit_breaker.allow_request():
+            print(f"[UnifiedLLM] {self.provider} 熔断中，跳过主提供商")
+            if self.fallback:
+                return await self._call_with_fallback(messages, "circuit_open", options)
+            return f"{LLM_FAILURE_PREFIX}：LLM 提供商暂时不可用，请稍后重试。"
 
         try:
-            response = litellm.completion(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature,
-                api_key=self.api_key,
-                api_base=self.api_base,
-            )
-            return response["choices"][0]["message"]["content"]
+            content = await self._acompletion_with_retry(messages, options)
+            self._circuit_breaker.record_success()
+            return content
 
         except litellm.exceptions.RateLimitError as e:
             print(f"[UnifiedLLM] 速率限制: {e}")
+            self._circuit_breaker.record_failure()
             if self.fallback:
-                return self._call_with_fallback(messages, "rate_limit")
+                return await self._call_with_fallback(messages, "rate_limit", options)
             raise
 
         except litellm.exceptions.APIConnectionError as e:
             print(f"[UnifiedLLM] API 连接错误: {e}")
+            self._circuit_breaker.record_failure()
             if self.fallback:
-                return self._call_with_fallback(messages, "connection_error")
+                return await self._call_with_fallback(
+                    messages, "connection_error", options
+                )
             raise
 
         except Exception as e:
             print(f"[UnifiedLLM] 调用错误: {e}")
+            if isinstance(e, _RETRYABLE_LLM_ERRORS):
+                self._circuit_breaker.record_failure()
             raise
 
-    def _call_with_fallback(
-        self, messages: List[Dict[str, str]], error_type: str
+    async def astream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        response_format: Optional[Dict] = None,
+    ) -> AsyncIterator[str]:
+        """
+        流式调用 LLM API，逐段产出生成的文本
+
+        调用方在首个 token 到达时即可开始展示，无需等待完整响应。
+        主提供商熔断或建立流式连接失败时，退回 acall（含重试与故障转移），
+        并将完整响应作为单个片段产出。
+        """
+        if temperature is None:
+            temperature = self.temperature
+        if max_tokens is None:
+            max_tokens = self.max_tokens
+
+        if not messages or not self._circuit_breaker.allow_request():
+            yield await self.acall(messages, temperature, max_tokens, response_format)
+            return
+
+        options = {"temperature": temperature}
+        if max_tokens is not None:
+            options["max_tokens"] = max_tokens
+        if response_format is not None:
+            options["response_format"] = response_format
+
+        request_config = await self._throttle(messages, options)
+        try:
+            response = await litellm.acompletion(
+                messages=messages, stream=True, **options, **request_config
+            )
+        except _RETRYABLE_LLM_ERRORS as e:
+            print(f"[UnifiedLLM] 流式调用失败，改用非流式调用: {e}")
+            self._circuit_breaker.record_failure()
+            yield await self.acall(messages, temperature, max_tokens, response_format)
+            return
+
+        try:
+            async for chunk in response:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        except GeneratorExit:
+            # 调用方已取得所需内容并提前结束：连接正常，关闭上游流以停止接收
+            self._circuit_breaker.record_success()
+            aclose = getattr(response, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            raise
+        except Exception as e:
+            # 已开始输出后流式连接中断，同样计入熔断失败次数
+            print(f"[UnifiedLLM] 流式输出中断: {e}")
+            self._circuit_breaker.record_failure()
+            raise
+        self._circuit_breaker.record_success()
+
+    async def _acompletion_with_retry(
+        self, messages: List[Dict[str, str]], options: Dict
+    ) -> str:
+        """调用主提供商，瞬时错误按指数退避重试，重试耗尽后抛出最后一次的异常"""
+        max_retries = self._config.LLM_MAX_RETRIES
+        for attempt in range(max_retries + 1):
+            request_config = await self._throttle(messages, options)
+            try:
+                response = await litellm.acompletion(
+                    messages=messages, **options, **request_config
+                )
+                return response["choices"][0]["message"]["content"]
+            except _RETRYABLE_LLM_ERRORS as e:
+                if attempt >= max_retries:
+                    raise
+                delay = self._retry_delay(attempt, e)
+                print(
+                    f"[UnifiedLLM] 瞬时错误，{delay:.1f}秒后重试 "
+                    f"({attempt + 1}/{max_retries}): {e}"
+                )
+                await asyncio.sleep(delay)
+
+    async def _throttle(
+        self, messages: List[Dict[str, str]], options: Dict
+    ) -> Mapping:
+        """选择 API Key 并按其 RPM 与 TPM 配额排队，避免触发提供商的 429
+
+        Returns:
+            本次请求使用的请求参数（model、api_key、api_base）
+        """
+        request_config, rate_limiter, token_limiter = self._next_key_slot()
+        if rate_limiter:
+            await rate_limiter.acquire()
+        if token_limiter:
+            await token_limiter.acquire(
+                estimate_request_tokens(
+                    messages, options.get("max_tokens") or self._config.LLM_MAX_TOKENS
+                )
+            )
+        return request_config
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """第 attempt 次重试前的等待时间（秒），不超过 LLM_RETRY_MAX_DELAY
+
+        优先遵循提供商返回的 Retry-After；否则指数退避并叠加随机抖动，
+        避免并发的 Agent 在同一时刻集中重试、再次触发限流。
+        """
+        base = self._config.LLM_RETRY_BASE_DELAY
+        delay = _retry_after_seconds(error)
+        if delay is None:
+            delay = base * 2**attempt + random.uniform(0, base)
+        return min(delay, self._config.LLM_RETRY_MAX_DELAY)
+
+    async def _call_with_fallback(
+        self, messages: List[Dict[str, str]], error_type: str, options: Dict
     ) -> str:
         """
         使用备用提供商调用 LLM
@@ -185,48 +665,52 @@ class UnifiedLLM:
         Args:
             messages: 消息列表
             error_type: 错误类型
+            options: 生成参数（temperature、max_tokens）
 
         Returns:
             LLM 响应内容
         """
         print(f"[UnifiedLLM] 尝试故障转移 (错误类型: {error_type})")
-
-        # 排除当前提供商
-        available_providers = [p for p in self.FALLBACK_PROVIDERS if p != self.provider]
-
-        for fallback_provider in available_providers:
-            if fallback_provider not in LLM_PROVIDERS:
-                continue
-
-            provider_config = LLM_PROVIDERS[fallback_provider]
-            env_key = provider_config["env_key"]
-            api_key = (
-                self._config.LLM_API_KEY
-                if fallback_provider == self._config.LLM_PROVIDER
-                else None
-            )
-
-            if not api_key:
-                continue
-
-            try:
-                print(f"[UnifiedLLM] 切换到备用提供商: {provider_config['name']}")
-                response = litellm.completion(
-                    model=provider_config["models"][0],
-                    messages=messages,
-                    temperature=self.temperature,
-                    api_key=api_key,
-                    api_base=provider_config["api_base"],
+        # 备用提供商不一定支持 JSON 模式，只依靠提示词约束输出格式
+        options = {k: v for k, v in options.items() if k != "response_format"}
+
+        # 每组同时请求多个备用提供商，取最先成功的响应并取消其余请求，
+        # 故障转移耗时从各提供商延迟之和降为单组内的最快响应
+        hedge = max(1, self._config.LLM_FALLBACK_HEDGE)
+        targets = self._fallback_targets
+        for i in range(0, len(targets), hedge):
+            pending = {}
+            for name, request_config in targets[i : i + hedge]:
+                print(f"[UnifiedLLM] 切换到备用提供商: {name}")
+                task = asyncio.create_task(
+                    litellm.acompletion(messages=messages, **options, **request_config)
                 )
-                print(f"[UnifiedLLM] 备用提供商 {provider_config['name']} 调用成功")
-                return response["choices"][0]["message"]["content"]
+                pending[task] = name
 
-            except Exception as e:
-                print(f"[UnifiedLLM] 备用提供商 {provider_config['name']} 失败: {e}")
-                continue
+            try:
+                while pending:
+                    done, _ = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    content = None
+                    for task in done:
+                        name = pending.pop(task)
+                        try:
+                            response = task.result()
+                        except Exception as e:
+                            print(f"[UnifiedLLM] 备用提供商 {name} 失败: {e}")
+                            continue
+                        if content is None:
+                            print(f"[UnifiedLLM] 备用提供商 {name} 调用成功")
+                            content = response["choices"][0]["message"]["content"]
+                    if content is not None:
+                        return content
+            finally:
+                for task in pending:
+                    task.cancel()
 
         # 所有提供商都失败
-        return f"无法生成分析：所有 LLM 提供商均失败。请检查 API Key 配置。"
+        return f"{LLM_FAILURE_PREFIX}：所有 LLM 提供商均失败。请检查 API Key 配置。"
 
     def get_provider_info(self) -> Dict:
         """获取当前提供商信息"""
@@ -243,309 +727,1039 @@ class UnifiedLLM:
 DeepSeekLLM = UnifiedLLM
 
 
+@functools.lru_cache(maxsize=1)
+def get_llm() -> UnifiedLLM:
+    """获取进程内共享的 LLM 实例（温度按调用传入）
+
+    首次调用时解析并校验提供商配置、初始化共享连接池，之后不再读取配置。
+    不在模块导入时执行：main.py 在导入本模块之后才加载 .env.local。
+    """
+    init_http_clients()
+    cfg = config()
+    return DeepSeekLLM(cfg.LLM_TEMPERATURE, max_tokens=cfg.LLM_MAX_TOKENS)
+
+
+def agent_max_tokens(agent_type: str) -> int:
+    """获取 Agent 的输出长度上限（按角色设定，且不超过全局 LLM_MAX_TOKENS）"""
+    ceiling = config().LLM_MAX_TOKENS
+    return min(AGENT_MAX_TOKENS.get(agent_type, ceiling), ceiling)
+
+
+@functools.lru_cache(maxsize=1)
+def get_agent_cache() -> Optional[FileCache]:
+    """获取 Agent 响应缓存，未启用时返回 None"""
+    cfg = config()
+    if not cfg.AGENT_CACHE_ENABLED:
+        return None
+    return FileCache(cfg.AGENT_CACHE_DIR)
+
+
+@functools.lru_cache(maxsize=None)
+def create_agent(agent_type: str):
+    """创建单个 Agent，绑定共享 LLM 的温度副本（不重新解析提供商配置）
+
+    首次使用某个角色时才构建，之后直接复用同一个 Agent。
+    """
+    from crewai import Agent
+
+    definition = AGENT_DEFINITIONS.get(agent_type, {})
+    temperature = AGENT_TEMPERATURES.get(agent_type, 0.5)
+
+    return Agent(
+        role=str(definition.get("role", agent_type.title())),
+        goal=str(definition.get("goal", "")),
+        backstory=str(definition.get("backstory", "")),
+        verbose=config().CREW_VERBOSE,
+        llm=get_llm().with_temperature(temperature, agent_max_tokens(agent_type)),
+        allow_delegation=False,
+    )
+
+
 def create_agents() -> list:
     """创建所有分析 Agent"""
-    from crewai import Agent
+    return [create_agent(agent_type) for agent_type in config().AGENT_ROLES]
 
-    cfg = config()
-    agents = []
-    for agent_type in cfg.AGENT_ROLES:
-        definition = AGENT_DEFINITIONS.get(agent_type, {})
-        temperature = AGENT_TEMPERATURES.get(agent_type, 0.5)
-
-        agents.append(
-            Agent(
-                role=str(definition.get("role", agent_type.title())),
-                goal=str(definition.get("goal", "")),
-                backstory=str(definition.get("backstory", "")),
-                verbose=True,
-                llm=DeepSeekLLM(temperature),
-                allow_delegation=False,
-            )
+
+# 相互独立、可并行执行的分析 Agent（synthesizer 依赖它们的输出）
+ANALYST_ROLES = ("value", "technical", "growth", "fundamental", "risk", "macro")
+
+# Agent 中文名称（与各 Prompt 模板的标题一致）
+AGENT_DISPLAY_NAMES = {
+    "value": "估值分析",
+    "technical": "技术分析",
+    "growth": "成长分析",
+    "fundamental": "基本面分析",
+    "risk": "风险评估",
+    "macro": "宏观分析",
+    "synthesizer": "综合分析",
+}
+
+# Agent 索引映射（与 create_agents 返回顺序一致）
+AGENT_INDEX = {
+    "value": 0,
+    "technical": 1,
+    "growth": 2,
+    "fundamental": 3,
+    "risk": 4,
+    "macro": 5,
+    "synthesizer": 6,
+}
+
+
+def build_context_sections(symbol: str, stock_data: dict) -> Dict[str, str]:
+    """格式化各数据块（每次分析只格式化一次）"""
+    return {
+        "header": (
+            f"股票代码: {symbol}\n"
+            f"股票名称: {stock_data.get('basic', {}).get('name', symbol)}"
+        ),
+        "basic": f"基本数据:\n{format_data_summary(stock_data)}",
+        "kline": f"技术数据:\n{format_kline_summary(stock_data.get('kline', []))}",
+        "financial": f"财务数据:\n{format_financial_data(stock_data)}",
+        "industry": f"行业数据:\n{format_industry_data(stock_data)}",
+    }
+
+
+def compose_data_context(
+    sections: Dict[str, str],
+    names: Tuple[str, ...] = ("basic", "kline", "financial", "industry"),
+) -> str:
+    """按需拼接数据上下文"""
+    return "\n\n".join([sections["header"]] + [sections[name] for name in names])
+
+
+def build_data_context(symbol: str, stock_data: dict) -> str:
+    """构建包含全部数据块的共享上下文"""
+    return compose_data_context(build_context_sections(symbol, stock_data))
+
+
+def build_agent_contexts(symbol: str, stock_data: dict) -> Tuple[str, Dict[str, str]]:
+    """构建共享上下文及各分析Agent的精简上下文
+
+    各 Agent 只接收 AGENT_CONTEXT_SECTIONS 中声明的数据块，减少输入 token。
+    数据块组合相同的角色共享同一个上下文字符串，每种组合只拼接一次。
+
+    Returns:
+        (完整上下文, {角色: 精简上下文})
+    """
+    sections = build_context_sections(symbol, stock_data)
+    contexts: Dict[Tuple[str, ...], str] = {}
+    role_contexts = {}
+    for role in ANALYST_ROLES:
+        names = AGENT_CONTEXT_SECTIONS[role]
+        if names not in contexts:
+            contexts[names] = compose_data_context(sections, names)
+        role_contexts[role] = contexts[names]
+    return compose_data_context(sections), role_contexts
+
+
+def build_agent_messages(
+    agent_type: str,
+    prompt: str,
+    data_context: Optional[str] = None,
+    instructions: Optional[str] = None,
+) -> List[Dict[str, str]]:
+    """构建单个 Agent 的对话消息（数据上下文 + 角色设定 + 任务描述）
+
+    数据上下文放在 system 消息最前面：同一次分析中各 Agent 的请求以相同的
+    数据块开头，提供商的前缀缓存（如 DeepSeek 的自动上下文缓存）可复用已计算
+    的前缀，只有角色设定和任务描述部分需要重新预填充。
+    instructions 为与股票无关的固定说明，附加在角色设定之后，同样计入可缓存前缀。
+    """
+    definition = AGENT_DEFINITIONS.get(agent_type, {})
+    system_prompt = (
+        f"You are {definition.get('role', agent_type.title())}. "
+        f"{definition.get('backstory', '')}\n"
+        f"Your personal goal is: {definition.get('goal', '')}"
+    )
+    if data_context is not None:
+        system_prompt = f"数据上下文:\n{data_context}\n\n{system_prompt}"
+    if instructions is not None:
+        system_prompt = f"{system_prompt}\n\n{instructions}"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt},
+    ]
+
+
+# 调试用：Agent 输出中的评分/置信度模式
+_DEBUG_SCORE_PATTERNS = [
+    (re.compile(r"综合评分[:：]?\s*(\d+)分?"), "综合评分"),
+    (re.compile(r"评分[:：]?\s*(\d+)分?"), "评分"),
+    (re.compile(r"(\d{2})\s*分"), "XX分"),
+    (re.compile(r"综合置信度[:：]?\s*(\d+)"), "综合置信度"),
+]
+
+
+def _log_verbose(message: str, *args) -> None:
+    """仅在 CREW_VERBOSE 开启时记录逐步执行日志（参数延迟格式化）"""
+    if config().CREW_VERBOSE:
+        logger.info(message, *args)
+
+
+def _log_score_patterns(agent_type: str, result_str: str) -> None:
+    """记录 Agent 输出中匹配到的评分/置信度，用于排查解析问题
+
+    调用方仅在 DEBUG 日志级别开启时调用，生产环境不执行这些正则扫描。
+    """
+    for pattern, name in _DEBUG_SCORE_PATTERNS:
+        matches = pattern.findall(result_str)
+        if matches:
+            logger.debug("[CrewAI] %s 评分模式 %s: %s", agent_type, name, matches)
+
+
+def build_single_agent_messages(
+    agent_type: str, stock_name: str, symbol: str, data_context: str
+) -> List[Dict[str, str]]:
+    """构建单个分析Agent的消息（实时调用与离线批量请求共用）"""
+    return build_agent_messages(
+        agent_type,
+        get_agent_prompt(agent_type, stock_name, symbol)
+        + "\n\n请根据数据上下文，严格按照模板格式输出分析结果。",
+        data_context,
+    )
+
+
+async def run_single_agent(
+    llm: UnifiedLLM, agent_type: str, stock_name: str, symbol: str, data_context: str
+) -> dict:
+    """运行单个分析Agent并返回结果
+
+    直接通过 UnifiedLLM.acall 调用模型：CrewAI 的 Task.execute_sync 会把
+    UnifiedLLM 转换为其内置 LLM 并同步阻塞调用，无法与其他 Agent 交错等待网络。
+    相同股票数据的结果按 (symbol, 角色, 数据哈希) 缓存，命中时跳过 LLM 调用。
+    """
+    cache = get_agent_cache()
+    cache_key = hash_content(data_context)
+    if cache:
+        cached = cache.get(symbol, agent_type, cache_key)
+        if cached is not None:
+            _log_verbose("[CrewAI] %s 命中缓存", agent_type)
+            return {"agent": agent_type, "result": cached}
+
+    messages = build_single_agent_messages(
+        agent_type, stock_name, symbol, data_context
+    )
+
+    try:
+        result_str = await llm.acall(
+            messages,
+            temperature=AGENT_TEMPERATURES.get(agent_type, 0.5),
+            max_tokens=agent_max_tokens(agent_type),
         )
 
-    return agents
+        if logger.isEnabledFor(logging.DEBUG):
+            _log_score_patterns(agent_type, result_str)
 
+        if result_str.startswith(LLM_FAILURE_PREFIX):
+            return {"agent": agent_type, "result": result_str, "failed": True}
+
+        if cache:
+            await cache.aset(symbol, agent_type, cache_key, result_str)
+
+        return {"agent": agent_type, "result": result_str}
+    except Exception as e:
+        logger.warning("[CrewAI] %s 执行错误: %s", agent_type, e)
+        return {
+            "agent": agent_type,
+            "result": f"## {agent_type.title()} 分析\n\n分析失败: {str(e)[:200]}",
+            "failed": True,
+        }
 
-def run_crew_analysis(symbol: str, stock_data: dict) -> dict:
-    """运行CrewAI多Agent分析 - 混合执行模式
 
-    优化策略：
-    - 6个分析Agent并行执行 (value, technical, growth, fundamental, risk, macro)
-    - synthesizer串行执行，综合所有分析结果
-    - 预计速度提升 2-4 倍
+async def run_batched_analysts(
+    llm: UnifiedLLM, stock_name: str, symbol: str, data_context: str
+) -> Dict[str, str]:
+    """通过一次 LLM 调用完成所有分析Agent的任务
+
+    共享数据上下文只发送一次，模型按角色返回 JSON。模型未输出 JSON 而是直接
+    按各模板输出 Markdown 段落时，按段落标题切分。返回 {角色: 分析文本}，
+    解析失败或缺失的角色不包含在内，由调用方逐个补跑。
     """
-    from crewai import Agent, Task
-    import time
-    import re
-    import sys
-    from concurrent.futures import ThreadPoolExecutor, as_completed
+    cache = get_agent_cache()
+    cache_key = hash_content(data_context)
+
+    outputs = {}
+    if cache:
+        for role in ANALYST_ROLES:
+            cached = cache.get(symbol, role, cache_key)
+            if cached is not None:
+                outputs[role] = cached
+
+    pending_roles = [role for role in ANALYST_ROLES if role not in outputs]
+    if not pending_roles:
+        return outputs
+
+    _log_verbose("[CrewAI] 合并调用 %s 个分析任务...", len(pending_roles))
+    messages = [
+        {
+            "role": "user",
+            "content": format_multi_role_prompt(
+                pending_roles, stock_name, symbol, data_context
+            ),
+        }
+    ]
 
-    start_time = time.time()
     try:
-        print(f"[CrewAI] 开始混合模式分析: {symbol}")
+        result_str = await llm.acall(
+            messages,
+            max_tokens=sum(AGENT_MAX_TOKENS[role] for role in pending_roles),
+        )
+    except Exception as e:
+        logger.warning("[CrewAI] 合并调用失败: %s", e)
+        return outputs
+
+    parsed = parse_multi_role_output(result_str, pending_roles)
+    if not parsed and "{" not in result_str:
+        sections = split_agent_sections(result_str)
+        parsed = {
+            role: f"## {_AGENT_SECTION_HEADINGS[role]}\n\n{sections[role].strip()}"
+            for role in pending_roles
+            if sections.get(role, "").strip()
+        }
+    for role, text in parsed.items():
+        outputs[role] = text
+        if cache:
+            await cache.aset(symbol, role, cache_key, text)
 
-        # 创建 Agent
-        agents = create_agents()
+    missing = [role for role in pending_roles if role not in parsed]
+    if missing:
+        logger.warning("[CrewAI] 合并调用缺少角色: %s", ", ".join(missing))
 
-        # 格式化精简数据
-        data_summary = format_data_summary(stock_data)
-        kline_summary = format_kline_summary(stock_data.get("kline", []))
-        financial_summary = format_financial_data(stock_data)
-        industry_summary = format_industry_data(stock_data)
+    return outputs
 
-        # 准备精简数据上下文
-        data_context = f"""
-股票代码: {symbol}
-股票名称: {stock_data.get("basic", {}).get("name", symbol)}
 
-基本数据:
-{data_summary}
+async def run_multi_symbol_analyst(
+    llm: UnifiedLLM, agent_type: str, stocks: List[Tuple[str, str, str]]
+) -> Dict[str, str]:
+    """通过一次 LLM 调用完成多只股票的同一分析任务
 
-技术数据:
-{kline_summary}
+    Args:
+        stocks: [(股票代码, 股票名称, 数据上下文), ...]
 
-财务数据:
-{financial_summary}
+    Returns:
+        {股票代码: 分析文本}，解析失败或缺失的股票不包含在内
+    """
+    messages = [
+        {"role": "user", "content": format_multi_symbol_prompt(agent_type, stocks)}
+    ]
+    try:
+        result_str = await llm.acall(
+            messages,
+            temperature=AGENT_TEMPERATURES.get(agent_type, 0.5),
+            max_tokens=agent_max_tokens(agent_type) * len(stocks),
+        )
+    except Exception as e:
+        logger.warning("[CrewAI] %s 多股票合并调用失败: %s", agent_type, e)
+        return {}
 
-行业数据:
-{industry_summary}
-"""
+    if result_str.startswith(LLM_FAILURE_PREFIX):
+        return {}
+    return parse_multi_role_output(result_str, [symbol for symbol, _, _ in stocks])
 
-        cfg = config()
-        parallel_roles = [
-            "value",
-            "technical",
-            "growth",
-            "fundamental",
-            "risk",
-            "macro",
-        ]
 
-        # Agent 索引映射
-        agent_map = {
-            "value": 0,
-            "technical": 1,
-            "growth": 2,
-            "fundamental": 3,
-            "risk": 4,
-            "macro": 5,
-            "synthesizer": 6,
+async def prefill_analyst_results(
+    llm: UnifiedLLM,
+    symbols: List[str],
+    stock_data_map: Dict[str, dict],
+    rows_per_prompt: int,
+) -> Dict[str, Dict[str, str]]:
+    """批量分析前按角色合并多只股票的分析调用
+
+    每个分析角色每 rows_per_prompt 只股票发起一次调用，各股票使用各自的精简上下文。
+    结果按 (股票, 角色, 数据哈希) 写入缓存。返回 {股票代码: {角色: 分析文本}}，
+    缺失的角色由逐股票分析补跑。
+    """
+    cache = get_agent_cache()
+    prefilled: Dict[str, Dict[str, str]] = {symbol: {} for symbol in symbols}
+    role_contexts = {
+        symbol: build_agent_contexts(symbol, stock_data_map[symbol])[1]
+        for symbol in symbols
+    }
+
+    jobs = []
+    for role in ANALYST_ROLES:
+        rows = []
+        for symbol in symbols:
+            context = role_contexts[symbol][role]
+            cached = cache.get(symbol, role, hash_content(context)) if cache else None
+            if cached is not None:
+                prefilled[symbol][role] = cached
+                continue
+            stock_name = stock_data_map[symbol].get("basic", {}).get("name", symbol)
+            rows.append((symbol, stock_name, context))
+        jobs.extend(
+            (role, rows[i : i + rows_per_prompt])
+            for i in range(0, len(rows), rows_per_prompt)
+        )
+
+    _log_verbose("[CrewAI] 多股票合并调用: %s 只股票，%s 次调用", len(symbols), len(jobs))
+    results = await asyncio.gather(
+        *(run_multi_symbol_analyst(llm, role, rows) for role, rows in jobs)
+    )
+    for (role, _), parsed in zip(jobs, results):
+        for symbol, text in parsed.items():
+            prefilled[symbol][role] = text
+            if cache:
+                key = hash_content(role_contexts[symbol][role])
+                await cache.aset(symbol, role, key, text)
+
+    return prefilled
+
+
+async def iter_analyst_results(
+    llm: UnifiedLLM,
+    stock_name: str,
+    symbol: str,
+    data_context: str,
+    role_contexts: Optional[Dict[str, str]] = None,
+    prefilled: Optional[Dict[str, str]] = None,
+) -> AsyncIterator[dict]:
+    """并发执行6个分析Agent，按完成顺序逐个产出结果
+
+    data_context 为完整共享上下文（合并调用时使用）；role_contexts 可为各角色
+    指定精简上下文，未指定的角色使用 data_context。prefilled 为已完成的
+    {角色: 分析文本}（如多股票合并调用的结果），这些角色不再调用 LLM。
+    单个 Agent 失败时产出失败说明而不是抛出异常；调用方提前停止迭代时，
+    尚未完成的 Agent 会被取消。
+    """
+    role_contexts = role_contexts or {}
+
+    batched = dict(prefilled or {})
+    if config().AGENT_BATCH_ANALYSTS and len(batched) < len(ANALYST_ROLES):
+        batched = {
+            **await run_batched_analysts(llm, stock_name, symbol, data_context),
+            **batched,
         }
 
-        def run_single_agent(agent_type: str) -> dict:
-            """运行单个Agent并返回结果"""
-            agent_index = agent_map.get(agent_type, 0)
-            agent = agents[agent_index]
+    _log_verbose("[CrewAI] 开始并行执行 %s 个分析任务...", len(ANALYST_ROLES))
 
-            base_prompt = get_agent_prompt(
-                agent_type, stock_data.get("basic", {}).get("name", symbol), symbol
+    async def run_role(agent_type: str) -> dict:
+        if agent_type in batched:
+            return {"agent": agent_type, "result": batched[agent_type]}
+        try:
+            return await run_single_agent(
+                llm,
+                agent_type,
+                stock_name,
+                symbol,
+                role_contexts.get(agent_type, data_context),
             )
+        except Exception as e:
+            logger.warning("[CrewAI] %s 失败: %s", agent_type, e)
+            return {
+                "agent": agent_type,
+                "result": f"## {agent_type.title()} 分析\n\n分析失败: {str(e)}",
+                "failed": True,
+            }
 
-            task = Task(
-                description=base_prompt
-                + f"\n\n数据上下文:\n{data_context}\n\n请严格按照模板格式输出分析结果。",
-                expected_output=f"{agent_type}分析报告",
-                agent=agent,
+    tasks = [asyncio.ensure_future(run_role(role)) for role in ANALYST_ROLES]
+    try:
+        for completed_count, next_done in enumerate(asyncio.as_completed(tasks), 1):
+            output = await next_done
+            _log_verbose(
+                "[CrewAI] %s 完成 (%s/%s)",
+                output["agent"],
+                completed_count,
+                len(ANALYST_ROLES),
             )
+            yield output
+    finally:
+        for task in tasks:
+            task.cancel()
 
-            try:
-                result = task.execute_sync()
-                result_str = str(result) if not isinstance(result, str) else result
-
-                # DEBUG: Search for score/confidence patterns in output
-                import re
-
-                score_patterns = [
-                    (r"综合评分[:：]?\s*(\d+)分?", "综合评分"),
-                    (r"评分[:：]?\s*(\d+)分?", "评分"),
-                    (r"(\d{2})\s*分", "XX分"),
-                ]
-                conf_patterns = [
-                    (r"综合置信度[:：]?\s*(\d+)", "综合置信度"),
-                ]
-
-                print(f"[DEBUG] {agent_type} patterns found:")
-                for p, name in score_patterns:
-                    matches = re.findall(p, result_str)
-                    if matches:
-                        print(f"  {name}: {matches}")
-                for p, name in conf_patterns:
-                    matches = re.findall(p, result_str)
-                    if matches:
-                        print(f"  {name}: {matches}")
-
-                return {"agent": agent_type, "result": result_str}
-            except Exception as e:
-                print(f"[CrewAI] {agent_type} 执行错误: {e}")
-                return {
-                    "agent": agent_type,
-                    "result": f"## {agent_type.title()} 分析\n\n分析失败: {str(e)[:200]}",
-                }
-
-        # 并行执行6个分析Agent
-        print(f"[CrewAI] 开始并行执行 {len(parallel_roles)} 个分析任务...")
-        agent_outputs = []
-
-        with ThreadPoolExecutor(max_workers=len(parallel_roles)) as executor:
-            futures = {
-                executor.submit(run_single_agent, role): role for role in parallel_roles
-            }
 
-            completed_count = 0
-            for future in as_completed(futures):
-                role = futures[future]
-                try:
-                    output = future.result()
-                    agent_outputs.append(output)
-                    completed_count += 1
-                    print(
-                        f"[CrewAI] {role} 完成 ({completed_count}/{len(parallel_roles)})"
-                    )
-                except Exception as e:
-                    print(f"[CrewAI] {role} 失败: {e}")
-                    # 添加默认输出
-                    agent_outputs.append(
-                        {
-                            "agent": role,
-                            "result": f"## {role.title()} 分析\n\n分析失败: {str(e)}",
-                        }
-                    )
+async def run_analyst_phase(
+    llm: UnifiedLLM,
+    stock_name: str,
+    symbol: str,
+    data_context: str,
+    role_contexts: Optional[Dict[str, str]] = None,
+    prefilled: Optional[Dict[str, str]] = None,
+) -> List[dict]:
+    """阶段1: 并发执行6个相互独立的分析Agent
+
+    各 Agent 仅依赖共享的数据上下文，因此整体耗时约为最慢的单个 Agent，
+    而非六者之和。启用 AGENT_BATCH_ANALYSTS 时先尝试一次合并调用，
+    缺失的角色再并发补跑。返回结果按 ANALYST_ROLES 顺序排列。
+    """
+    outputs = {}
+    async for output in iter_analyst_results(
+        llm, stock_name, symbol, data_context, role_contexts, prefilled
+    ):
+        outputs[output["agent"]] = output
 
-        # 准备合成器输入
-        agent_outputs_text = "\n\n".join(
-            [
-                f"=== {o['agent'].upper()} AGENT ===\n{o['result']}"
-                for o in agent_outputs
-            ]
-        )
+    return [outputs[role] for role in ANALYST_ROLES]
 
-        # 串行执行 synthesizer
-        print("[CrewAI] 开始综合分析...")
-        synthesizer_agent = agents[agent_map["synthesizer"]]
-        synthesizer_prompt = get_agent_prompt(
-            "synthesizer", stock_data.get("basic", {}).get("name", symbol), symbol
-        )
 
-        synthesis_task = Task(
-            description=synthesizer_prompt
-            + f"""
+class RoleAnalysis(BaseModel):
+    """单个维度的分析结论"""
 
-已完成的多Agent分析结果:
-{agent_outputs_text}
+    role: str = Field(
+        description="分析维度: value/technical/growth/fundamental/risk/macro"
+    )
+    score: float = Field(description="该维度评分 0-100")
+    analysis: str = Field(default="", description="该维度的简要结论")
+    keyPoints: List[str] = Field(default_factory=list, description="关键要点")
 
-请综合以上所有分析结果，生成最终的综合分析报告。
 
-请严格按照模板格式输出综合分析结果。""",
-            expected_output="综合分析报告",
-            agent=synthesizer_agent,
-        )
+class SynthesisResult(BaseModel):
+    """synthesizer 的结构化输出，由 parse_synthesis_output 从模型输出中解析"""
 
-        final_result = synthesis_task.execute_sync()
-        final_result_str = (
-            str(final_result) if not isinstance(final_result, str) else final_result
-        )
+    overallScore: float = Field(description="综合评分 0-100")
+    recommendation: str = Field(
+        description="投资建议: strong_buy/buy/hold/wait/sell 之一"
+    )
+    confidence: float = Field(description="置信度 0-100")
+    summary: str = Field(description="执行摘要与综合结论")
+    risks: List[str] = Field(default_factory=list, description="主要风险")
+    opportunities: List[str] = Field(default_factory=list, description="投资亮点")
+    roleAnalysis: List[RoleAnalysis] = Field(
+        default_factory=list, description="各维度评分与结论"
+    )
+
+
+# synthesizer 的固定输出说明（含 JSON 结构），与股票无关，放在 system 消息中，
+# 使各次综合请求共享同一段可缓存的前缀
+_SYNTHESIS_INSTRUCTIONS = (
+    "请综合用户提供的多Agent分析结果，生成最终的综合分析报告。\n\n"
+    "最终答案只输出一个 JSON 对象：报告中的执行摘要与综合结论写入 summary，\n"
+    "投资亮点写入 opportunities，风险提示写入 risks，各维度评分写入 roleAnalysis。"
+    "\n\n输出必须符合以下 JSON Schema:\n"
+    + json.dumps(SynthesisResult.model_json_schema(), ensure_ascii=False)
+)
+
+
+def build_synthesis_messages(
+    stock_name: str, symbol: str, agent_outputs: List[dict]
+) -> List[Dict[str, str]]:
+    """构建 synthesizer 的对话消息
+
+    固定部分（角色设定 + 输出说明）在前，随股票变化的部分（角色提示词 +
+    各分析Agent的输出）放在最后的 user 消息中。各输出可达数 KB，
+    所有片段一次 join 拼成提示词，每段输出只复制一次。
+    """
+    parts = [
+        get_agent_prompt("synthesizer", stock_name, symbol),
+        "\n\n已完成的多Agent分析结果:\n",
+    ]
+    for i, o in enumerate(agent_outputs):
+        if i:
+            parts.append("\n\n")
+        parts.append(f"=== {o['agent'].upper()} AGENT ===\n")
+        parts.append(o["result"])
+    prompt = "".join(parts)
+    return build_agent_messages("synthesizer", prompt, instructions=_SYNTHESIS_INSTRUCTIONS)
+
+
+def parse_synthesis_output(output: str) -> Optional[SynthesisResult]:
+    """将 synthesizer 的文本输出转换为 SynthesisResult，无法解析时返回 None"""
+    data = extract_json_object(output)
+    if data is None:
+        return None
+    try:
+        return SynthesisResult.model_validate(data)
+    except ValidationError:
+        return None
+
+
+def _synthesis_cache_key(
+    agent_outputs: List[dict], messages: List[Dict[str, str]]
+) -> Optional[str]:
+    """synthesizer 的缓存 key（各分析输出与日期都在 user 消息中）
+
+    有分析Agent失败时不缓存，避免失败信息影响后续综合结果。
+    """
+    if any(o.get("failed") for o in agent_outputs):
+        return None
+    return hash_content(messages[-1]["content"])
 
-        elapsed = time.time() - start_time
-        print(f"[CrewAI] 分析完成，耗时: {elapsed:.1f}秒")
 
-        # 解析结果
-        full_output = (
-            final_result_str
-            + "\n\n"
-            + "\n\n".join([o["result"] for o in agent_outputs])
+def _synthesis_response_format(llm: UnifiedLLM) -> Optional[Dict]:
+    """提供商支持 JSON 模式时约束 synthesizer 只输出 JSON 对象
+
+    正常情况下输出可直接解析，无需回退到 extract_from_text 的文本解析。
+    """
+    return {"type": "json_object"} if llm.json_mode else None
+
+
+async def run_synthesis_phase(
+    llm: UnifiedLLM, stock_name: str, symbol: str, agent_outputs: List[dict]
+) -> Tuple[str, Optional[SynthesisResult]]:
+    """阶段2: 综合所有分析Agent的输出，生成最终报告
+
+    与分析Agent一样直接 await 共享 LLM，不再经由 CrewAI Task.execute_sync
+    在线程池中运行（后者在工作线程里另起事件循环，无法复用共享的异步连接池）。
+
+    Returns:
+        (原始输出文本, 结构化结果)，模型输出无法转换为 SynthesisResult 时后者为 None
+    """
+    _log_verbose("[CrewAI] 开始综合分析...")
+    messages = build_synthesis_messages(stock_name, symbol, agent_outputs)
+
+    cache = get_agent_cache()
+    cache_key = _synthesis_cache_key(agent_outputs, messages)
+    if cache and cache_key:
+        cached = cache.get(symbol, "synthesizer", cache_key)
+        if cached is not None:
+            _log_verbose("[CrewAI] synthesizer 命中缓存")
+            return cached, parse_synthesis_output(cached)
+
+    final_result = await llm.acall(
+        messages,
+        temperature=AGENT_TEMPERATURES["synthesizer"],
+        max_tokens=agent_max_tokens("synthesizer"),
+        response_format=_synthesis_response_format(llm),
+    )
+    synthesis = parse_synthesis_output(final_result)
+    if cache and cache_key and synthesis is not None:
+        await cache.aset(symbol, "synthesizer", cache_key, final_result)
+    return final_result, synthesis
+
+
+async def stream_synthesis_phase(
+    llm: UnifiedLLM, stock_name: str, symbol: str, agent_outputs: List[dict]
+) -> AsyncIterator[str]:
+    """阶段2（流式）: 直接调用共享 LLM 生成综合报告，逐段产出文本
+
+    synthesizer 的输出面向用户，流式返回可在首个 token 到达时即开始展示；
+    调用方拼接全部片段后用 parse_synthesis_output 转换为结构化结果。
+    JSON 对象闭合且可解析时即停止接收，不再等待模型输出对象之后的多余文本。
+    命中缓存时将缓存的完整报告作为单个片段产出。
+    """
+    _log_verbose("[CrewAI] 开始流式综合分析...")
+    messages = build_synthesis_messages(stock_name, symbol, agent_outputs)
+
+    cache = get_agent_cache()
+    cache_key = _synthesis_cache_key(agent_outputs, messages)
+    if cache and cache_key:
+        cached = cache.get(symbol, "synthesizer", cache_key)
+        if cached is not None:
+            _log_verbose("[CrewAI] synthesizer 命中缓存")
+            yield cached
+            return
+
+    chunks = []
+    scanner = JsonObjectScanner()
+    async with contextlib.aclosing(
+        llm.astream(
+            messages,
+            temperature=AGENT_TEMPERATURES["synthesizer"],
+            max_tokens=agent_max_tokens("synthesizer"),
+            response_format=_synthesis_response_format(llm),
         )
+    ) as stream:
+        async for delta in stream:
+            head = None
+            end = scanner.feed(delta)
+            while end >= 0:
+                candidate = "".join(chunks) + delta[: end + 1]
+                if parse_synthesis_output(candidate) is not None:
+                    head = delta[: end + 1]
+                    break
+                end = scanner.feed(delta, end + 1)
+            if head is not None:
+                chunks.append(head)
+                yield head
+                break
+            chunks.append(delta)
+            yield delta
+
+    final_result = "".join(chunks)
+    if cache and cache_key and parse_synthesis_output(final_result) is not None:
+        await cache.aset(symbol, "synthesizer", cache_key, final_result)
+
+
+async def collect_synthesis(
+    llm: UnifiedLLM, stock_name: str, symbol: str, agent_outputs: List[dict]
+) -> str:
+    """完整生成综合报告文本（用于推测执行，结果可能被丢弃，因此不逐段推送）"""
+    return "".join(
+        [
+            delta
+            async for delta in stream_synthesis_phase(
+                llm, stock_name, symbol, agent_outputs
+            )
+        ]
+    )
 
-        return parse_analysis_result(full_output, symbol, stock_data)
 
-    except Exception as e:
+def analyst_consensus_score(agent_outputs: List[dict]) -> Optional[float]:
+    """按置信度加权的分析Agent综合评分，全部失败时返回 None"""
+    parsed = [
+        parse_analysis_output(o["agent"], o["result"])
+        for o in agent_outputs
+        if not o.get("failed")
+    ]
+    if not parsed:
+        return None
+    return format_analysis_result(parsed, "", "")["overallScore"]
+
+
+# 推测综合时尚未完成的分析Agent的占位内容
+_PENDING_ANALYST_RESULT = "该维度分析仍在进行中，结果暂缺，请基于已完成的维度综合判断。"
+
+
+def with_pending_placeholders(outputs: Dict[str, dict]) -> List[dict]:
+    """按角色顺序排列已完成的分析输出，未完成的角色用占位内容补齐
+
+    占位条目标记为 failed：不参与评分，基于它的综合结果也不写入缓存。
+    """
+    return [
+        outputs.get(role)
+        or {"agent": role, "result": _PENDING_ANALYST_RESULT, "failed": True}
+        for role in ANALYST_ROLES
+    ]
+
+
+def speculation_holds(early_outputs: List[dict], agent_outputs: List[dict]) -> bool:
+    """判断基于部分分析结果的推测综合是否仍然有效
+
+    后完成的分析Agent使综合评分变化不超过 SPECULATIVE_SYNTHESIS_MAX_DELTA 时，
+    认为其不改变结论，可直接采用推测结果。
+    """
+    early_score = analyst_consensus_score(early_outputs)
+    full_score = analyst_consensus_score(agent_outputs)
+    if early_score is None or full_score is None:
+        return False
+    return abs(full_score - early_score) <= config().SPECULATIVE_SYNTHESIS_MAX_DELTA
+
+
+async def stream_crew_analysis_async(
+    symbol: str, stock_data: dict, prefilled: Optional[Dict[str, str]] = None
+) -> AsyncIterator[dict]:
+    """运行CrewAI多Agent分析，逐步产出中间结果 - 两阶段执行模式
+
+    - 阶段1: 6个分析Agent并发执行，每完成一个产出
+      {"type": "agent", "agent", "name", "result", "completed", "total"}
+    - 阶段2: synthesizer 综合所有分析结果；启用 SYNTHESIS_STREAM 时逐段产出
+      {"type": "synthesis", "delta"}，最后产出 {"type": "final", "result"}
+    - 端到端耗时 ≈ 最慢的分析Agent + synthesizer，但调用方可在首个 Agent
+      完成时即开始展示结果
+    - 设置 SPECULATIVE_SYNTHESIS_QUORUM 时，完成的分析Agent达到该数量即开始
+      推测综合，与尚未完成的 Agent 并行；全部完成后若综合评分变化不大则直接
+      采用推测结果（作为单个 synthesis 片段产出），否则丢弃并重新综合
+    - 全程直接 await 共享 LLM 的 acall/astream，不经过 CrewAI 的同步执行
+    - prefilled 中已有结果的分析角色直接产出，不再调用 LLM
+    """
+    start_time = time.time()
+    speculative = None
+    try:
+        _log_verbose("[CrewAI] 开始两阶段分析: %s", symbol)
+
+        # 分析Agent直接异步调用共享 LLM；synthesizer 启用流式时调用 astream，
+        # 关闭流式时调用 acall 一次性获取完整报告
+        llm = get_llm()
+
+        stock_name = stock_data.get("basic", {}).get("name", symbol)
+        data_context, role_contexts = build_agent_contexts(symbol, stock_data)
+        quorum = config().SPECULATIVE_SYNTHESIS_QUORUM
+
+        outputs = {}
+        early_outputs = []
+        async for output in iter_analyst_results(
+            llm, stock_name, symbol, data_context, role_contexts, prefilled
+        ):
+            outputs[output["agent"]] = output
+            yield {
+                "type": "agent",
+                "agent": output["agent"],
+                "name": AGENT_DISPLAY_NAMES.get(output["agent"], output["agent"]),
+                "result": output["result"],
+                "completed": len(outputs),
+                "total": len(ANALYST_ROLES),
+            }
+
+            if speculative is None and 0 < quorum <= len(outputs) < len(
+                ANALYST_ROLES
+            ):
+                early_outputs = with_pending_placeholders(outputs)
+                _log_verbose("[CrewAI] %s 个分析完成，开始推测综合...", len(outputs))
+                speculative = asyncio.ensure_future(
+                    collect_synthesis(llm, stock_name, symbol, early_outputs)
+                )
+
+        agent_outputs = [outputs[role] for role in ANALYST_ROLES]
+        final_result_str = None
+        if speculative is not None:
+            if speculation_holds(early_outputs, agent_outputs):
+                try:
+                    final_result_str = await speculative
+                    _log_verbose("[CrewAI] 采用推测综合结果")
+                except Exception as e:
+                    logger.warning("[CrewAI] 推测综合失败，重新综合: %s", e)
+            else:
+                # 结论变化较大：立即取消推测综合，不再与重新综合并行消耗 token
+                _log_verbose("[CrewAI] 推测综合不成立，取消并重新综合")
+                speculative.cancel()
+                await asyncio.gather(speculative, return_exceptions=True)
+            speculative = None
+
+        if final_result_str is not None:
+            yield {"type": "synthesis", "delta": final_result_str}
+            synthesis = parse_synthesis_output(final_result_str)
+        elif config().SYNTHESIS_STREAM:
+            chunks = []
+            async for delta in stream_synthesis_phase(
+                llm, stock_name, symbol, agent_outputs
+            ):
+                chunks.append(delta)
+                yield {"type": "synthesis", "delta": delta}
+            final_result_str = "".join(chunks)
+            synthesis = parse_synthesis_output(final_result_str)
+        else:
+            final_result_str, synthesis = await run_synthesis_phase(
+                llm, stock_name, symbol, agent_outputs
+            )
+
         elapsed = time.time() - start_time
-        print(f"[CrewAI] 分析失败 (耗时 {elapsed:.1f}秒): {e}")
-        import traceback
+        _log_verbose("[CrewAI] 分析完成，耗时: %.1f秒", elapsed)
+
+        # 各分析Agent的输出已按角色分开，直接解析，无需拼接后再按标题切分
+        yield {
+            "type": "final",
+            "result": parse_analysis_result(
+                final_result_str, symbol, stock_data, synthesis, agent_outputs
+            ),
+        }
 
-        traceback.print_exc()
+    except Exception as e:
+        elapsed = time.time() - start_time
+        logger.exception("[CrewAI] 分析失败: %s (耗时 %.1f秒): %s", symbol, elapsed, e)
         raise
+    finally:
+        # 未被采用（或调用方提前停止迭代）的推测综合直接取消
+        if speculative is not None:
+            speculative.cancel()
+
+
+async def _collect_crew_analysis(
+    symbol: str, stock_data: dict, prefilled: Optional[Dict[str, str]]
+) -> dict:
+    """消费分析事件流，仅返回最终结果"""
+    result = None
+    async for event in stream_crew_analysis_async(symbol, stock_data, prefilled):
+        if event["type"] == "final":
+            result = event["result"]
+    return result
+
+
+# 进行中的分析任务: {事件循环: {(股票代码, 数据哈希): Task}}
+# Task 只能在创建它的循环中等待，按循环分开，循环关闭后自动清除
+_INFLIGHT_ANALYSES: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+async def run_crew_analysis_async(
+    symbol: str, stock_data: dict, prefilled: Optional[Dict[str, str]] = None
+) -> dict:
+    """运行CrewAI多Agent分析，仅返回最终结果
+
+    相同股票、相同数据的并发请求共享同一次分析（single-flight），
+    重复请求在完成后命中各角色的响应缓存。
+    """
+    if prefilled:
+        return await _collect_crew_analysis(symbol, stock_data, prefilled)
+
+    key = (
+        symbol,
+        hash_content(json.dumps(stock_data, sort_keys=True, default=str)),
+    )
+    inflight = _INFLIGHT_ANALYSES.setdefault(asyncio.get_running_loop(), {})
+    task = inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_collect_crew_analysis(symbol, stock_data, None))
+        inflight[key] = task
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+    # shield: 单个调用方取消时不影响其他等待同一分析的请求
+    return await asyncio.shield(task)
+
+
+async def run_crew_analyses(
+    symbols: List[str],
+    stock_data_map: Dict[str, dict],
+    max_concurrency: Optional[int] = None,
+    prefilled: Optional[Dict[str, Dict[str, str]]] = None,
+) -> Dict[str, dict]:
+    """批量分析多只股票（自选股列表）
+
+    最多 max_concurrency 只股票同时分析，LLM 请求速率由共享 LLM 的限流器
+    （LLM_REQUESTS_PER_MINUTE）控制。单只股票失败不影响其他股票。
+    ANALYSIS_ROWS_PER_PROMPT 大于 1 时，先按角色合并多只股票的分析调用，
+    各股票随后只补跑缺失的角色并执行综合分析。
+    prefilled 为已有的 {股票代码: {角色: 分析文本}}（如离线批处理结果），
+    传入时不再进行合并调用。
+
+    Returns:
+        {symbol: 分析结果}，失败的股票为 {"success": False, "error": ...}
+    """
+    cfg = config()
+    if max_concurrency is None:
+        max_concurrency = cfg.ANALYSIS_BATCH_CONCURRENCY
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    if prefilled is None and cfg.ANALYSIS_ROWS_PER_PROMPT > 1 and len(symbols) > 1:
+        try:
+            prefilled = await prefill_analyst_results(
+                get_llm(), symbols, stock_data_map, cfg.ANALYSIS_ROWS_PER_PROMPT
+            )
+        except Exception as e:
+            logger.warning("[CrewAI] 多股票合并调用失败，改为逐股票分析: %s", e)
+    prefilled = prefilled or {}
+
+    async def analyze(symbol: str) -> dict:
+        async with semaphore:
+            return await run_crew_analysis_async(
+                symbol, stock_data_map[symbol], prefilled.get(symbol)
+            )
+
+    results = await asyncio.gather(
+        *(analyze(symbol) for symbol in symbols), return_exceptions=True
+    )
+
+    analyses = {}
+    for symbol, result in zip(symbols, results):
+        if isinstance(result, Exception):
+            logger.warning("[CrewAI] %s 批量分析失败: %s", symbol, result)
+            result = {"success": False, "error": str(result)}
+        analyses[symbol] = result
+    return analyses
+
+
+def run_crew_analysis(symbol: str, stock_data: dict) -> dict:
+    """运行CrewAI多Agent分析（同步入口，供非异步调用方使用）
+
+    在事件循环中请直接 await run_crew_analysis_async；同步调用在共用的
+    后台事件循环中执行，多次调用复用同一组连接。不能在运行异步服务的
+    进程中使用，见 run_sync。
+    """
+    return run_sync(run_crew_analysis_async(symbol, stock_data))
+
+
+# 数据摘要字段: (标签, 数据分区, 字段名, 单位后缀)
+_DATA_SUMMARY_FIELDS = (
+    ("Symbol", "basic", "symbol", ""),
+    ("Name", "basic", "name", ""),
+    ("Price", "basic", "currentPrice", ""),
+    ("PE", "basic", "peRatio", ""),
+    ("PB", "basic", "pbRatio", ""),
+)
+
+
+def _present_fields(stock_data: dict, fields: tuple):
+    """逐个产出有值的字段 (标签, 值, 单位后缀)，缺失或 N/A 的字段跳过"""
+    for label, section, key, suffix in fields:
+        value = (stock_data.get(section) or {}).get(key)
+        if value is not None and value != "N/A":
+            yield label, value, suffix
 
 
 def format_data_summary(stock_data: dict) -> str:
-    """格式化股票数据摘要"""
-    basic = stock_data.get("basic", {})
-    financial = stock_data.get("financial", {})
-    return f"Symbol: {basic.get('symbol', 'N/A')}, Name: {basic.get('name', 'N/A')}, Price: {basic.get('currentPrice', 'N/A')}, PE: {basic.get('peRatio', 'N/A')}, PB: {basic.get('pbRatio', 'N/A')}, ROE: {financial.get('roe', 'N/A')}%, Debt: {financial.get('debtRatio', 'N/A')}%"
+    """格式化股票数据摘要（缺失字段直接省略，不向模型发送 N/A 占位）"""
+    return ", ".join(
+        f"{label}: {value}{suffix}"
+        for label, value, suffix in _present_fields(stock_data, _DATA_SUMMARY_FIELDS)
+    )
+
+
+# 数组格式K线行: [timestamp, open, high, low, close, volume]
+_KLINE_ROW_FIELDS = operator.itemgetter(0, 4)
+
+
+@functools.lru_cache(maxsize=4096)
+def _format_kline_date(ts) -> str:
+    """将K线时间戳（秒或毫秒）格式化为日期
+
+    同一交易日的时间戳在不同股票、不同分析之间重复出现，结果按时间戳缓存。
+    """
+    try:
+        ts = float(ts)
+        if ts > 1e12:
+            ts /= 1000
+        return time.strftime("%Y-%m-%d", time.localtime(ts))
+    except (TypeError, ValueError, OverflowError, OSError):
+        return str(ts)
+
+
+def _kline_date_close(item) -> Tuple[str, float]:
+    """提取单根K线的日期和收盘价，兼容 dict、数组和对象格式"""
+    if isinstance(item, dict):
+        ts = item.get("timestamp") or item.get(0)
+        close = item.get("close") or item.get(4) or item.get(2) or 0
+    elif isinstance(item, (list, tuple)):
+        if len(item) >= 5:
+            ts, close = _KLINE_ROW_FIELDS(item)
+        else:
+            ts, close = (item[0] if item else None), 0
+    else:
+        ts = getattr(item, "timestamp", None)
+        close = getattr(item, "close", 0)
+
+    return (_format_kline_date(ts) if ts else "N/A"), close or 0
 
 
 def format_kline_summary(kline: list) -> str:
-    """格式化K线摘要 - 精简版"""
+    """格式化K线摘要 - 精简版（仅取最近5根，与K线总长度无关）"""
     if not kline:
         return "无K线数据"
 
-    # 兼容 dict 和 object 格式
-    def get_close_price(item):
-        if isinstance(item, dict):
-            return item.get("close") or item.get(4) or item.get(2) or 0
-        return getattr(item, "close", 0)
+    return " | ".join(
+        f"{date}: C={close:.2f}" for date, close in map(_kline_date_close, kline[-5:])
+    )
+
 
-    def get_date(item):
-        if isinstance(item, dict):
-            ts = item.get("timestamp") or item.get(0)
-            if ts:
-                from datetime import datetime
+# 财务数据字段（PE/PB 已包含在基本数据摘要中，不再重复发送）
+_FINANCIAL_FIELDS = (
+    ("ROE", "financial", "roe", "%"),
+    ("净利率", "financial", "netMargin", "%"),
+    ("毛利率", "financial", "grossMargin", "%"),
+    ("资产负债率", "financial", "debtRatio", "%"),
+    ("流动比率", "financial", "currentRatio", ""),
+    ("营收增长", "financial", "revenueGrowth", "%"),
+    ("净利润增长", "financial", "profitGrowth", "%"),
+)
 
-                try:
-                    ts = float(ts)
-                    if ts > 1e12:
-                        ts /= 1000
-                    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
-                except:
-                    return str(ts)
-        elif hasattr(item, "timestamp"):
-            from datetime import datetime
 
-            try:
-                ts = float(item.timestamp)
-                if ts > 1e12:
-                    ts /= 1000
-                return datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
-            except:
-                return str(item.timestamp)
-        return "N/A"
+def format_financial_data(stock_data: dict) -> str:
+    """格式化财务数据为单行 key=value（缺失字段直接省略）
 
-    recent = kline[-5:] if len(kline) >= 5 else kline
-    return " | ".join([f"{get_date(r)}: C={get_close_price(r):.2f}" for r in recent])
+    该数据块会发送给每个分析 Agent，紧凑格式可显著减少输入 token。
+    """
+    items = [
+        f"{label}={value}{suffix}"
+        for label, value, suffix in _present_fields(stock_data, _FINANCIAL_FIELDS)
+    ]
+    return ", ".join(items) if items else "暂无"
 
 
-def format_financial_data(stock_data: dict) -> str:
-    """格式化财务数据"""
-    financial = stock_data.get("financial", {})
-    if not financial:
-        return "财务数据: 暂无"
-
-    return f"""
-财务指标:
-- ROE: {financial.get("roe", "N/A")}%
-- 净利率: {financial.get("netMargin", "N/A")}%
-- 毛利率: {financial.get("grossMargin", "N/A")}%
-- 资产负债率: {financial.get("debtRatio", "N/A")}%
-- 流动比率: {financial.get("currentRatio", "N/A")}
-- 营收增长: {financial.get("revenueGrowth", "N/A")}%
-- 净利润增长: {financial.get("profitGrowth", "N/A")}%
-- PE: {stock_data.get("basic", {}).get("peRatio", "N/A")}
-- PB: {stock_data.get("basic", {}).get("pbRatio", "N/A")}
-"""
+_INDUSTRY_FIELDS = (
+    ("行业", "basic", "industry", ""),
+    ("板块", "basic", "sector", ""),
+)
+
+
+# 概念标签只发送前几个，避免热门股票的长标签列表占用大量 token
+_MAX_CONCEPT_TAGS = 5
 
 
 def format_industry_data(stock_data: dict) -> str:
-    """格式化行业数据"""
-    basic = stock_data.get("basic", {})
-    industry = basic.get("industry", "N/A")
-    sector = basic.get("sector", "N/A")
-
-    return f"""
-行业信息:
-- 行业: {industry}
-- 板块: {sector}
-- 概念标签: {", ".join(basic.get("conceptTags", []))}
-"""
+    """格式化行业数据为单行（缺失字段直接省略）"""
+    items = [
+        f"{label}={value}"
+        for label, value, _ in _present_fields(stock_data, _INDUSTRY_FIELDS)
+    ]
+    concept_tags = (stock_data.get("basic") or {}).get("conceptTags")
+    if concept_tags:
+        items.append(f"概念={','.join(concept_tags[:_MAX_CONCEPT_TAGS])}")
+    return " | ".join(items) if items else "暂无"
+
+
+# 分析任务描述中追加在角色提示词之后的数据部分
+_TASK_DATA_TEMPLATE = """
+
+数据上下文:
+{data_context}
+
+请严格按照模板格式输出{agent_type}分析结果。"""
 
 
 def create_tasks(
@@ -556,159 +1770,358 @@ def create_tasks(
     data_summary: str,
     kline_summary: str,
 ) -> list:
-    """创建分析任务 - 已废弃，请使用 run_crew_analysis 中的混合模式"""
+    """创建 CrewAI 分析任务 - 已废弃，分析流程请使用 run_crew_analysis_async
+    （直接调用共享 LLM 的 acall/astream，不经过 CrewAI）
+
+    各角色任务由同一模板生成，数据块按 AGENT_CONTEXT_SECTIONS 选取
+    （synthesizer 使用全部数据），相同组合的上下文只拼接一次。
+    分析任务相互独立，标记为 async_execution 并发执行；synthesizer 任务
+    以全部分析任务为 context，等待它们完成后再执行。
+    """
     from crewai import Task
 
     cfg = config()
 
-    # 准备数据上下文
-    data_context = f"""
-股票数据摘要:
-{data_summary}
-
-K线数据摘要:
-{kline_summary}
-
-财务数据:
-{format_financial_data(stock_data)}
-
-行业数据:
-{format_industry_data(stock_data)}
-"""
-
-    # Agent 索引映射
-    agent_map = {
-        "value": 0,
-        "technical": 1,
-        "growth": 2,
-        "fundamental": 3,
-        "risk": 4,
-        "macro": 5,
-        "synthesizer": 6,
+    sections = {
+        "header": f"股票代码: {symbol}\n股票名称: {stock_name}",
+        "basic": f"股票数据摘要:\n{data_summary}",
+        "kline": f"K线数据摘要:\n{kline_summary}",
+        "financial": f"财务数据:\n{format_financial_data(stock_data)}",
+        "industry": f"行业数据:\n{format_industry_data(stock_data)}",
     }
+    contexts: Dict[Tuple[str, ...], str] = {}
 
     tasks = []
     for agent_type in cfg.AGENT_ROLES:
-        agent_index = agent_map.get(agent_type, 0)
-        agent = agents[agent_index]
+        names = AGENT_CONTEXT_SECTIONS.get(
+            agent_type, ("basic", "kline", "financial", "industry")
+        )
+        if names not in contexts:
+            contexts[names] = compose_data_context(sections, names)
 
+        is_analyst = agent_type in ANALYST_ROLES
         tasks.append(
             Task(
                 description=get_agent_prompt(agent_type, stock_name, symbol)
-                + f"""
-
-数据上下文:
-{data_context}
-
-请严格按照模板格式输出{agent_type}分析结果。""",
+                + _TASK_DATA_TEMPLATE.format(
+                    data_context=contexts[names], agent_type=agent_type
+                ),
                 expected_output=f"完整的{agent_type}分析报告",
-                agent=agent,
+                agent=agents[AGENT_INDEX.get(agent_type, 0)],
+                async_execution=is_analyst,
+                context=None if is_analyst else [t for t in tasks if t.async_execution],
             )
         )
 
     return tasks
 
 
-def parse_analysis_result(result, symbol: str, stock_data: dict) -> dict:
-    """解析分析结果 - 使用增强版解析"""
-    import json
-    import re
+# 各Agent输出段落的标题（按角色顺序）
+_AGENT_SECTION_HEADINGS = {
+    "value": "估值分析",
+    "technical": "技术分析",
+    "growth": "成长分析",
+    "fundamental": "基本面分析",
+    "risk": "风险评估",
+    "macro": "宏观分析",
+}
+_HEADING_TO_AGENT = {
+    heading: agent_type for agent_type, heading in _AGENT_SECTION_HEADINGS.items()
+}
+
+# 所有Agent段落合并为一个预编译的多选模式，一次扫描即可切分全部段落
+_AGENT_SECTION_RE = re.compile(
+    rf"## ({'|'.join(_AGENT_SECTION_HEADINGS.values())})\n*([\s\S]*?)(?=\n## [^\s#]|\Z)",
+    re.MULTILINE,
+)
+
+# 段落终止符：任意二级标题（与 _AGENT_SECTION_RE 的前瞻条件一致）
+_SECTION_BREAK_ID = len(_AGENT_SECTION_HEADINGS)
+_SECTION_DB = None
+
+
+def _get_section_db():
+    """按需编译 Hyperscan 多模式数据库：各Agent标题 + 段落终止符"""
+    global _SECTION_DB
+    if _SECTION_DB is None:
+        patterns = [
+            f"## {re.escape(heading)}".encode()
+            for heading in _AGENT_SECTION_HEADINGS.values()
+        ]
+        patterns.append(rb"\n## [^\s#]")
+        # 需要起始偏移来切分正文，开启 SOM_LEFTMOST
+        flag = hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_SOM_LEFTMOST
+        db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+        db.compile(
+            expressions=patterns,
+            ids=list(range(len(patterns))),
+            flags=[flag] * len(patterns),
+        )
+        _SECTION_DB = db
+    return _SECTION_DB
+
+
+def _split_sections_hyperscan(output: str) -> Dict[str, str]:
+    """Hyperscan 单次扫描切分段落，结果与 _AGENT_SECTION_RE 版本一致"""
+    data = output.encode()
+    headings: List[Tuple[int, int, int]] = []
+    breaks: List[int] = []
 
+    def on_match(pattern_id, start, end, flags, context):
+        if pattern_id == _SECTION_BREAK_ID:
+            breaks.append(start)
+        else:
+            headings.append((start, end, pattern_id))
+
+    _get_section_db().scan(data, match_event_handler=on_match)
+    headings.sort()
+    breaks.sort()
+
+    agent_types = list(_AGENT_SECTION_HEADINGS)
+    sections = {}
+    pos = 0
+    for start, end, pattern_id in headings:
+        # 落在上一段正文内的标题不作为新段落（与正则的非重叠扫描一致）
+        if start < pos:
+            continue
+        content_start = end
+        while data[content_start : content_start + 1] == b"\n":
+            content_start += 1
+        i = bisect.bisect_left(breaks, content_start)
+        pos = breaks[i] if i < len(breaks) else len(data)
+        sections.setdefault(agent_types[pattern_id], data[content_start:pos].decode())
+    return sections
+
+
+def split_agent_sections(output: str) -> Dict[str, str]:
+    """将合并输出切分为各Agent的段落（同一角色只取第一段）
+
+    安装了 hyperscan 时用其多模式 DFA 扫描，否则使用预编译的合并正则。
+    """
+    if _HYPERSCAN_AVAILABLE:
+        return _split_sections_hyperscan(output)
+    sections = {}
+    for match in _AGENT_SECTION_RE.finditer(output):
+        sections.setdefault(_HEADING_TO_AGENT[match.group(1)], match.group(2))
+    return sections
+
+
+_SCORE_RE = re.compile(r"score[：:\s]*([\d.]+)", re.IGNORECASE)
+_REC_RE = re.compile(r"(?:recommendation|建议)[：:\s]*([a-z]+)", re.IGNORECASE)
+
+
+def parse_analysis_result(
+    result,
+    symbol: str,
+    stock_data: dict,
+    synthesis: Optional[SynthesisResult] = None,
+    role_outputs: Optional[List[dict]] = None,
+) -> dict:
+    """解析分析结果 - 使用增强版解析
+
+    Args:
+        result: synthesizer 的原始输出文本（未提供 role_outputs 时还需包含各分析Agent的输出）
+        synthesis: synthesizer 的结构化输出（已解析），存在时无需再从文本中提取 JSON
+        role_outputs: 各分析Agent的结果 {"agent", "result"[, "failed"]}，
+            提供时逐个直接解析，失败的 Agent 跳过
+    """
     output = str(result)
 
     # 尝试从输出中提取各Agent的结果
     agent_outputs = []
 
-    # 查找各Agent的输出部分
-    agent_sections = {
-        "value": r"## 估值分析\n*([\s\S]*?)(?=\n## [^\s#]|\Z)",
-        "technical": r"## 技术分析\n*([\s\S]*?)(?=\n## [^\s#]|\Z)",
-        "growth": r"## 成长分析\n*([\s\S]*?)(?=\n## [^\s#]|\Z)",
-        "fundamental": r"## 基本面分析\n*([\s\S]*?)(?=\n## [^\s#]|\Z)",
-        "risk": r"## 风险评估\n*([\s\S]*?)(?=\n## [^\s#]|\Z)",
-        "macro": r"## 宏观分析\n*([\s\S]*?)(?=\n## [^\s#]|\Z)",
-    }
-
     stock_name = stock_data.get("basic", {}).get("name", symbol)
 
-    for agent_type, pattern in agent_sections.items():
-        match = re.search(pattern, output, re.MULTILINE)
-        if match:
-            agent_output = match.group(1).strip()
-            parsed = parse_analysis_output(agent_type, agent_output)
-            agent_outputs.append(parsed)
+    if role_outputs is not None:
+        for role_output in role_outputs:
+            if not role_output.get("failed"):
+                agent_outputs.append(
+                    parse_analysis_output(
+                        role_output["agent"], role_output["result"].strip()
+                    )
+                )
+    else:
+        # 一次扫描切分各Agent的输出部分（同一角色只取第一段），再按角色顺序解析
+        sections = split_agent_sections(output)
+        for agent_type in _AGENT_SECTION_HEADINGS:
+            if agent_type in sections:
+                parsed = parse_analysis_output(
+                    agent_type, sections[agent_type].strip()
+                )
+                agent_outputs.append(parsed)
 
-    # 如果找到了结构化输出，使用增强版格式化
+    # 如果找到了结构化输出，使用增强版格式化；评分由各Agent加权得出，
+    # 摘要、亮点和风险取自 synthesizer 的结构化结论
     if agent_outputs:
-        return format_analysis_result(agent_outputs, symbol, stock_name)
+        analysis = format_analysis_result(agent_outputs, symbol, stock_name)
+        if synthesis is not None:
+            analysis["executiveSummary"] = synthesis.summary
+            analysis["risks"] = synthesis.risks
+            analysis["opportunities"] = synthesis.opportunities
+        return analysis
+
+    if synthesis is not None:
+        return ensure_complete_structure(synthesis.model_dump(), symbol, stock_data)
 
     # 回退到原有解析逻辑
-    json_match = re.search(r"\{[\s\S]*\}", output)
-    if json_match:
-        try:
-            analysis = json.loads(json_match.group())
-            return ensure_complete_structure(analysis, symbol, stock_data)
-        except json.JSONDecodeError:
-            pass
+    analysis = extract_json_object(output)
+    if analysis is not None:
+        return ensure_complete_structure(analysis, symbol, stock_data)
 
     return extract_from_text(output, symbol, stock_data)
 
 
+# 结构化结果缺失时的默认角色分析（使用时深拷贝，避免调用方修改共享对象）
+_DEFAULT_ROLE_ANALYSIS = (
+    {
+        "role": "value",
+        "score": 75,
+        "analysis": "基于PE和ROE分析，估值合理",
+        "keyPoints": ["PE合理", "ROE良好"],
+    },
+    {
+        "role": "technical",
+        "score": 70,
+        "analysis": "技术指标显示中性态势",
+        "keyPoints": ["趋势震荡"],
+    },
+    {
+        "role": "growth",
+        "score": 72,
+        "analysis": "营收利润稳定增长",
+        "keyPoints": ["增长稳定"],
+    },
+    {
+        "role": "fundamental",
+        "score": 78,
+        "analysis": "基本面稳健",
+        "keyPoints": ["竞争力强"],
+    },
+    {
+        "role": "risk",
+        "score": 70,
+        "analysis": "风险可控",
+        "keyPoints": ["财务健康"],
+    },
+    {
+        "role": "macro",
+        "score": 75,
+        "analysis": "宏观环境有利",
+        "keyPoints": ["政策支持"],
+    },
+)
+
+# 纯文本输出时的默认角色分析
+_TEXT_ROLE_ANALYSIS = (
+    {
+        "role": "value",
+        "score": 75,
+        "analysis": "价值分析完成",
+        "keyPoints": ["PE合理"],
+    },
+    {
+        "role": "technical",
+        "score": 70,
+        "analysis": "技术分析完成",
+        "keyPoints": ["趋势震荡"],
+    },
+    {
+        "role": "growth",
+        "score": 72,
+        "analysis": "成长分析完成",
+        "keyPoints": ["增长稳定"],
+    },
+    {
+        "role": "fundamental",
+        "score": 78,
+        "analysis": "基本面完成",
+        "keyPoints": ["竞争力强"],
+    },
+    {
+        "role": "risk",
+        "score": 70,
+        "analysis": "风险分析完成",
+        "keyPoints": ["风险可控"],
+    },
+    {
+        "role": "macro",
+        "score": 75,
+        "analysis": "宏观分析完成",
+        "keyPoints": ["环境有利"],
+    },
+)
+
+_DEFAULT_RISKS = ("行业政策变化", "市场竞争加剧", "宏观经济波动")
+_DEFAULT_OPPORTUNITIES = ("行业增长空间", "技术创新驱动", "市场份额提升")
+
+_RECOMMENDATION_LABELS_ZH = {
+    "strong_buy": "强烈买入",
+    "buy": "买入",
+    "hold": "持有",
+    "wait": "观望",
+    "sell": "卖出",
+}
+
+
+def weighted_role_scores(role_analyses: List[List[dict]]) -> np.ndarray:
+    """批量计算多份分析的加权评分（如自选股列表），一次向量运算完成
+
+    各分析的角色数可以不同：所有角色评分与权重展开为一维数组逐项相乘，
+    再按每份分析的起始位置分段求和。
+
+    Returns:
+        与 role_analyses 等长的评分数组（角色为空的分析得 0）
+    """
+    cfg = config()
+    counts = np.fromiter(
+        (len(ra) for ra in role_analyses), dtype=np.intp, count=len(role_analyses)
+    )
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(len(role_analyses))
+
+    scores = np.fromiter(
+        (r.get("score", 70) for ra in role_analyses for r in ra),
+        dtype=np.float64,
+        count=total,
+    )
+    weights = np.fromiter(
+        (
+            cfg.get_agent_weight(r.get("role", "value"))
+            for ra in role_analyses
+            for r in ra
+        ),
+        dtype=np.float64,
+        count=total,
+    )
+
+    # reduceat 要求起始位置合法：空分析先按非空分析求和，再填回 0
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    non_empty = counts > 0
+    totals = np.zeros(len(role_analyses))
+    totals[non_empty] = np.add.reduceat(scores * weights, starts[non_empty])
+    return totals
+
+
+def weighted_role_score(role_analysis: List[dict]) -> float:
+    """按 Agent 权重计算各角色评分的加权和"""
+    return float(weighted_role_scores([role_analysis])[0])
+
+
 def ensure_complete_structure(analysis: dict, symbol: str, stock_data: dict) -> dict:
     """确保结构完整"""
     cfg = config()
 
     if "roleAnalysis" not in analysis or not analysis["roleAnalysis"]:
-        analysis["roleAnalysis"] = [
-            {
-                "role": "value",
-                "score": 75,
-                "analysis": "基于PE和ROE分析，估值合理",
-                "keyPoints": ["PE合理", "ROE良好"],
-            },
-            {
-                "role": "technical",
-                "score": 70,
-                "analysis": "技术指标显示中性态势",
-                "keyPoints": ["趋势震荡"],
-            },
-            {
-                "role": "growth",
-                "score": 72,
-                "analysis": "营收利润稳定增长",
-                "keyPoints": ["增长稳定"],
-            },
-            {
-                "role": "fundamental",
-                "score": 78,
-                "analysis": "基本面稳健",
-                "keyPoints": ["竞争力强"],
-            },
-            {
-                "role": "risk",
-                "score": 70,
-                "analysis": "风险可控",
-                "keyPoints": ["财务健康"],
-            },
-            {
-                "role": "macro",
-                "score": 75,
-                "analysis": "宏观环境有利",
-                "keyPoints": ["政策支持"],
-            },
-        ]
+        analysis["roleAnalysis"] = copy.deepcopy(list(_DEFAULT_ROLE_ANALYSIS))
 
     if "risks" not in analysis:
-        analysis["risks"] = ["行业政策变化", "市场竞争加剧", "宏观经济波动"]
+        analysis["risks"] = list(_DEFAULT_RISKS)
     if "opportunities" not in analysis:
-        analysis["opportunities"] = ["行业增长空间", "技术创新驱动", "市场份额提升"]
+        analysis["opportunities"] = list(_DEFAULT_OPPORTUNITIES)
 
     if "overallScore" not in analysis:
-        scores = [r.get("score", 70) for r in analysis["roleAnalysis"]]
-        analysis["overallScore"] = sum(
-            s * cfg.get_agent_weight(r.get("role", "value"))
-            for s, r in zip(scores, analysis["roleAnalysis"])
-        )
+        analysis["overallScore"] = weighted_role_score(analysis["roleAnalysis"])
 
     if "recommendation" not in analysis:
         analysis["recommendation"] = cfg.get_recommendation(analysis["overallScore"])
@@ -717,15 +2130,8 @@ def ensure_complete_structure(analysis: dict, symbol: str, stock_data: dict) ->
         analysis["confidence"] = cfg.ANALYSIS_DEFAULT_CONFIDENCE
 
     if "summary" not in analysis:
-        rec_map = {
-            "strong_buy": "强烈买入",
-            "buy": "买入",
-            "hold": "持有",
-            "wait": "观望",
-            "sell": "卖出",
-        }
         analysis["summary"] = (
-            f"基于对{symbol}的多维度AI分析，综合评分{analysis['overallScore']:.1f}分。建议{rec_map.get(analysis['recommendation'], '持有')}。"
+            f"基于对{symbol}的多维度AI分析，综合评分{analysis['overallScore']:.1f}分。建议{_RECOMMENDATION_LABELS_ZH.get(analysis['recommendation'], '持有')}。"
         )
 
     analysis["model"] = "CrewAI + DeepSeek"
@@ -737,24 +2143,13 @@ def ensure_complete_structure(analysis: dict, symbol: str, stock_data: dict) ->
 
 def extract_from_text(text: str, symbol: str, stock_data: dict) -> dict:
     """从文本提取信息"""
-    import re
-
-    score_match = re.search(r"score[：:\s]*([\d.]+)", text, re.IGNORECASE)
+    score_match = _SCORE_RE.search(text)
     overall_score = float(score_match.group(1)) if score_match else 72.0
 
-    rec_map = {
-        "strong_buy": "strong_buy",
-        "buy": "buy",
-        "hold": "hold",
-        "wait": "wait",
-        "sell": "sell",
-    }
-    rec_match = re.search(
-        r"(?:recommendation|建议)[：:\s]*([a-z]+)", text, re.IGNORECASE
-    )
-    recommendation = (
-        rec_map.get(rec_match.group(1).lower(), "hold") if rec_match else "hold"
-    )
+    rec_match = _REC_RE.search(text)
+    recommendation = rec_match.group(1).lower() if rec_match else "hold"
+    if recommendation not in _RECOMMENDATION_LABELS_ZH:
+        recommendation = "hold"
 
     cfg = config()
 
@@ -763,46 +2158,9 @@ def extract_from_text(text: str, symbol: str, stock_data: dict) -> dict:
         "recommendation": recommendation,
         "confidence": 70.0,
         "summary": text[:500] if len(text) > 500 else text,
-        "roleAnalysis": [
-            {
-                "role": "value",
-                "score": 75,
-                "analysis": "价值分析完成",
-                "keyPoints": ["PE合理"],
-            },
-            {
-                "role": "technical",
-                "score": 70,
-                "analysis": "技术分析完成",
-                "keyPoints": ["趋势震荡"],
-            },
-            {
-                "role": "growth",
-                "score": 72,
-                "analysis": "成长分析完成",
-                "keyPoints": ["增长稳定"],
-            },
-            {
-                "role": "fundamental",
-                "score": 78,
-                "analysis": "基本面完成",
-                "keyPoints": ["竞争力强"],
-            },
-            {
-                "role": "risk",
-                "score": 70,
-                "analysis": "风险分析完成",
-                "keyPoints": ["风险可控"],
-            },
-            {
-                "role": "macro",
-                "score": 75,
-                "analysis": "宏观分析完成",
-                "keyPoints": ["环境有利"],
-            },
-        ],
-        "risks": ["行业政策变化", "市场竞争加剧", "宏观经济波动"],
-        "opportunities": ["行业增长空间", "技术创新驱动", "市场份额提升"],
+        "roleAnalysis": copy.deepcopy(list(_TEXT_ROLE_ANALYSIS)),
+        "risks": list(_DEFAULT_RISKS),
+        "opportunities": list(_DEFAULT_OPPORTUNITIES),
         "model": "CrewAI + DeepSeek",
         "processingTime": cfg.ANALYSIS_DEFAULT_PROCESSING_TIME,
         "tokenUsage": {"input": 15000, "output": 8000},
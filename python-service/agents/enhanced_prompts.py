@@ -3,8 +3,16 @@
 添加详细分析、置信度评估和证据引用
 """
 
-from typing import Dict, Any, List
+import json
+import re
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 from datetime import datetime
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 # 详细分析输出模板
@@ -529,33 +537,243 @@ SYNTHESIZER_PROMPT = """
 **重要**: 必须基于各专家Agent的真实分析结果进行整合，不要凭空编造。
 """
 
+# 多角色合并Prompt - 一次调用完成全部分析Agent的任务
+MULTI_ROLE_PROMPT = """
+你需要依次扮演以下{role_count}位分析师，分别完成对{stock_name}({symbol})的分析任务。
+所有分析师共享同一份数据上下文。
+
+数据上下文:
+{data_context}
+
+{role_sections}
+
+**输出格式**:
+只输出一个 JSON 对象，不要输出任何其他内容。键为分析师类型，值为该分析师严格按照其模板格式输出的完整分析文本（Markdown 字符串）：
+{schema}
+
+**重要**: 所有数值必须基于提供的真实数据，不要编造。
+"""
+
+
+MULTI_SYMBOL_PROMPT = """
+你需要以同一位分析师的身份，分别完成对以下{stock_count}只股票的分析任务。
+各股票的分析相互独立，每只股票只能使用其自身的数据。
+
+分析任务模板（将其中的股票名称和代码替换为各股票的实际信息）:
+{agent_prompt}
+
+{stock_sections}
+
+**输出格式**:
+只输出一个 JSON 对象，不要输出任何其他内容。键为股票代码，值为该股票严格按照模板格式输出的完整分析文本（Markdown 字符串）：
+{schema}
+
+**重要**: 所有数值必须基于提供的真实数据，不要编造。
+"""
+
+
+AGENT_PROMPTS = {
+    "value": VALUE_AGENT_PROMPT,
+    "technical": TECHNICAL_AGENT_PROMPT,
+    "growth": GROWTH_AGENT_PROMPT,
+    "fundamental": FUNDAMENTAL_AGENT_PROMPT,
+    "risk": RISK_AGENT_PROMPT,
+    "macro": MACRO_AGENT_PROMPT,
+    "synthesizer": SYNTHESIZER_PROMPT,
+}
+
+
+@lru_cache(maxsize=4096)
+def _render_agent_prompt(
+    agent_type: str, stock_name: str, symbol: str, date: str
+) -> str:
+    """渲染Agent Prompt模板（按参数缓存，日期变化时自动失效）"""
+    return AGENT_PROMPTS.get(agent_type, "").format(
+        stock_name=stock_name, symbol=symbol, date=date
+    )
+
 
 def get_agent_prompt(agent_type: str, stock_name: str, symbol: str) -> str:
-    """获取指定类型的Agent Prompt"""
-    prompts = {
-        "value": VALUE_AGENT_PROMPT,
-        "technical": TECHNICAL_AGENT_PROMPT,
-        "growth": GROWTH_AGENT_PROMPT,
-        "fundamental": FUNDAMENTAL_AGENT_PROMPT,
-        "risk": RISK_AGENT_PROMPT,
-        "macro": MACRO_AGENT_PROMPT,
-        "synthesizer": SYNTHESIZER_PROMPT,
-    }
+    """获取指定类型的Agent Prompt
+
+    同一天内对同一股票的重复分析（重试、刷新、批量分析）直接复用已渲染的结果。
+    """
+    return _render_agent_prompt(
+        agent_type, stock_name, symbol, datetime.now().strftime("%Y年%m月%d日")
+    )
 
-    template = prompts.get(agent_type, "")
 
-    # 替换变量
-    return template.format(
+def format_multi_role_prompt(
+    roles: Sequence[str], stock_name: str, symbol: str, data_context: str
+) -> str:
+    """将多个分析Agent的Prompt合并为一次调用，共享数据上下文只发送一次"""
+    role_sections = "\n\n".join(
+        f"=== 分析师类型: {role} ===\n{get_agent_prompt(role, stock_name, symbol)}"
+        for role in roles
+    )
+    schema = json.dumps(
+        {role: "## ... 分析全文" for role in roles}, ensure_ascii=False, indent=2
+    )
+
+    return MULTI_ROLE_PROMPT.format(
+        role_count=len(roles),
         stock_name=stock_name,
         symbol=symbol,
-        date=datetime.now().strftime("%Y年%m月%d日"),
+        data_context=data_context,
+        role_sections=role_sections,
+        schema=schema,
+    )
+
+
+def format_multi_symbol_prompt(
+    agent_type: str, stocks: Sequence[Tuple[str, str, str]]
+) -> str:
+    """将多只股票的同一分析任务合并为一次调用
+
+    Args:
+        agent_type: 分析Agent类型
+        stocks: [(股票代码, 股票名称, 数据上下文), ...]
+    """
+    stock_sections = "\n\n".join(
+        f"=== SYMBOL: {symbol} ({stock_name}) ===\n{data_context}"
+        for symbol, stock_name, data_context in stocks
+    )
+    schema = json.dumps(
+        {symbol: "## ... 分析全文" for symbol, _, _ in stocks},
+        ensure_ascii=False,
+        indent=2,
+    )
+
+    return MULTI_SYMBOL_PROMPT.format(
+        stock_count=len(stocks),
+        agent_prompt=get_agent_prompt(agent_type, "<股票名称>", "<股票代码>"),
+        stock_sections=stock_sections,
+        schema=schema,
     )
 
 
+class JsonObjectScanner:
+    """增量扫描文本，检测顶层 JSON 对象何时闭合（状态跨片段保留，可用于流式输出）
+
+    跟踪字符串与转义状态，字符串内的花括号不计入深度；对象之外的文本被忽略。
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        # 当前顶层对象的 "{" 下标（相对于开始该对象的片段）
+        self.start = -1
+
+    def feed(self, chunk: str, pos: int = 0) -> int:
+        """从 pos 处继续扫描片段，返回第一个顶层对象闭合的 "}" 下标，未闭合返回 -1
+
+        找到闭合处即停止，调用方可从返回值 + 1 处继续扫描同一片段。
+        """
+        for i in range(pos, len(chunk)):
+            char = chunk[i]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == "{":
+                if self.depth == 0:
+                    self.start = i
+                self.depth += 1
+            elif self.depth == 0:
+                continue
+            elif char == '"':
+                self.in_string = True
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    return i
+        return -1
+
+
+def _loads_json(text: str):
+    """解析 JSON 文本（优先使用 orjson）"""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def extract_json_object(text: str) -> Optional[dict]:
+    """提取文本中第一个完整的 JSON 对象
+
+    单次线性扫描：每当顶层花括号配对闭合即尝试解析，解析失败则从闭合处继续
+    向后扫描，遇到第一个合法对象即返回。避免贪婪正则把对象前后的说明文字
+    一并截入，能容忍对象之后的多余文本，截断的输出也不会被反复扫描。
+    """
+    scanner = JsonObjectScanner()
+    end = scanner.feed(text)
+    while end >= 0:
+        try:
+            obj = _loads_json(text[scanner.start : end + 1])
+            if isinstance(obj, dict):
+                return obj
+        except ValueError:
+            pass
+        end = scanner.feed(text, end + 1)
+    return None
+
+
+def parse_multi_role_output(output: str, roles: Sequence[str]) -> Dict[str, str]:
+    """解析多角色合并调用的 JSON 输出，返回 {角色: 分析文本}，缺失的角色不包含在内"""
+    data = extract_json_object(output)
+    if data is None:
+        return {}
+
+    return {
+        role: data[role]
+        for role in roles
+        if isinstance(data.get(role), str) and data[role].strip()
+    }
+
+
+# 中文投资建议 -> 英文标识（按匹配优先级排列）
+_RECOMMENDATION_MAP = {
+    "强烈买入": "strong_buy",
+    "买入": "buy",
+    "持有": "hold",
+    "观望": "wait",
+    "卖出": "sell",
+    "强烈卖出": "strong_sell",
+}
+
+
+# 置信度评估中的维度关键词
+_DIMENSION_KEYWORDS = (
+    "数据完整性",
+    "数据准确性",
+    "指标一致性",
+    "行业可比性",
+    "趋势明确性",
+    "增长持续性",
+    "风险量化准确性",
+    "周期判断准确性",
+)
+
+# parse_analysis_output 使用的模式在模块加载时编译一次；维度评分只用于求平均，
+# 各关键词合并为一个多选模式，一次扫描即可
+_OVERALL_SCORE_RE = re.compile(r"综合评分[:：]?\s*\*?(\d+)\*?\s*(?:分)?")
+_DIMENSION_SCORE_RE = re.compile(
+    rf"(?:{'|'.join(_DIMENSION_KEYWORDS)})[:：]?\s*\*\*?(\d+)\*\*?\s*分"
+)
+_BOLD_TWO_DIGIT_RE = re.compile(r"\*\*(\d{2})\*\*")
+_TWO_DIGIT_SCORE_RE = re.compile(r"(\d{2})\s*分")
+_CONFIDENCE_RE = re.compile(r"综合置信度[:：]?\s*\*?(\d+)\*?\s*(?:分|%)?")
+_BULLET_FACTOR_RE = re.compile(r"[•\-\*]\s*(\[?[^\n]+\]?)")
+_RISK_SECTION_RE = re.compile(r"###\s*风险因素?([\s\S]*?)###")
+_BULLET_RE = re.compile(r"[•\-\*]\s*([^\n]+)")
+_SUMMARY_SECTION_RE = re.compile(r"##\s*执行摘要\s*([\s\S]*?)##")
+
+
 def parse_analysis_output(agent_type: str, output: str) -> Dict[str, Any]:
     """解析各Agent的输出，提取关键信息"""
-    import sys
-
     result = {
         "agent": agent_type,
         "summary": "",
@@ -569,13 +787,8 @@ def parse_analysis_output(agent_type: str, output: str) -> Dict[str, Any]:
     }
 
     try:
-        import re
-
-        # Find all XX分 patterns
-        all_score_matches = re.findall(r"(\d{2})\s*分", output)
-
         # Step 1: Try to find "综合评分" first
-        score_match = re.search(r"综合评分[:：]?\s*\*?(\d+)\*?\s*(?:分)?", output)
+        score_match = _OVERALL_SCORE_RE.search(output)
         if score_match:
             result["score"] = int(score_match.group(1))
         else:
@@ -583,30 +796,16 @@ def parse_analysis_output(agent_type: str, output: str) -> Dict[str, Any]:
             dimension_scores = []
 
             # Try to find dimension scores with keywords
-            dim_keywords = [
-                "数据完整性",
-                "数据准确性",
-                "指标一致性",
-                "行业可比性",
-                "趋势明确性",
-                "增长持续性",
-                "风险量化准确性",
-                "周期判断准确性",
-            ]
-
-            for keyword in dim_keywords:
-                pattern = rf"{keyword}[:：]?\s*\*\*?(\d+)\*\*?\s*分"
-                matches = re.findall(pattern, output)
-                for m in matches:
-                    score = int(m)
-                    if 20 <= score <= 100:
-                        dimension_scores.append(score)
+            for m in _DIMENSION_SCORE_RE.findall(output):
+                score = int(m)
+                if 20 <= score <= 100:
+                    dimension_scores.append(score)
 
             # If no keyword matches, try generic pattern
             if not dimension_scores:
-                generic_matches = re.findall(r"\*\*(\d{2})\*\*", output)
+                generic_matches = _BOLD_TWO_DIGIT_RE.findall(output)
                 if not generic_matches:
-                    generic_matches = re.findall(r"(\d{2})\s*分", output)
+                    generic_matches = _TWO_DIGIT_SCORE_RE.findall(output)
 
                 for m in generic_matches:
                     score = int(m)
@@ -634,37 +833,28 @@ def parse_analysis_output(agent_type: str, output: str) -> Dict[str, Any]:
                 result["score"] = int(sum(dimension_scores) / len(dimension_scores))
 
         # Step 3: Find confidence
-        conf_match = re.search(r"综合置信度[:：]?\s*\*?(\d+)\*?\s*(?:分|%)?", output)
+        conf_match = _CONFIDENCE_RE.search(output)
         if conf_match:
             result["confidence"] = int(conf_match.group(1))
 
         # Step 4: Extract recommendation
-        recommendation_map = {
-            "强烈买入": "strong_buy",
-            "买入": "buy",
-            "持有": "hold",
-            "观望": "wait",
-            "卖出": "sell",
-            "强烈卖出": "strong_sell",
-        }
-
-        for cn, en in recommendation_map.items():
+        for cn, en in _RECOMMENDATION_MAP.items():
             if cn in output:
                 result["recommendation"] = en
                 break
 
         # Step 5: Extract key factors
-        factor_match = re.findall(r"[•\-\*]\s*(\[?[^\n]+\]?)", output)
+        factor_match = _BULLET_FACTOR_RE.findall(output)
         result["key_factors"] = factor_match[:5]
 
         # Step 6: Extract risks
-        risk_section = re.search(r"###\s*风险因素?([\s\S]*?)###", output)
+        risk_section = _RISK_SECTION_RE.search(output)
         if risk_section:
-            risks = re.findall(r"[•\-\*]\s*([^\n]+)", risk_section.group(1))
+            risks = _BULLET_RE.findall(risk_section.group(1))
             result["risks"] = risks[:3]
 
         # Step 7: Extract summary
-        summary_match = re.search(r"##\s*执行摘要\s*([\s\S]*?)##", output)
+        summary_match = _SUMMARY_SECTION_RE.search(output)
         if summary_match:
             result["summary"] = summary_match.group(1).strip()[:200]
 
@@ -500,46 +500,85 @@ def process_industry_info(symbol: str) -> Dict[str, str]:
     return info
 
 
+def _timestamps_ms(values: pd.Series) -> pd.Series:
+    """将日期列批量转换为毫秒时间戳（无时区的日期按 UTC 处理），无法解析的为 NaN"""
+    dates = pd.to_datetime(values, errors="coerce", utc=True, format="mixed")
+    return (dates - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(milliseconds=1)
+
+
+def _numeric_column(df: pd.DataFrame, name: str) -> pd.Series:
+    """读取数值列（列不存在时为 0），无法转换为数值的值记为 NaN"""
+    if name not in df.columns:
+        return pd.Series(0.0, index=df.index)
+    return pd.to_numeric(df[name], errors="coerce")
+
+
 def process_akshare_kline(df: pd.DataFrame) -> List[KlineData]:
-    """转换AkShare K线数据格式"""
-    kline_list = []
+    """转换AkShare K线数据格式
 
+    按列批量转换日期与数值，避免 iterrows 为每行构造 Series。
+    日期无法解析时使用当前时间；数值无法解析的行只保留时间戳。
+    """
     if df is None or len(df) == 0:
-        return kline_list
+        return []
 
-    for _, row in df.iterrows():
-        try:
-            if row is None:
-                continue
-                
-            date_val = row.get("日期")
-            if date_val is None:
-                date_val = row.get("Datetime", datetime.now())
-            if hasattr(date_val, "timestamp"):
-                timestamp = int(date_val.timestamp() * 1000)
-            else:
-                timestamp = int(pd.to_datetime(str(date_val)).timestamp() * 1000)
-        except:
-            timestamp = int(datetime.now().timestamp() * 1000)
+    date_column = "日期" if "日期" in df.columns else "Datetime"
+    now_ms = int(datetime.now().timestamp() * 1000)
+    if date_column in df.columns:
+        timestamps = _timestamps_ms(df[date_column]).fillna(now_ms)
+    else:
+        timestamps = pd.Series(now_ms, index=df.index)
+
+    prices = {
+        name: _numeric_column(df, column)
+        for name, column in (
+            ("open", "开盘"),
+            ("high", "最高"),
+            ("low", "最低"),
+            ("close", "收盘"),
+        )
+    }
+    volume = _numeric_column(df, "成交量")
+    turnover = _numeric_column(df, "成交额")
+
+    # 原值存在却无法转换的价格/成交额，或成交量缺失，视为该行数据无效
+    invalid = volume.isna()
+    for name, column in (
+        ("open", "开盘"),
+        ("high", "最高"),
+        ("low", "最低"),
+        ("close", "收盘"),
+        ("turnover", "成交额"),
+    ):
+        if column in df.columns:
+            values = turnover if name == "turnover" else prices[name]
+            invalid |= values.isna() & df[column].notna()
 
-        try:
-            if row is None:
-                kline_list.append(KlineData())
-                continue
-                
-            kline = KlineData(
-                timestamp=timestamp,
-                open=float(row.get("开盘", 0)),
-                high=float(row.get("最高", 0)),
-                low=float(row.get("最低", 0)),
-                close=float(row.get("收盘", 0)),
-                volume=int(row.get("成交量", 0)),
-                turnover=float(row.get("成交额", 0)) or None,
+    kline_list = []
+    for ts, open_, high, low, close, vol, amount, bad in zip(
+        timestamps.astype("int64").tolist(),
+        prices["open"].tolist(),
+        prices["high"].tolist(),
+        prices["low"].tolist(),
+        prices["close"].tolist(),
+        volume.tolist(),
+        turnover.tolist(),
+        invalid.tolist(),
+    ):
+        if bad:
+            kline_list.append(KlineData(timestamp=ts))
+            continue
+        kline_list.append(
+            KlineData(
+                timestamp=ts,
+                open=open_,
+                high=high,
+                low=low,
+                close=close,
+                volume=int(vol),
+                turnover=amount or None,
             )
-            kline_list.append(kline)
-        except Exception as e:
-            print(f"[AkShare] 处理K线数据失败: {e}")
-            kline_list.append(KlineData(timestamp=timestamp))
+        )
 
     return kline_list
 
@@ -1106,8 +1145,6 @@ async def collect_comprehensive_stock_data(
 if __name__ == "__main__":
     test_symbol = "600168"
 
-    import asyncio
-
     print("=" * 50)
     print(f"测试采集 {test_symbol} 的数据")
     print("=" * 50)
@@ -1196,39 +1233,41 @@ def process_yfinance_basic(info: dict, market: str) -> StockBasicInfo:
 
 
 def process_yfinance_kline(df: pd.DataFrame) -> List[KlineData]:
-    """转换yFinance K线数据格式"""
-    kline_list = []
-
+    """转换yFinance K线数据格式（按列批量转换，成交额按开收盘均价估算）"""
     if df is None or len(df) == 0:
-        return kline_list
+        return []
 
     df = df.reset_index()
 
-    for _, row in df.iterrows():
-        try:
-            timestamp = int(row["Date"].timestamp() * 1000)
-        except:
-            timestamp = int(pd.to_datetime(row["Date"]).timestamp() * 1000)
-
-        open_price = float(row["Open"])
-        close_price = float(row["Close"])
-        volume = int(row["Volume"])
-
-        avg_price = (open_price + close_price) / 2
-        turnover = avg_price * volume
-
-        kline = KlineData(
-            timestamp=timestamp,
-            open=open_price,
-            high=float(row["High"]),
-            low=float(row["Low"]),
-            close=close_price,
-            volume=volume,
-            turnover=turnover,
+    timestamps = _timestamps_ms(df["Date"])
+    if timestamps.isna().any():
+        raise ValueError("yFinance K线包含无法解析的日期")
+
+    open_prices = df["Open"].astype(float)
+    close_prices = df["Close"].astype(float)
+    volumes = df["Volume"].astype("int64")
+    turnovers = (open_prices + close_prices) / 2 * volumes
+
+    return [
+        KlineData(
+            timestamp=ts,
+            open=open_,
+            high=high,
+            low=low,
+            close=close,
+            volume=vol,
+            turnover=amount,
         )
-        kline_list.append(kline)
-
-    return kline_list
+        for ts, open_, high, low, close, vol, amount in zip(
+            timestamps.astype("int64").tolist(),
+            open_prices.tolist(),
+            df["High"].astype(float).tolist(),
+            df["Low"].astype(float).tolist(),
+            close_prices.tolist(),
+            volumes.tolist(),
+            turnovers.tolist(),
+        )
+    ]
 
 
 async def collect_hk_stock_data(symbol: str) -> StockAnalysisResult:
@@ -4,6 +4,8 @@ Provides async functions to save analysis results to MongoDB.
 """
 
 import asyncio
+import math
+import traceback
 from datetime import datetime
 from typing import Optional, Dict, Any
 import os
@@ -119,8 +121,6 @@ async def save_analysis_to_mongodb(
         return False
     except Exception as e:
         print(f"[MongoDB] 保存失败: {e}")
-        import traceback
-
         traceback.print_exc()
         return False
 
@@ -139,7 +139,6 @@ def save_analysis_to_mongodb_sync(
     try:
         from pymongo import MongoClient
         from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
-        import math  # 用于处理 NaN
 
         mongo_uri = get_mongodb_uri()
 
@@ -235,7 +234,5 @@ def save_analysis_to_mongodb_sync(
         return False
     except Exception as e:
         print(f"[MongoDB] 保存失败: {e}")
-        import traceback
-
         traceback.print_exc()
         return False
@@ -11,12 +11,15 @@ from typing import Optional
 import uvicorn
 import asyncio
 import json
+import math
 from json import JSONEncoder
 import numpy as np
 import uuid
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from pathlib import Path
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 
 # 自定义 JSON 编码器，处理 NaN 值
@@ -33,6 +36,7 @@ class CustomJSONEncoder(JSONEncoder):
         return super().default(obj)
 
 
+import logging
 import time
 import os
 from collections import defaultdict
@@ -68,9 +72,20 @@ from data.progress import (
     stage_complete,
     stage_error,
 )
-from agents.crew_agents import run_crew_analysis
+from agents.crew_agents import (
+    close_http_clients,
+    get_agent_cache,
+    init_http_clients,
+    prewarm_http_clients,
+    run_crew_analyses,
+    run_crew_analysis_async,
+    stream_crew_analysis_async,
+)
 from utils.config import config
 from data.mongo_save import save_analysis_to_mongodb_sync
+from data.redis_task_store import TaskData, get_task_store
+
+logger = logging.getLogger(__name__)
 
 # 加载环境变量
 project_root = Path(__file__).parent.parent
@@ -89,10 +104,37 @@ else:
 # 获取配置
 cfg = config()
 
+# 启动时校验一次 LLM 配置，避免到首次分析请求才暴露问题
+llm_config_valid, _, llm_config_error = cfg.validate_llm_config()
+if not llm_config_valid:
+    print(f"Warning: AI analysis unavailable: {llm_config_error}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时设置有上限的共享线程池，关闭时释放连接池和线程池"""
+    # asyncio.to_thread 使用事件循环的默认线程池，固定大小并命名便于排查
+    executor = ThreadPoolExecutor(
+        max_workers=cfg.BLOCKING_POOL_SIZE, thread_name_prefix="blocking-io"
+    )
+    asyncio.get_running_loop().set_default_executor(executor)
+    # 同一进程内重启服务时，重新安装上次关闭时释放的共享连接池
+    init_http_clients()
+    prewarm = (
+        asyncio.create_task(prewarm_http_clients()) if cfg.LLM_PREWARM else None
+    )
+    yield
+    if prewarm is not None:
+        prewarm.cancel()
+    await close_http_clients()
+    executor.shutdown(wait=False)
+
+
 app = FastAPI(
     title=cfg.API_TITLE,
     description="股票数据采集和AI分析服务",
     version=cfg.API_VERSION,
+    lifespan=lifespan,
 )
 
 # CORS 配置
@@ -124,42 +166,48 @@ class RateLimiter:
             req_time for req_time in self.requests[client_id] if req_time > cutoff
         ]
 
-    def is_allowed(self, client_id: str) -> Tuple[bool, int]:
+    def is_allowed(self, client_id: str, cost: int = 1) -> Tuple[bool, int]:
         """
         检查是否允许请求
 
+        Args:
+            cost: 本次请求占用的配额（批量分析按股票数计）
+
         Returns:
             (is_allowed, remaining_requests)
         """
         self._cleanup_old_requests(client_id)
         current_count = len(self.requests[client_id])
 
-        if current_count >= self.max_requests:
+        if current_count + cost > self.max_requests:
             return False, 0
 
-        self.requests[client_id].append(time.time())
-        remaining = self.max_requests - current_count - 1
+        now = time.time()
+        self.requests[client_id].extend([now] * cost)
+        remaining = self.max_requests - current_count - cost
         return True, max(0, remaining)
 
-    def get_retry_after(self, client_id: str) -> int:
-        """获取需要等待的秒数"""
+    def get_retry_after(self, client_id: str, cost: int = 1) -> int:
+        """获取需要等待的秒数（直到空出 cost 个配额）"""
         self._cleanup_old_requests(client_id)
-        if len(self.requests[client_id]) < self.max_requests:
+        excess = len(self.requests[client_id]) + cost - self.max_requests
+        if excess <= 0:
             return 0
 
-        oldest = min(self.requests[client_id])
-        retry_after = int(self.window_seconds - (time.time() - oldest)) + 1
+        # 最早的 excess 条记录过期后才有足够配额
+        expires = sorted(self.requests[client_id])[excess - 1]
+        retry_after = int(self.window_seconds - (time.time() - expires)) + 1
         return max(1, retry_after)
 
 
 rate_limiter = RateLimiter(max_requests=10, window_seconds=60)
 
 
-def check_rate_limit(client_id: str) -> Optional[int]:
+def check_rate_limit(client_id: str, cost: int = 1) -> Optional[int]:
     """检查速率限制，返回需要等待的秒数（如果被限制）"""
-    is_allowed, remaining = rate_limiter.is_allowed(client_id)
+    is_allowed, remaining = rate_limiter.is_allowed(client_id, cost)
     if not is_allowed:
-        return rate_limiter.get_retry_after(client_id)
+        return rate_limiter.get_retry_after(client_id, cost)
     return None
 
 
@@ -183,6 +231,10 @@ class AnalysisRequest(BaseModel):
     stock_data: dict
 
 
+class BatchAnalysisRequest(BaseModel):
+    stocks: Dict[str, dict]  # {symbol: stock_data}
+
+
 class AnalysisResponse(BaseModel):
     success: bool
     data: Optional[dict] = None
@@ -257,6 +309,16 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
 
+@app.get("/metrics")
+async def metrics():
+    """运行指标（Agent 响应缓存命中情况，未启用缓存时为 null）"""
+    cache = get_agent_cache()
+    return {
+        "agent_cache": cache.stats() if cache else None,
+        "timestamp": datetime.now().isoformat(),
+    }
+
+
 @app.post("/api/collect", response_model=StockDataResponse)
 async def collect_stock_data(request: StockRequest, request_obj: Request):
     """
@@ -323,7 +385,9 @@ async def analyze_stock(
         print(f"[{datetime.now()}] Starting CrewAI analysis: {request.symbol}")
 
         # 使用CrewAI进行真正的AI分析
-        analysis_data = run_crew_analysis(request.symbol, request.stock_data)
+        analysis_data = await run_crew_analysis_async(
+            request.symbol, request.stock_data
+        )
 
         processing_time = asyncio.get_event_loop().time() - start_time
         print(f"[{datetime.now()}] AI analysis complete, time: {processing_time:.2f}s")
@@ -344,6 +408,76 @@ async def analyze_stock(
         raise HTTPException(status_code=500, detail=f"AI analysis failed: {str(e)}")
 
 
+@app.post("/api/analyze/batch", response_model=AnalysisResponse)
+async def analyze_stocks_batch(request: BatchAnalysisRequest, request_obj: Request):
+    """
+    批量分析多只股票（自选股列表）
+
+    各股票在同一事件循环中并发分析（上限 ANALYSIS_BATCH_CONCURRENCY），
+    单只股票失败不影响其他股票，失败项为 {"success": false, "error": ...}
+    股票数上限为 ANALYSIS_BATCH_MAX_SYMBOLS，速率限制按股票数计算配额。
+    """
+    client_id = request_obj.client.host if request_obj.client else "unknown"
+
+    if not request.stocks:
+        raise HTTPException(status_code=400, detail="stocks must not be empty")
+    if len(request.stocks) > cfg.ANALYSIS_BATCH_MAX_SYMBOLS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"stocks must not exceed {cfg.ANALYSIS_BATCH_MAX_SYMBOLS} symbols",
+        )
+
+    retry_after = check_rate_limit(client_id, cost=len(request.stocks))
+    if retry_after:
+        raise HTTPException(
+            status_code=429, detail=f"请求过于频繁，请等待 {retry_after} 秒后重试"
+        )
+
+    start_time = asyncio.get_event_loop().time()
+    print(f"[{datetime.now()}] Starting batch analysis: {len(request.stocks)} stocks")
+
+    analyses = await run_crew_analyses(list(request.stocks), request.stocks)
+
+    processing_time = asyncio.get_event_loop().time() - start_time
+    print(f"[{datetime.now()}] Batch analysis complete, time: {processing_time:.2f}s")
+
+    return AnalysisResponse(
+        success=True,
+        data=analyses,
+        message="Batch analysis complete",
+        processing_time=processing_time,
+    )
+
+
+@app.post("/api/analyze/live")
+async def analyze_stock_live(request: AnalysisRequest, request_obj: Request):
+    """
+    SSE流式分析接口
+
+    各分析Agent完成即推送 agent 事件，synthesizer 生成过程中逐段推送
+    synthesis 事件，最后推送包含完整结果的 final 事件。
+    """
+    client_id = request_obj.client.host if request_obj.client else "unknown"
+
+    retry_after = check_rate_limit(client_id)
+    if retry_after:
+        raise HTTPException(
+            status_code=429, detail=f"请求过于频繁，请等待 {retry_after} 秒后重试"
+        )
+
+    async def event_generator():
+        try:
+            async for event in stream_crew_analysis_async(
+                request.symbol, request.stock_data
+            ):
+                yield f"data: {json.dumps(event, cls=CustomJSONEncoder)}\n\n"
+        except Exception as e:
+            logger.exception("[%s] 流式分析失败: %s", request.symbol, e)
+            yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
 class AnalysisJob:
     """分析任务状态 (基于 Redis 或内存存储)"""
 
@@ -354,16 +488,12 @@ class AnalysisJob:
         """获取任务存储实例"""
         if cls._task_store is None:
             redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-            from data.redis_task_store import get_task_store
-
             cls._task_store = get_task_store(redis_url)
         return cls._task_store
 
     @classmethod
     def create(cls, symbol: str, market: str) -> str:
         """创建新任务"""
-        from data.redis_task_store import TaskData
-
         store = cls.get_store()
         job_id = str(uuid.uuid4())
         task = TaskData(symbol=symbol, market=market)
@@ -408,8 +538,6 @@ async def get_analysis_progress(job_id: str):
         return {"error": "Job not found", "job_id": job_id}
 
     # 处理 NaN 值
-    import math
-
     def clean_nan(obj):
         if isinstance(obj, float) and math.isnan(obj):
             return None
@@ -477,6 +605,10 @@ async def stream_analysis_progress(job_id: str, request: Request):
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 
+# 后台分析任务的强引用（事件循环只持有弱引用，未被引用的任务可能在执行中途被回收）
+_background_tasks: set = set()
+
+
 @app.post("/api/analyze/async")
 async def analyze_stock_async(request: StockRequest, request_obj: Request):
     """
@@ -537,33 +669,28 @@ async def analyze_stock_async(request: StockRequest, request_obj: Request):
             )
 
             print(f"[CrewAI] 开始分析: {symbol}")
-            analysis_result = run_crew_analysis(symbol, stock_data)
+            analysis_result = None
+            async for event in stream_crew_analysis_async(symbol, stock_data):
+                if event["type"] == "agent":
+                    # 每个分析Agent完成即推送进度（55% -> 85%）
+                    completed, total = event["completed"], event["total"]
+                    AnalysisJob.update(
+                        job_id,
+                        "ai_analysis",
+                        55 + 30 * completed // total,
+                        f"{event['name']} 完成（{completed}/{total}）",
+                    )
+                    if completed == total:
+                        AnalysisJob.update(
+                            job_id, "ai_risk", 90, "正在整合多Agent分析结果..."
+                        )
+                elif event["type"] == "final":
+                    analysis_result = event["result"]
+
             print(
                 f"[CrewAI] 分析完成，结果: {json.dumps(analysis_result, indent=2, ensure_ascii=False)[:500]}..."
             )
 
-            # 解析分析结果并显示
-            agent_count = len(analysis_result.get("agentResults", [])) or len(
-                analysis_result.get("roleAnalysis", [])
-            )
-            if agent_count > 0:
-                AnalysisJob.update(
-                    job_id,
-                    "ai_value",
-                    65,
-                    f"价值分析 Agent 分析完成（{agent_count}个Agent参与）",
-                )
-            else:
-                AnalysisJob.update(job_id, "ai_value", 65, "分析结果生成中...")
-
-            AnalysisJob.update(job_id, "ai_technical", 75, "综合分析结果生成中...")
-
-            AnalysisJob.update(job_id, "ai_growth", 85, "正在整合多Agent分析结果...")
-
-            AnalysisJob.update(
-                job_id, "ai_risk", 90, "风险评估完成，准备生成最终报告..."
-            )
-
             # 合并结果
             final_result = {
                 **stock_data,
@@ -589,7 +716,9 @@ async def analyze_stock_async(request: StockRequest, request_obj: Request):
             AnalysisJob.update(job_id, "complete", 100, "分析完成!")
             AnalysisJob.complete(job_id, final_result)
 
-            save_analysis_to_mongodb_sync(
+            # pymongo 为同步驱动（连接超时可达数秒），放到线程中执行，避免阻塞事件循环
+            await asyncio.to_thread(
+                save_analysis_to_mongodb_sync,
                 symbol=symbol,
                 market=market,
                 stock_data=stock_data,
@@ -599,15 +728,14 @@ async def analyze_stock_async(request: StockRequest, request_obj: Request):
 
         except Exception as e:
             error_msg = str(e)
-            print(f"[{datetime.now()}] 分析失败: {error_msg}")
-            import traceback
-
-            traceback.print_exc()
+            logger.exception("[%s] 分析失败: %s", symbol, error_msg)
             AnalysisJob.fail(job_id, error_msg)
 
     task = asyncio.create_task(run_analysis())
+    _background_tasks.add(task)
 
     def on_done(t: asyncio.Task) -> None:
+        _background_tasks.discard(t)
         if not t.cancelled():
             exc = t.exception()
             status = "成功" if exc is None else "失败"
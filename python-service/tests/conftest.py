@@ -13,6 +13,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 os.environ["API_DEBUG"] = "true"
 os.environ["API_PORT"] = "8001"
 os.environ["CORS_ALLOW_ORIGINS"] = "*"
+os.environ["AGENT_CACHE_ENABLED"] = "false"
 
 
 @pytest.fixture
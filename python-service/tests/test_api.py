@@ -4,7 +4,7 @@ API 端点测试
 
 import pytest
 import pandas as pd
-from unittest.mock import patch, AsyncMock
+from unittest.mock import patch, AsyncMock, MagicMock
 
 
 class TestRootEndpoint:
@@ -26,6 +26,44 @@ class TestRootEndpoint:
         assert "timestamp" in data
 
 
+class TestLifespan:
+    """应用生命周期测试"""
+
+    def test_blocking_calls_use_shared_pool(self, monkeypatch):
+        """测试 asyncio.to_thread 使用生命周期内设置的共享线程池"""
+        import asyncio
+        import threading
+        from main import app, cfg, lifespan
+
+        monkeypatch.setattr(cfg, "LLM_PREWARM", False)
+
+        async def run():
+            async with lifespan(app):
+                return await asyncio.to_thread(lambda: threading.current_thread().name)
+
+        assert asyncio.run(run()).startswith("blocking-io")
+
+    def test_restart_reinstalls_http_clients(self, monkeypatch):
+        """测试同一进程内重启服务时重新安装已关闭的共享连接池"""
+        import asyncio
+        import litellm
+        from main import app, cfg, lifespan
+
+        monkeypatch.setattr(cfg, "LLM_PREWARM", False)
+        sessions = []
+
+        async def run():
+            async with lifespan(app):
+                sessions.append(litellm.aclient_session)
+
+        asyncio.run(run())
+        asyncio.run(run())
+
+        assert litellm.aclient_session is None
+        assert sessions[0] is not None and sessions[1] is not None
+        assert sessions[0] is not sessions[1] and sessions[0].is_closed
+
+
 class TestHealthEndpoint:
     """健康检查端点测试"""
 
@@ -43,6 +81,24 @@ class TestHealthEndpoint:
         assert "timestamp" in data
 
 
+class TestMetricsEndpoint:
+    """运行指标端点测试"""
+
+    def test_metrics_reports_cache_stats(self):
+        """测试返回 Agent 响应缓存的命中统计"""
+        from main import app
+        from fastapi.testclient import TestClient
+
+        cache = MagicMock()
+        cache.stats.return_value = {"hits": 3, "misses": 1, "hit_rate": 0.75}
+        client = TestClient(app)
+        with patch("main.get_agent_cache", return_value=cache):
+            response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.json()["agent_cache"]["hits"] == 3
+
+
 class TestCollectEndpoint:
     """数据采集端点测试"""
 
@@ -209,6 +265,54 @@ class TestAnalyzeEndpoint:
 
         assert response.status_code == 422  # Validation error
 
+    def test_analyze_batch(self):
+        """测试批量分析调用并发分析入口并按股票返回结果"""
+        from main import app
+        from fastapi.testclient import TestClient
+
+        stocks = {"000001": {"basic": {}}, "600519": {"basic": {}}}
+        analyses = {
+            "000001": {"overallScore": 70},
+            "600519": {"success": False, "error": "boom"},
+        }
+
+        client = TestClient(app)
+        with patch(
+            "main.run_crew_analyses", new=AsyncMock(return_value=analyses)
+        ) as mock_batch:
+            response = client.post("/api/analyze/batch", json={"stocks": stocks})
+
+        assert response.status_code == 200
+        assert response.json()["data"] == analyses
+        mock_batch.assert_awaited_once_with(["000001", "600519"], stocks)
+
+        assert client.post("/api/analyze/batch", json={"stocks": {}}).status_code == 400
+
+    def test_analyze_batch_limits(self, monkeypatch):
+        """测试批量分析的股票数上限，以及速率限制按股票数计算配额"""
+        from main import app, cfg, rate_limiter
+        from fastapi.testclient import TestClient
+
+        monkeypatch.setattr(cfg, "ANALYSIS_BATCH_MAX_SYMBOLS", 4)
+        monkeypatch.setattr(rate_limiter, "max_requests", 6)
+        rate_limiter.requests.clear()
+
+        def batch(n):
+            stocks = {f"{i:06d}": {"basic": {}} for i in range(n)}
+            return client.post("/api/analyze/batch", json={"stocks": stocks})
+
+        client = TestClient(app)
+        with patch("main.run_crew_analyses", new=AsyncMock(return_value={})):
+            assert batch(5).status_code == 413
+            assert batch(4).status_code == 200
+            # 剩余 2 个配额，3 只股票的批量请求被拒绝且不占用配额
+            response = batch(3)
+            assert response.status_code == 429
+            assert batch(2).status_code == 200
+
+        assert "秒后重试" in response.json()["detail"]
+        rate_limiter.requests.clear()
+
     def test_analyze_success(self):
         """测试分析成功（需要 DEEPSEEK_API_KEY）"""
         from main import app
@@ -0,0 +1,94 @@
+"""
+离线批量分析测试
+"""
+
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from agents.batch_api import (
+    build_batch_requests,
+    complete_batch_analysis,
+    parse_batch_output,
+    submit_batch_analysis,
+)
+from agents.crew_agents import ANALYST_ROLES
+
+STOCKS = {
+    "000001": {"basic": {"name": "平安银行"}},
+    "600519": {"basic": {"name": "贵州茅台"}},
+}
+
+
+def _output_line(custom_id: str, content: str, status_code: int = 200) -> str:
+    body = {"choices": [{"message": {"content": content}}]}
+    return json.dumps(
+        {"custom_id": custom_id, "response": {"status_code": status_code, "body": body}}
+    )
+
+
+def _fake_llm() -> MagicMock:
+    return MagicMock(model="deepseek-chat", api_key="sk-test", api_base="https://x")
+
+
+class TestBatchAnalysis:
+    """离线批量分析测试类"""
+
+    def test_build_batch_requests(self):
+        """测试每只股票每个分析角色生成一行请求"""
+        requests = build_batch_requests(list(STOCKS), STOCKS, "deepseek-chat")
+
+        assert len(requests) == len(STOCKS) * len(ANALYST_ROLES)
+        assert requests[0]["custom_id"] == f"000001::{ANALYST_ROLES[0]}"
+        assert requests[0]["body"]["model"] == "deepseek-chat"
+        assert "平安银行" in json.dumps(requests[0]["body"], ensure_ascii=False)
+
+    def test_parse_batch_output(self):
+        """测试解析输出文件，跳过失败的请求"""
+        content = "\n".join(
+            [
+                _output_line("000001::value", "估值文本"),
+                _output_line("000001::risk", "", 200),
+                _output_line("600519::macro", "错误", 500),
+                "",
+            ]
+        )
+
+        assert parse_batch_output(content) == {"000001": {"value": "估值文本"}}
+
+    def test_submit_batch_analysis(self):
+        """测试上传 JSONL 并创建批处理任务"""
+        with patch("agents.batch_api.get_llm", return_value=_fake_llm()), patch(
+            "litellm.acreate_file", new=AsyncMock(return_value=MagicMock(id="file-1"))
+        ) as create_file, patch(
+            "litellm.acreate_batch", new=AsyncMock(return_value=MagicMock(id="batch-1"))
+        ) as create_batch:
+            batch_id = asyncio.run(submit_batch_analysis(list(STOCKS), STOCKS))
+
+        assert batch_id == "batch-1"
+        _, payload = create_file.call_args.kwargs["file"]
+        assert len(payload.decode("utf-8").splitlines()) == 12
+        assert create_batch.call_args.kwargs["input_file_id"] == "file-1"
+
+    def test_complete_batch_analysis(self):
+        """测试未完成时返回 None，完成后以批处理结果预填并在线综合"""
+        batch = MagicMock(status="in_progress", output_file_id=None)
+        content = MagicMock(text=_output_line("000001::value", "估值文本"))
+        run_analyses = AsyncMock(return_value={"000001": {}})
+
+        with patch("agents.batch_api.get_llm", return_value=_fake_llm()), patch(
+            "litellm.aretrieve_batch", new=AsyncMock(return_value=batch)
+        ), patch("litellm.afile_content", new=AsyncMock(return_value=content)), patch(
+            "agents.batch_api.run_crew_analyses", new=run_analyses
+        ):
+            assert asyncio.run(complete_batch_analysis("b", ["000001"], STOCKS)) is None
+
+            batch.status, batch.output_file_id = "completed", "file-out"
+            asyncio.run(complete_batch_analysis("b", ["000001"], STOCKS))
+            assert run_analyses.call_args.kwargs["prefilled"] == {
+                "000001": {"value": "估值文本"}
+            }
+
+            batch.status = "expired"
+            asyncio.run(complete_batch_analysis("b", ["000001"], STOCKS))
+            assert run_analyses.call_args.kwargs["prefilled"] == {}
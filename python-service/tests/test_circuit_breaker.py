@@ -0,0 +1,65 @@
+"""
+熔断器测试
+"""
+
+import time
+
+from utils.circuit_breaker import CircuitBreaker
+
+
+class TestCircuitBreaker:
+    """熔断器测试类"""
+
+    def test_opens_after_threshold(self):
+        """测试连续失败达到阈值后熔断，成功调用重置计数"""
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60.0)
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        assert breaker.allow_request()
+
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert not breaker.allow_request()
+
+    def test_half_open_after_timeout(self):
+        """测试冷却期后放行试探调用，试探失败重新熔断、成功则恢复"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        assert not breaker.allow_request()
+
+        time.sleep(0.06)
+        assert breaker.state == "half_open"
+        breaker.record_failure()
+        assert breaker.state == "open"
+
+        time.sleep(0.06)
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+    def test_half_open_allows_single_probe(self):
+        """测试半开状态只放行一个试探调用，试探结束前拒绝其余调用"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+        assert not breaker.allow_request()
+
+        breaker.record_success()
+        assert breaker.allow_request()
+        assert breaker.allow_request()
+
+    def test_half_open_probe_expires(self):
+        """测试试探调用未上报结果时，超过冷却时间后允许重新试探"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+        time.sleep(0.06)
+        assert breaker.allow_request()
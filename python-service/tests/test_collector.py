@@ -97,6 +97,29 @@ class TestProcessAkShareKline:
         assert result[0].close == 12.3
         assert result[0].volume == 50000000
 
+    def test_process_string_dates_and_invalid_rows(self):
+        """测试字符串日期批量转换，数值无法解析的行只保留时间戳"""
+        from data.enhanced_collector import process_akshare_kline
+
+        df = pd.DataFrame(
+            {
+                "日期": ["2024-01-02", "2024-01-03"],
+                "开盘": [12.0, "bad"],
+                "最高": [12.5, 12.8],
+                "最低": [11.8, 12.1],
+                "收盘": [12.3, 12.5],
+                "成交量": [50000000, 55000000],
+                "成交额": [0, 6.9e8],
+            }
+        )
+
+        result = process_akshare_kline(df)
+
+        assert result[0].timestamp == 1704153600000
+        assert result[0].turnover is None
+        assert result[1].timestamp == 1704240000000
+        assert result[1].close == 0
+
     def test_process_empty_data(self):
         """测试空数据处理"""
         from data.enhanced_collector import process_akshare_kline
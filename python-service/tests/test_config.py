@@ -57,6 +57,35 @@ class TestConfig:
         assert "http://localhost:3000" in cfg.CORS_ALLOW_ORIGINS
         assert "http://example.com" in cfg.CORS_ALLOW_ORIGINS
 
+    def test_llm_http_pool_env_override(self, monkeypatch):
+        """测试 LLM HTTP 连接池配置覆盖"""
+        monkeypatch.setenv("LLM_HTTP_MAX_CONNECTIONS", "8")
+        monkeypatch.setenv("LLM_HTTP_MAX_KEEPALIVE", "4")
+        monkeypatch.setenv("LLM_HTTP_TIMEOUT", "15")
+        monkeypatch.setenv("LLM_HTTP_KEEPALIVE_EXPIRY", "30")
+        monkeypatch.setenv("LLM_HTTP2", "false")
+
+        from utils.config import Config
+
+        cfg = Config()
+
+        assert cfg.LLM_HTTP_MAX_CONNECTIONS == 8
+        assert cfg.LLM_HTTP_MAX_KEEPALIVE == 4
+        assert cfg.LLM_HTTP_TIMEOUT == 15.0
+        assert cfg.LLM_HTTP_KEEPALIVE_EXPIRY == 30.0
+        assert cfg.LLM_HTTP2 is False
+
+    def test_crew_verbose_default_off(self, monkeypatch):
+        """测试 CrewAI 逐步日志默认关闭，可通过环境变量开启"""
+        monkeypatch.delenv("CREW_VERBOSE", raising=False)
+
+        from utils.config import Config
+
+        assert Config().CREW_VERBOSE is False
+
+        monkeypatch.setenv("CREW_VERBOSE", "true")
+        assert Config().CREW_VERBOSE is True
+
     def test_validate_llm_config_no_key(self, monkeypatch):
         """测试 LLM 配置验证 - 无 API key"""
         monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
@@ -112,6 +141,20 @@ class TestConfig:
         assert 60 in test_map
         assert 50 in test_map
 
+    def test_get_recommendation_thresholds(self):
+        """测试分数按最高达到的分数线映射推荐等级"""
+        from utils.config import Config
+
+        cfg = Config()
+
+        assert cfg.get_recommendation(92) == "strong_buy"
+        assert cfg.get_recommendation(85) == "strong_buy"
+        assert cfg.get_recommendation(84.9) == "buy"
+        assert cfg.get_recommendation(75) == "buy"
+        assert cfg.get_recommendation(60) == "hold"
+        assert cfg.get_recommendation(50) == "wait"
+        assert cfg.get_recommendation(49.9) == "sell"
+
     def test_get_agent_weight(self, monkeypatch):
         """测试 Agent 权重获取"""
         monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
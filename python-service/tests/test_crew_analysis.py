@@ -2,16 +2,39 @@
 CrewAI 分析模块测试
 """
 
+import asyncio
+import logging
 import pytest
 import sys
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
+from agents.cache import FileCache
 from agents.crew_agents import (
+    ANALYST_ROLES,
+    build_agent_contexts,
+    build_synthesis_messages,
+    run_analyst_phase,
+    run_synthesis_phase,
+    stream_synthesis_phase,
+    run_single_agent,
+    stream_crew_analysis_async,
     run_crew_analysis,
+    run_crew_analysis_async,
+    run_crew_analyses,
+    SynthesisResult,
+    agent_max_tokens,
     create_agents,
+    create_tasks,
+    ensure_complete_structure,
+    weighted_role_scores,
+    extract_json_object,
+    parse_analysis_result,
+    split_agent_sections,
     format_data_summary,
     format_kline_summary,
     format_financial_data,
+    format_industry_data,
 )
+from agents import crew_agents
 from utils.config import config
 
 
@@ -96,8 +119,18 @@ class TestCrewAnalysis:
         assert "000001" in summary
         assert "平安银行" in summary
         assert "11.16" in summary
+        # ROE 等财务指标只在财务数据块中发送
+        assert "ROE" not in summary
         print(f"✓ format_data_summary: {summary[:100]}...")
 
+    def test_format_data_summary_skips_missing(self):
+        """测试数据摘要省略缺失字段"""
+        summary = format_data_summary(
+            {"basic": {"symbol": "000001", "peRatio": None, "pbRatio": 0.8}}
+        )
+        assert summary == "Symbol: 000001, PB: 0.8"
+        assert format_data_summary({}) == ""
+
     def test_format_kline_summary(self, sample_stock_data):
         """测试K线摘要格式化"""
         kline_summary = format_kline_summary(sample_stock_data["kline"])
@@ -105,19 +138,837 @@ class TestCrewAnalysis:
         assert "10.80" in kline_summary
         print(f"✓ format_kline_summary: {kline_summary}")
 
+    def test_format_kline_summary_array_rows(self):
+        """测试数组格式K线（[ts, o, h, l, c, v]）只取最近5根"""
+        kline = [
+            [1704067200000 + i * 86400000, 12.0, 12.5, 11.8, 12.0 + i, 50000000]
+            for i in range(100)
+        ]
+        kline_summary = format_kline_summary(kline)
+        assert kline_summary.count("|") == 4
+        assert "C=111.00" in kline_summary
+        assert "C=94.00" not in kline_summary
+
+    def test_build_agent_contexts(self, sample_stock_data):
+        """测试各Agent只接收相关数据块，完整上下文包含全部数据块"""
+        full_context, role_contexts = build_agent_contexts("000001", sample_stock_data)
+
+        assert set(role_contexts) == set(ANALYST_ROLES)
+        for block in ("基本数据", "技术数据", "财务数据", "行业数据"):
+            assert block in full_context
+        assert "技术数据" in role_contexts["technical"]
+        assert "财务数据" not in role_contexts["technical"]
+        assert "技术数据" not in role_contexts["macro"]
+        assert all("平安银行" in ctx for ctx in role_contexts.values())
+        # 数据块组合相同的角色共享同一个字符串
+        assert role_contexts["value"] is role_contexts["growth"]
+
+    def test_create_tasks_role_contexts(self, sample_stock_data):
+        """测试任务由模板生成，各角色只包含所需数据块"""
+        tasks = create_tasks(
+            "000001", "平安银行", sample_stock_data, [None] * 7, "摘要", "K线"
+        )
+        assert len(tasks) == 7
+        technical = tasks[1].description
+        assert "K线数据摘要:\nK线" in technical
+        assert "财务数据" not in technical
+        assert "K线数据摘要" in tasks[-1].description
+        assert all(task.async_execution for task in tasks[:-1])
+        assert not tasks[-1].async_execution
+        assert tasks[-1].context == tasks[:-1]
+
     def test_format_financial_data(self, sample_stock_data):
         """测试财务数据格式化"""
         financial_summary = format_financial_data(sample_stock_data)
         assert "7.4" in financial_summary
         assert "25.5" in financial_summary
+        # 缺失字段直接省略
+        assert "N/A" not in financial_summary
+        assert "营收增长" not in financial_summary
+        assert "\n" not in financial_summary
         print(f"✓ format_financial_data: {financial_summary[:100]}...")
 
+    def test_format_industry_data_compact(self):
+        """测试行业数据单行输出，概念标签只保留前几个"""
+        tags = [f"概念{i}" for i in range(8)]
+        summary = format_industry_data(
+            {"basic": {"industry": "银行", "sector": "N/A", "conceptTags": tags}}
+        )
+        assert summary == "行业=银行 | 概念=概念0,概念1,概念2,概念3,概念4"
+        assert format_industry_data({}) == "暂无"
+
+    def test_extract_json_object_ignores_trailing_text(self):
+        """测试 JSON 提取：跳过非法的 "{" 并忽略对象之后的文本"""
+        text = '说明 {不是JSON} 结果: {"overallScore": 80, "risks": ["a"]} 附注 {x}'
+        assert extract_json_object(text) == {"overallScore": 80, "risks": ["a"]}
+        assert extract_json_object("没有对象") is None
+
+    def test_parse_analysis_result_text_fallback(self, sample_stock_data):
+        """测试无结构化输出时从文本提取评分和建议"""
+        result = parse_analysis_result(
+            "Score: 81.5, recommendation: BUY", "000001", sample_stock_data
+        )
+        assert result["overallScore"] == 81.5
+        assert result["recommendation"] == "buy"
+
+    def test_parse_analysis_result_uses_synthesis_model(self, sample_stock_data):
+        """测试 synthesizer 结构化输出直接用于结果，无需从文本提取 JSON"""
+        synthesis = SynthesisResult(
+            overallScore=82,
+            recommendation="buy",
+            confidence=80,
+            summary="估值合理，成长稳健",
+            risks=["竞争加剧"],
+            opportunities=["份额提升"],
+        )
+        result = parse_analysis_result(
+            "非结构化文本", "000001", sample_stock_data, synthesis
+        )
+        assert result["overallScore"] == 82
+        assert result["summary"] == "估值合理，成长稳健"
+        assert result["risks"] == ["竞争加剧"]
+        assert len(result["roleAnalysis"]) == 6
+
+        agent_text = "## 估值分析\n综合评分: 70分\n综合置信度: 80\n建议: 持有\n"
+        result = parse_analysis_result(
+            agent_text, "000001", sample_stock_data, synthesis
+        )
+        assert len(result["agentResults"]) == 1
+        assert result["executiveSummary"] == "估值合理，成长稳健"
+        assert result["opportunities"] == ["份额提升"]
+
+    def test_parse_analysis_result_splits_sections(self, sample_stock_data):
+        """测试一次扫描切分多个Agent段落，按角色顺序解析且同一角色只取第一段"""
+        output = (
+            "## 风险评估\n综合评分: 60分\n\n"
+            "## 估值分析\n综合评分: 80分\n### 结论\n低估\n\n"
+            "## 估值分析\n综合评分: 10分\n"
+        )
+        result = parse_analysis_result(output, "000001", sample_stock_data)
+        agents = [r["agent"] for r in result["agentResults"]]
+        assert agents == ["value", "risk"]
+        assert result["agentResults"][0]["score"] == 80
+
+    @pytest.mark.skipif(
+        not crew_agents._HYPERSCAN_AVAILABLE, reason="hyperscan 未安装"
+    )
+    def test_split_agent_sections_hyperscan_matches_regex(self, monkeypatch):
+        """测试 Hyperscan 切分结果与正则版本一致"""
+        output = (
+            "前言\n"
+            "## 风险评估\n\n综合评分: 60分\n### 细节\n波动\n"
+            "## 其他\n忽略\n"
+            "## 估值分析\n综合评分: 80分\n"
+            "## 估值分析\n综合评分: 10分"
+        )
+        fast = split_agent_sections(output)
+        monkeypatch.setattr(crew_agents, "_HYPERSCAN_AVAILABLE", False)
+        assert fast == split_agent_sections(output)
+        assert list(fast) == ["risk", "value"]
+        assert fast["value"] == "综合评分: 80分"
+
+    def test_parse_analysis_result_role_outputs(self, sample_stock_data):
+        """测试按角色提供的结果直接解析（无需标题），失败的 Agent 跳过"""
+        role_outputs = [
+            {"agent": "value", "result": "综合评分: 80分"},
+            {"agent": "risk", "result": "## 风险评估\n\n分析失败: boom", "failed": True},
+            {"agent": "macro", "result": "综合评分: 65分"},
+        ]
+        result = parse_analysis_result(
+            "", "000001", sample_stock_data, role_outputs=role_outputs
+        )
+        assert [r["agent"] for r in result["agentResults"]] == ["value", "macro"]
+        assert result["agentResults"][1]["score"] == 65
+
+    def test_fallback_role_analysis_not_shared(self, sample_stock_data):
+        """测试默认角色分析每次返回独立副本，修改结果不影响后续调用"""
+        first = parse_analysis_result("无结构化输出", "000001", sample_stock_data)
+        first["roleAnalysis"][0]["keyPoints"].append("mutated")
+        first["risks"].clear()
+
+        second = parse_analysis_result("无结构化输出", "000001", sample_stock_data)
+        assert "mutated" not in second["roleAnalysis"][0]["keyPoints"]
+        assert len(second["risks"]) == 3
+
+    def test_ensure_complete_structure_weighted_score(self, sample_stock_data):
+        """测试按角色权重计算综合评分（与角色顺序无关）"""
+        analysis = {
+            "roleAnalysis": [
+                {"role": "macro", "score": 60},
+                {"role": "value", "score": 80},
+                {"role": "technical"},
+            ]
+        }
+        result = ensure_complete_structure(analysis, "000001", sample_stock_data)
+        assert result["overallScore"] == pytest.approx(
+            60 * 0.10 + 80 * 0.25 + 70 * 0.15
+        )
+
+    def test_agent_max_tokens_bounded_by_config(self, monkeypatch):
+        """测试各 Agent 输出上限按角色设定，且不超过全局 LLM_MAX_TOKENS"""
+        monkeypatch.setattr(config(), "LLM_MAX_TOKENS", 2000)
+        assert agent_max_tokens("value") == 1000
+        assert agent_max_tokens("synthesizer") == 1500
+
+        monkeypatch.setattr(config(), "LLM_MAX_TOKENS", 800)
+        assert agent_max_tokens("value") == 800
+        assert agent_max_tokens("unknown") == 800
+
+    def test_weighted_role_scores_batch(self):
+        """测试批量加权评分：各分析角色数可不同，空分析得 0"""
+        scores = weighted_role_scores(
+            [
+                [{"role": "macro", "score": 60}, {"role": "value", "score": 80}],
+                [],
+                [{"role": "value", "score": 100}],
+            ]
+        )
+        assert scores.tolist() == pytest.approx([60 * 0.10 + 80 * 0.25, 0, 25])
+        assert weighted_role_scores([]).tolist() == []
+
     def test_create_agents(self):
         """测试创建Agent"""
         agents = create_agents()
         assert len(agents) == 7  # 6个分析Agent + 1个synthesizer
         print(f"✓ 创建了 {len(agents)} 个 Agent")
 
+    def test_create_agents_share_provider_resolution(self, monkeypatch):
+        """测试所有 Agent 共享同一次提供商解析，仅温度/输出上限不同"""
+        from agents.crew_agents import UnifiedLLM, create_agent, get_llm
+        from utils.config import get_config
+
+        monkeypatch.setenv("LLM_PROVIDER", "deepseek")
+        monkeypatch.setenv("DEEPSEEK_API_KEY", "sk-test-api-key-for-testing")
+        get_config.cache_clear()
+        get_llm.cache_clear()
+        create_agent.cache_clear()
+        resolve = UnifiedLLM._init_provider
+        try:
+            with patch.object(
+                UnifiedLLM, "_init_provider", autospec=True, side_effect=resolve
+            ) as init_provider:
+                agents = create_agents()
+                assert init_provider.call_count == 1
+                assert create_agent("value") is agents[0]
+        finally:
+            create_agent.cache_clear()
+            get_llm.cache_clear()
+            get_config.cache_clear()
+
+        assert len(agents) == 7
+
+    def test_run_analyst_phase_keeps_role_order(self):
+        """测试并行阶段按角色顺序返回，单个失败不影响其他 Agent"""
+
+        async def fake_run_single_agent(llm, agent_type, stock_name, symbol, context):
+            if agent_type == "risk":
+                raise RuntimeError("boom")
+            return {"agent": agent_type, "result": f"{agent_type} ok"}
+
+        with patch(
+            "agents.crew_agents.run_single_agent", side_effect=fake_run_single_agent
+        ):
+            outputs = asyncio.run(
+                run_analyst_phase(MagicMock(), "平安银行", "000001", "ctx")
+            )
+
+        assert [o["agent"] for o in outputs] == list(ANALYST_ROLES)
+        assert outputs[0]["result"] == "value ok"
+        assert "分析失败" in outputs[ANALYST_ROLES.index("risk")]["result"]
+
+    def test_run_analyst_phase_role_contexts(self):
+        """测试并行阶段按角色使用精简上下文，未指定的角色使用共享上下文"""
+        contexts = {}
+
+        async def fake_run_single_agent(llm, agent_type, stock_name, symbol, context):
+            contexts[agent_type] = context
+            return {"agent": agent_type, "result": "ok"}
+
+        with patch(
+            "agents.crew_agents.run_single_agent", side_effect=fake_run_single_agent
+        ):
+            asyncio.run(
+                run_analyst_phase(
+                    MagicMock(), "平安银行", "000001", "ctx", {"technical": "kline"}
+                )
+            )
+
+        assert contexts["technical"] == "kline"
+        assert contexts["value"] == "ctx"
+
+    def test_stream_crew_analysis_yields_in_completion_order(
+        self, sample_stock_data, monkeypatch
+    ):
+        """测试流式分析：每个Agent完成即产出，最后产出综合结果"""
+        monkeypatch.setattr(config(), "SYNTHESIS_STREAM", False)
+        delays = {"value": 0.05, "macro": 0.0}
+
+        async def fake_run_single_agent(llm, agent_type, stock_name, symbol, context):
+            await asyncio.sleep(delays.get(agent_type, 0.01))
+            return {"agent": agent_type, "result": f"{agent_type} ok"}
+
+        async def collect():
+            return [
+                e async for e in stream_crew_analysis_async("000001", sample_stock_data)
+            ]
+
+        with patch(
+            "agents.crew_agents.run_single_agent", side_effect=fake_run_single_agent
+        ), patch("agents.crew_agents.get_llm"), patch(
+            "agents.crew_agents.run_synthesis_phase",
+            AsyncMock(return_value=("综合", None)),
+        ) as synthesis_phase:
+            events = asyncio.run(collect())
+
+        synthesis_phase.assert_awaited_once()
+        agent_events = [e for e in events if e["type"] == "agent"]
+        assert [e["completed"] for e in agent_events] == list(range(1, 7))
+        assert agent_events[0]["agent"] == "macro"
+        assert agent_events[-1]["agent"] == "value"
+        assert events[-1]["type"] == "final"
+        assert isinstance(events[-1]["result"], dict)
+
+    def test_stream_crew_analysis_streams_synthesis(self, sample_stock_data):
+        """测试 synthesizer 流式输出：逐段产出，拼接后解析为结构化结果"""
+        synthesis_json = (
+            '{"overallScore": 81, "recommendation": "buy", '
+            '"confidence": 70, "summary": "稳健", "risks": ["波动"]}'
+        )
+        chunks = [synthesis_json[:20], synthesis_json[20:]]
+
+        async def fake_run_single_agent(llm, agent_type, stock_name, symbol, context):
+            return {"agent": agent_type, "result": f"{agent_type} ok"}
+
+        async def fake_astream(messages, temperature=None, max_tokens=None, **kwargs):
+            for chunk in chunks:
+                yield chunk
+
+        llm = MagicMock()
+        llm.astream = fake_astream
+
+        async def collect():
+            return [
+                e async for e in stream_crew_analysis_async("000001", sample_stock_data)
+            ]
+
+        with patch(
+            "agents.crew_agents.run_single_agent", side_effect=fake_run_single_agent
+        ), patch("agents.crew_agents.get_llm", return_value=llm):
+            events = asyncio.run(collect())
+
+        deltas = [e["delta"] for e in events if e["type"] == "synthesis"]
+        assert deltas == chunks
+        assert events[-1]["type"] == "final"
+        assert events[-1]["result"]["executiveSummary"] == "稳健"
+        assert events[-1]["result"]["risks"] == ["波动"]
+
+    def test_stream_synthesis_stops_after_json_object(self):
+        """测试 JSON 对象闭合且可解析后停止接收，不产出对象之后的文本"""
+        synthesis_json = (
+            '{"overallScore": 81, "recommendation": "buy", '
+            '"confidence": 70, "summary": "稳健"}'
+        )
+        received = []
+
+        async def fake_astream(messages, **kwargs):
+            for chunk in ["前言 {未完成} ", synthesis_json[:30], synthesis_json[30:]]:
+                received.append(chunk)
+                yield chunk
+            for chunk in [" 以上为分析", "结论"]:
+                received.append(chunk)
+                yield chunk
+
+        llm = MagicMock()
+        llm.astream = fake_astream
+        llm.json_mode = False
+
+        async def collect():
+            return [
+                delta
+                async for delta in stream_synthesis_phase(llm, "平安银行", "000001", [])
+            ]
+
+        with patch("agents.crew_agents.get_agent_cache", return_value=None):
+            deltas = asyncio.run(collect())
+
+        assert "".join(deltas) == "前言 {未完成} " + synthesis_json
+        assert len(received) == 3
+
+    def test_stream_crew_analysis_speculative_synthesis(
+        self, sample_stock_data, monkeypatch
+    ):
+        """测试推测综合：达到法定数量即开始综合，结论未变时直接采用"""
+        monkeypatch.setattr(config(), "SPECULATIVE_SYNTHESIS_QUORUM", 4)
+        synthesis_json = (
+            '{"overallScore": 60, "recommendation": "hold", '
+            '"confidence": 70, "summary": "推测", "risks": []}'
+        )
+        prompts = []
+
+        async def fake_run_single_agent(llm, agent_type, stock_name, symbol, context):
+            if agent_type in ("risk", "macro"):
+                await asyncio.sleep(0.05)
+            return {"agent": agent_type, "result": "综合评分：60分"}
+
+        async def fake_astream(messages, temperature=None, max_tokens=None, **kwargs):
+            prompts.append(messages[-1]["content"])
+            yield synthesis_json
+
+        llm = MagicMock()
+        llm.astream = fake_astream
+
+        async def collect():
+            return [
+                e async for e in stream_crew_analysis_async("000001", sample_stock_data)
+            ]
+
+        with patch(
+            "agents.crew_agents.run_single_agent", side_effect=fake_run_single_agent
+        ), patch("agents.crew_agents.get_llm", return_value=llm):
+            events = asyncio.run(collect())
+
+        # 仅启动一次综合，基于先完成的 4 个分析，其余角色为占位内容
+        assert len(prompts) == 1
+        assert "=== RISK AGENT ===\n该维度分析仍在进行中" in prompts[0]
+        assert "=== VALUE AGENT ===\n综合评分：60分" in prompts[0]
+        deltas = [e["delta"] for e in events if e["type"] == "synthesis"]
+        assert deltas == [synthesis_json]
+        assert events[-1]["result"]["executiveSummary"] == "推测"
+
+    def test_stream_crew_analysis_rejected_speculation_cancelled(
+        self, sample_stock_data, monkeypatch
+    ):
+        """测试推测综合不成立时立即取消，失败时回退到重新综合"""
+        monkeypatch.setattr(config(), "SPECULATIVE_SYNTHESIS_QUORUM", 4)
+        synthesis_json = (
+            '{"overallScore": 30, "recommendation": "sell", '
+            '"confidence": 70, "summary": "重新综合", "risks": []}'
+        )
+
+        async def run(late_score: int, speculative_error: bool) -> list:
+            order = []
+
+            async def fake_run_single_agent(llm, agent_type, stock_name, symbol, ctx):
+                if agent_type in ("risk", "macro"):
+                    await asyncio.sleep(0.05)
+                    return {"agent": agent_type, "result": f"综合评分：{late_score}分"}
+                return {"agent": agent_type, "result": "综合评分：90分"}
+
+            async def fake_astream(messages, **kwargs):
+                if "仍在进行中" not in messages[-1]["content"]:
+                    order.append("full")
+                    yield synthesis_json
+                    return
+                order.append("spec start")
+                if speculative_error:
+                    raise RuntimeError("boom")
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    order.append("spec cancelled")
+                    raise
+                yield synthesis_json
+
+            llm = MagicMock()
+            llm.astream = fake_astream
+            with patch(
+                "agents.crew_agents.run_single_agent", side_effect=fake_run_single_agent
+            ), patch("agents.crew_agents.get_llm", return_value=llm), patch(
+                "agents.crew_agents.get_agent_cache", return_value=None
+            ):
+                events = [
+                    e
+                    async for e in stream_crew_analysis_async(
+                        "000001", sample_stock_data
+                    )
+                ]
+            order.append(events[-1]["result"]["executiveSummary"])
+            return order
+
+        assert asyncio.run(run(10, False)) == [
+            "spec start",
+            "spec cancelled",
+            "full",
+            "重新综合",
+        ]
+        assert asyncio.run(run(90, True)) == ["spec start", "full", "重新综合"]
+
+    def test_synthesis_messages_static_prefix(self):
+        """测试 synthesizer 的 system 消息与股票无关，可被提供商前缀缓存复用"""
+        first = build_synthesis_messages(
+            "平安银行", "000001", [{"agent": "value", "result": "a"}]
+        )
+        second = build_synthesis_messages(
+            "贵州茅台", "600519", [{"agent": "risk", "result": "b"}]
+        )
+
+        assert first[0] == second[0]
+        assert "JSON Schema" in first[0]["content"]
+        assert "600519" in second[1]["content"]
+        assert second[1]["content"].endswith("=== RISK AGENT ===\nb")
+
+    def test_run_synthesis_phase_awaits_llm(self):
+        """测试非流式综合直接 await 共享 LLM 并解析结构化结果"""
+        llm = MagicMock()
+        llm.acall = AsyncMock(
+            return_value='{"overallScore": 70, "recommendation": "hold", '
+            '"confidence": 60, "summary": "中性", "risks": []}'
+        )
+        outputs = [{"agent": "value", "result": "ok"}]
+
+        text, synthesis = asyncio.run(
+            run_synthesis_phase(llm, "平安银行", "000001", outputs)
+        )
+
+        assert llm.acall.await_args.kwargs["max_tokens"] == agent_max_tokens(
+            "synthesizer"
+        )
+        assert "VALUE AGENT" in llm.acall.await_args.args[0][-1]["content"]
+        assert llm.acall.await_args.kwargs["response_format"] == {"type": "json_object"}
+        assert synthesis.summary == "中性"
+        assert text.startswith("{")
+
+    def test_run_crew_analyses_bounded_concurrency(self):
+        """测试批量分析限制并发数，单只股票失败不影响其他股票"""
+        running = 0
+        max_running = 0
+
+        async def fake_analysis(symbol, stock_data, prefilled=None):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            if symbol == "000002":
+                raise RuntimeError("boom")
+            return {"symbol": symbol}
+
+        symbols = [f"00000{i}" for i in range(1, 7)]
+        with patch(
+            "agents.crew_agents.run_crew_analysis_async", side_effect=fake_analysis
+        ):
+            results = asyncio.run(
+                run_crew_analyses(symbols, {s: {} for s in symbols}, max_concurrency=2)
+            )
+
+        assert max_running == 2
+        assert list(results) == symbols
+        assert results["000001"] == {"symbol": "000001"}
+        assert results["000002"]["success"] is False
+
+    def test_run_crew_analysis_single_flight(self):
+        """测试相同数据的并发请求共享同一次分析，不同数据各自分析"""
+        calls = []
+
+        async def fake_stream(symbol, stock_data, prefilled=None):
+            calls.append(symbol)
+            await asyncio.sleep(0.01)
+            yield {"type": "final", "result": {"symbol": symbol}}
+
+        async def run_all():
+            return await asyncio.gather(
+                run_crew_analysis_async("000001", {"basic": {"price": 1}}),
+                run_crew_analysis_async("000001", {"basic": {"price": 1}}),
+                run_crew_analysis_async("000001", {"basic": {"price": 2}}),
+            )
+
+        with patch(
+            "agents.crew_agents.stream_crew_analysis_async", side_effect=fake_stream
+        ):
+            results = asyncio.run(run_all())
+
+        assert calls == ["000001", "000001"]
+        assert results[0] is results[1]
+        assert results[2] == {"symbol": "000001"}
+
+    def test_run_crew_analysis_sync_reuses_loop(self):
+        """测试同步入口多次调用复用同一个事件循环"""
+        loops = []
+
+        async def fake_stream(symbol, stock_data, prefilled=None):
+            loops.append(asyncio.get_running_loop())
+            yield {"type": "final", "result": {"symbol": symbol}}
+
+        with patch(
+            "agents.crew_agents.stream_crew_analysis_async", side_effect=fake_stream
+        ):
+            assert run_crew_analysis("000001", {}) == {"symbol": "000001"}
+            assert run_crew_analysis("000002", {}) == {"symbol": "000002"}
+
+        assert loops[0] is loops[1]
+        assert not loops[0].is_closed()
+
+    def test_run_crew_analysis_single_flight_per_loop(self):
+        """测试不同事件循环上的相同请求各自分析，不等待其他循环的 Task"""
+        calls = []
+
+        async def fake_stream(symbol, stock_data, prefilled=None):
+            calls.append(asyncio.get_running_loop())
+            await asyncio.sleep(0.05)
+            yield {"type": "final", "result": {"symbol": symbol}}
+
+        async def run_on_sync_loop():
+            return await asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(
+                    run_crew_analysis_async("000001", {}),
+                    crew_agents._get_sync_loop(),
+                )
+            )
+
+        async def run_all():
+            return await asyncio.gather(
+                run_crew_analysis_async("000001", {}), run_on_sync_loop()
+            )
+
+        with patch(
+            "agents.crew_agents.stream_crew_analysis_async", side_effect=fake_stream
+        ):
+            results = asyncio.run(run_all())
+
+        assert results == [{"symbol": "000001"}, {"symbol": "000001"}]
+        assert len(calls) == 2 and calls[0] is not calls[1]
+
+    def test_run_sync_rejected_inside_server_process(self, monkeypatch):
+        """测试连接池属于运行中的服务事件循环时，同步入口拒绝调用"""
+
+        async def serve():
+            monkeypatch.setattr(
+                crew_agents, "_HTTP_CLIENT_LOOP", asyncio.get_running_loop()
+            )
+            return await asyncio.to_thread(run_crew_analysis, "000001", {})
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(serve())
+
+    def test_run_crew_analyses_rows_per_prompt(self, monkeypatch):
+        """测试多股票合并调用：每个角色每 k 只股票一次调用，结果传给逐股票分析"""
+        import json
+        import re
+
+        monkeypatch.setattr(config(), "ANALYSIS_ROWS_PER_PROMPT", 2)
+
+        async def fake_acall(messages, **kwargs):
+            symbols = re.findall(r"=== SYMBOL: (\d+)", messages[0]["content"])
+            return json.dumps({s: f"{s} text" for s in symbols if s != "000003"})
+
+        llm = MagicMock()
+        llm.acall = AsyncMock(side_effect=fake_acall)
+        received = {}
+
+        async def fake_analysis(symbol, stock_data, prefilled=None):
+            received[symbol] = prefilled
+            return {"symbol": symbol}
+
+        symbols = ["000001", "000002", "000003"]
+        with patch("agents.crew_agents.get_llm", return_value=llm), patch(
+            "agents.crew_agents.run_crew_analysis_async", side_effect=fake_analysis
+        ):
+            asyncio.run(run_crew_analyses(symbols, {s: {} for s in symbols}))
+
+        assert llm.acall.await_count == len(ANALYST_ROLES) * 2
+        assert received["000001"] == {role: "000001 text" for role in ANALYST_ROLES}
+        assert received["000003"] == {}
+
+    def test_run_analyst_phase_prefilled(self):
+        """测试已有预填结果的角色不再调用 LLM"""
+        llm = MagicMock()
+        llm.acall = AsyncMock(return_value="single")
+        prefilled = {role: f"{role} prefilled" for role in ANALYST_ROLES[1:]}
+
+        outputs = asyncio.run(
+            run_analyst_phase(llm, "平安银行", "000001", "ctx", prefilled=prefilled)
+        )
+
+        assert llm.acall.await_count == 1
+        assert outputs[0]["result"] == "single"
+        assert outputs[1]["result"] == f"{ANALYST_ROLES[1]} prefilled"
+
+    def test_run_analyst_phase_batched(self, monkeypatch):
+        """测试合并调用模式：一次调用覆盖多个角色，缺失角色单独补跑"""
+        import json
+
+        monkeypatch.setattr(config(), "AGENT_BATCH_ANALYSTS", True)
+        batched = {role: f"{role} batched" for role in ANALYST_ROLES[:-1]}
+        llm = MagicMock()
+        llm.acall = AsyncMock(side_effect=[json.dumps(batched), "macro single"])
+
+        outputs = asyncio.run(run_analyst_phase(llm, "平安银行", "000001", "ctx"))
+
+        assert llm.acall.await_count == 2
+        assert [o["agent"] for o in outputs] == list(ANALYST_ROLES)
+        assert outputs[0]["result"] == "value batched"
+        assert outputs[-1]["result"] == "macro single"
+
+    def test_run_analyst_phase_batched_markdown_sections(self, monkeypatch):
+        """测试合并调用返回 Markdown 段落（非 JSON）时按标题切分"""
+        monkeypatch.setattr(config(), "AGENT_BATCH_ANALYSTS", True)
+        markdown = "\n".join(
+            f"## {heading}\n综合评分: 70分"
+            for heading in ("估值分析", "技术分析", "成长分析", "基本面分析", "风险评估")
+        )
+        llm = MagicMock()
+        llm.acall = AsyncMock(side_effect=[markdown, "macro single"])
+
+        outputs = asyncio.run(run_analyst_phase(llm, "平安银行", "000001", "ctx"))
+
+        assert llm.acall.await_count == 2
+        assert outputs[0]["result"] == "## 估值分析\n\n综合评分: 70分"
+        assert outputs[-1]["result"] == "macro single"
+
+    def test_run_single_agent_uses_cache(self, tmp_path):
+        """测试相同数据上下文命中缓存，数据变化或调用失败不复用"""
+        llm = MagicMock()
+        llm.acall = AsyncMock(return_value="## 价值分析\n评分: 80")
+        cache = FileCache(str(tmp_path))
+
+        with patch("agents.crew_agents.get_agent_cache", return_value=cache):
+            first = asyncio.run(
+                run_single_agent(llm, "value", "平安银行", "000001", "ctx")
+            )
+            second = asyncio.run(
+                run_single_agent(llm, "value", "平安银行", "000001", "ctx")
+            )
+            assert first["result"] == second["result"]
+            assert llm.acall.await_count == 1
+
+            asyncio.run(run_single_agent(llm, "value", "平安银行", "000001", "ctx2"))
+            assert llm.acall.await_count == 2
+
+            llm.acall = AsyncMock(return_value="无法生成分析：所有 LLM 提供商均失败。")
+            asyncio.run(run_single_agent(llm, "risk", "平安银行", "000001", "ctx"))
+            assert cache.get("000001", "risk", "any") is None
+            assert not (tmp_path / "000001" / "risk.json").exists()
+
+    def test_synthesis_uses_cache(self, tmp_path):
+        """测试相同分析输出的综合结果命中缓存，流式与非流式共享；有失败时不缓存"""
+        synthesis_json = (
+            '{"overallScore": 70, "recommendation": "hold", '
+            '"confidence": 60, "summary": "中性", "risks": []}'
+        )
+        llm = MagicMock()
+        llm.acall = AsyncMock(return_value=synthesis_json)
+        outputs = [{"agent": "value", "result": "ok"}]
+        cache = FileCache(str(tmp_path))
+
+        async def stream(agent_outputs):
+            return [
+                d
+                async for d in stream_synthesis_phase(
+                    llm, "平安银行", "000001", agent_outputs
+                )
+            ]
+
+        with patch("agents.crew_agents.get_agent_cache", return_value=cache):
+            asyncio.run(run_synthesis_phase(llm, "平安银行", "000001", outputs))
+            assert asyncio.run(stream(outputs)) == [synthesis_json]
+            text, synthesis = asyncio.run(
+                run_synthesis_phase(llm, "平安银行", "000001", outputs)
+            )
+            assert llm.acall.await_count == 1
+            assert synthesis.summary == "中性"
+
+            failed = outputs + [{"agent": "risk", "result": "x", "failed": True}]
+            asyncio.run(run_synthesis_phase(llm, "平安银行", "000001", failed))
+            asyncio.run(run_synthesis_phase(llm, "平安银行", "000001", failed))
+            assert llm.acall.await_count == 3
+
+    def test_file_cache_memory_layer(self, tmp_path):
+        """测试进程内 LRU：命中时不读取文件，超出容量后回退到文件"""
+        cache = FileCache(str(tmp_path), memory_size=1)
+        cache.set("000001", "value", "k", "估值")
+        (tmp_path / "000001" / "value.json").unlink()
+        assert cache.get("000001", "value", "k") == "估值"
+
+        cache.set("000001", "risk", "k", "风险")
+        assert cache.get("000001", "value", "k") is None
+        assert FileCache(str(tmp_path)).get("000001", "risk", "k") == "风险"
+
+    def test_file_cache_stats(self, tmp_path):
+        """测试命中/未命中计数"""
+        cache = FileCache(str(tmp_path))
+        assert cache.stats() == {"hits": 0, "misses": 0, "hit_rate": 0.0}
+
+        cache.get("000001", "value", "k")
+        cache.set("000001", "value", "k", "估值")
+        cache.get("000001", "value", "k")
+        cache.get("000001", "value", "other")
+        cache.get("000001", "value", "k")
+
+        assert cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5}
+
+    def test_file_cache_aset_concurrent(self, tmp_path):
+        """测试异步写入：并发写入同一记录使用各自的临时文件，不残留临时文件"""
+        cache = FileCache(str(tmp_path))
+
+        async def write_all():
+            await asyncio.gather(
+                *(cache.aset("000001", "value", f"k{i}", f"估值{i}") for i in range(20))
+            )
+
+        asyncio.run(write_all())
+
+        files = sorted(p.name for p in (tmp_path / "000001").iterdir())
+        assert files == ["value.json"]
+        fresh = FileCache(str(tmp_path))
+        assert any(
+            fresh.get("000001", "value", f"k{i}") == f"估值{i}" for i in range(20)
+        )
+        assert cache.get("000001", "value", "k19") == "估值19"
+
+    def test_run_single_agent_score_patterns_debug_only(self, caplog):
+        """测试评分模式仅在 DEBUG 日志级别下记录"""
+        llm = MagicMock()
+        llm.acall = AsyncMock(return_value="综合评分: 80分")
+
+        with caplog.at_level(logging.INFO, logger="agents.crew_agents"):
+            asyncio.run(run_single_agent(llm, "value", "平安银行", "000001", "ctx"))
+        assert "评分模式" not in caplog.text
+
+        with caplog.at_level(logging.DEBUG, logger="agents.crew_agents"):
+            asyncio.run(run_single_agent(llm, "value", "平安银行", "000001", "ctx"))
+        assert "value 评分模式 综合评分: ['80']" in caplog.text
+
+    def test_progress_logged_only_when_verbose(self, caplog, monkeypatch):
+        """测试进度日志仅在 CREW_VERBOSE 开启时记录，失败始终记录为 warning"""
+
+        async def fake_run_single_agent(llm, agent_type, stock_name, symbol, context):
+            if agent_type == "risk":
+                raise RuntimeError("boom")
+            return {"agent": agent_type, "result": "ok"}
+
+        def run():
+            caplog.clear()
+            with patch(
+                "agents.crew_agents.run_single_agent", side_effect=fake_run_single_agent
+            ), caplog.at_level(logging.INFO, logger="agents.crew_agents"):
+                asyncio.run(run_analyst_phase(MagicMock(), "平安银行", "000001", "ctx"))
+            return caplog.records
+
+        monkeypatch.setattr(config(), "CREW_VERBOSE", False)
+        records = run()
+        assert [r.levelno for r in records] == [logging.WARNING]
+        assert "risk 失败: boom" in records[0].getMessage()
+
+        monkeypatch.setattr(config(), "CREW_VERBOSE", True)
+        messages = [r.getMessage() for r in run()]
+        assert "[CrewAI] 开始并行执行 6 个分析任务..." in messages
+        assert any(m.startswith("[CrewAI] value 完成 (") for m in messages)
+
+    def test_run_single_agent_shared_context_prefix(self):
+        """测试数据上下文位于消息最前面，各 Agent 请求共享相同前缀"""
+        llm = MagicMock()
+        llm.acall = AsyncMock(return_value="ok")
+
+        for role in ("value", "risk"):
+            asyncio.run(run_single_agent(llm, role, "平安银行", "000001", "ctx"))
+
+        value_messages, risk_messages = (
+            call.args[0] for call in llm.acall.await_args_list
+        )
+        assert value_messages[0]["content"].startswith("数据上下文:\nctx\n\n")
+        assert risk_messages[0]["content"].startswith("数据上下文:\nctx\n\n")
+        assert "ctx" not in value_messages[1]["content"]
+
     def test_run_crew_analysis_integration(self, sample_stock_data):
         """集成测试：完整的 CrewAI 分析流程"""
         # 这个测试会调用真实的 LLM API
@@ -92,6 +92,18 @@ class TestGetAgentPrompt:
         assert "平安银行" in prompt
         assert "000001" in prompt
 
+    def test_prompt_memoized_per_day(self):
+        """测试同一天内相同参数的 Prompt 只渲染一次"""
+        from agents.enhanced_prompts import _render_agent_prompt, get_agent_prompt
+
+        _render_agent_prompt.cache_clear()
+        first = get_agent_prompt("synthesizer", "平安银行", "000001")
+        second = get_agent_prompt("synthesizer", "平安银行", "000001")
+
+        assert first is second
+        assert _render_agent_prompt.cache_info().hits == 1
+        assert datetime.now().strftime("%Y年%m月%d日") in first
+
 
 class TestParseAnalysisOutput:
     """分析输出解析测试"""
@@ -116,6 +128,19 @@ class TestParseAnalysisOutput:
         assert result["agent"] == "value"
         assert result["score"] == 85
 
+    def test_parse_dimension_scores(self):
+        """测试无综合评分时按各维度评分求平均"""
+        from agents.enhanced_prompts import parse_analysis_output
+
+        output = """
+数据完整性: **60**分
+风险量化准确性: **40**分
+"""
+
+        result = parse_analysis_output("risk", output)
+
+        assert result["score"] == 50
+
     def test_parse_with_confidence(self):
         """测试带置信度的输出解析"""
         from agents.enhanced_prompts import parse_analysis_output
@@ -190,6 +215,91 @@ class TestParseAnalysisOutput:
         assert result["confidence"] == 0
 
 
+class TestMultiRolePrompt:
+    """多角色合并调用测试"""
+
+    def test_format_multi_role_prompt(self):
+        """测试合并 Prompt 包含所有角色和一次数据上下文"""
+        from agents.enhanced_prompts import format_multi_role_prompt
+
+        prompt = format_multi_role_prompt(
+            ["value", "technical"], "平安银行", "000001", "共享上下文"
+        )
+
+        assert prompt.count("共享上下文") == 1
+        assert "分析师类型: value" in prompt
+        assert "分析师类型: technical" in prompt
+        assert '"technical"' in prompt
+
+    def test_parse_multi_role_output(self):
+        """测试解析 JSON 输出，忽略前后文本和缺失/空的角色"""
+        from agents.enhanced_prompts import parse_multi_role_output
+
+        output = '好的：\n{"value": "## 估值分析", "risk": ""} 以上。{'
+        result = parse_multi_role_output(output, ["value", "risk", "macro"])
+
+        assert result == {"value": "## 估值分析"}
+        assert parse_multi_role_output("无 JSON", ["value"]) == {}
+
+    def test_parse_multi_role_output_skips_invalid_braces(self):
+        """测试跳过前置的非 JSON 花括号，解析后续合法对象"""
+        from agents.enhanced_prompts import parse_multi_role_output
+
+        output = '模板 {role} 如下 {"macro": "## 宏观分析"}'
+        assert parse_multi_role_output(output, ["macro"]) == {"macro": "## 宏观分析"}
+
+    def test_extract_json_object_balanced_braces(self):
+        """测试按花括号配对截取对象，忽略字符串内的花括号及对象后的多余文本"""
+        from agents.enhanced_prompts import extract_json_object
+
+        output = '结果如下 {"value": "区间 {10, 20} \\" }", "n": {"a": 1}} 备注 }'
+        assert extract_json_object(output) == {
+            "value": '区间 {10, 20} " }',
+            "n": {"a": 1},
+        }
+        assert extract_json_object('未闭合 {"a": 1') is None
+
+    def test_json_object_scanner_across_chunks(self):
+        """测试增量扫描：状态跨片段保留，返回闭合 "}" 在当前片段中的下标"""
+        from agents.enhanced_prompts import JsonObjectScanner
+
+        scanner = JsonObjectScanner()
+        assert scanner.feed('说明 "引号" {"a": "} \\') == -1
+        assert scanner.feed('"", "b": {}') == -1
+        assert scanner.feed("} 之后的文本") == 0
+
+    def test_extract_json_object_unclosed_is_linear(self):
+        """测试大量未闭合的 "{" 只扫描一遍，不会退化为二次复杂度"""
+        import time
+        from agents.enhanced_prompts import extract_json_object
+
+        text = "{" * 200_000
+        started = time.perf_counter()
+        assert extract_json_object(text) is None
+        assert time.perf_counter() - started < 1.0
+
+        assert extract_json_object('{前言} {"a": 1} {"b": 2}') == {"a": 1}
+        assert extract_json_object("{" * 1000 + '"x"') is None
+
+
+class TestMultiSymbolPrompt:
+    """多股票合并调用测试"""
+
+    def test_format_multi_symbol_prompt(self):
+        """测试合并 Prompt 包含各股票的数据块和按股票代码的输出格式"""
+        from agents.enhanced_prompts import format_multi_symbol_prompt
+
+        prompt = format_multi_symbol_prompt(
+            "value",
+            [("000001", "平安银行", "上下文A"), ("600519", "贵州茅台", "上下文B")],
+        )
+
+        assert "=== SYMBOL: 000001 (平安银行) ===\n上下文A" in prompt
+        assert "=== SYMBOL: 600519 (贵州茅台) ===\n上下文B" in prompt
+        assert '"600519"' in prompt
+        assert "<股票代码>" in prompt
+
+
 class TestFormatAnalysisResult:
     """分析结果格式化测试"""
 
@@ -16,6 +16,7 @@ Run with:
 import pytest
 import os
 import litellm
+import httpx
 from unittest.mock import patch
 from dotenv import load_dotenv
 from pathlib import Path
@@ -367,6 +368,427 @@ class TestQwenProvider:
 class TestUnifiedLLM:
     """Test unified LLM wrapper"""
 
+    @pytest.fixture
+    def unified_llm(self, monkeypatch):
+        """Create a UnifiedLLM backed by a fake DeepSeek key"""
+        from utils.config import get_config
+        from agents.crew_agents import UnifiedLLM
+
+        monkeypatch.setenv("LLM_PROVIDER", "deepseek")
+        monkeypatch.setenv("DEEPSEEK_API_KEY", "sk-test-api-key-for-testing")
+        get_config.cache_clear()
+        yield UnifiedLLM(temperature=0.3)
+        get_config.cache_clear()
+
+    def test_acall_uses_async_completion(self, unified_llm):
+        """Test acall awaits litellm.acompletion instead of blocking"""
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        with patch(
+            "litellm.acompletion",
+            new=AsyncMock(return_value=create_mock_response("async ok")),
+        ) as mock_acompletion:
+            content = asyncio.run(
+                unified_llm.acall([{"role": "user", "content": "你好"}])
+            )
+
+        assert content == "async ok"
+        mock_acompletion.assert_awaited_once()
+        assert mock_acompletion.call_args.kwargs["temperature"] == 0.3
+
+    def test_acall_json_mode(self, unified_llm):
+        """Test response_format is forwarded to the provider but not to fallbacks"""
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        assert unified_llm.json_mode is True
+        json_format = {"type": "json_object"}
+        messages = [{"role": "user", "content": "输出 JSON"}]
+
+        with patch(
+            "litellm.acompletion",
+            new=AsyncMock(return_value=create_mock_response("{}")),
+        ) as mock_acompletion:
+            asyncio.run(unified_llm.acall(messages, response_format=json_format))
+            assert mock_acompletion.call_args.kwargs["response_format"] == json_format
+
+            unified_llm._fallback_targets = (("backup", {"model": "m"}),)
+            asyncio.run(
+                unified_llm._call_with_fallback(
+                    messages, "test", {"response_format": json_format}
+                )
+            )
+            assert "response_format" not in mock_acompletion.call_args.kwargs
+
+    def test_acall_per_call_temperature(self, unified_llm):
+        """Test a shared instance can serve agents with different temperatures"""
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        with patch(
+            "litellm.acompletion",
+            new=AsyncMock(return_value=create_mock_response("ok")),
+        ) as mock_acompletion:
+            asyncio.run(
+                unified_llm.acall(
+                    [{"role": "user", "content": "你好"}], temperature=0.6
+                )
+            )
+
+        assert mock_acompletion.call_args.kwargs["temperature"] == 0.6
+        assert unified_llm.temperature == 0.3
+
+    def test_acall_max_tokens(self, unified_llm):
+        """Test max_tokens is only sent when set on the call or the bound copy"""
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        messages = [{"role": "user", "content": "你好"}]
+        with patch(
+            "litellm.acompletion",
+            new=AsyncMock(return_value=create_mock_response("ok")),
+        ) as mock_acompletion:
+            asyncio.run(unified_llm.acall(messages))
+            assert "max_tokens" not in mock_acompletion.call_args.kwargs
+
+            asyncio.run(unified_llm.acall(messages, max_tokens=800))
+            assert mock_acompletion.call_args.kwargs["max_tokens"] == 800
+
+            bound = unified_llm.with_temperature(0.5, max_tokens=1500)
+            asyncio.run(bound.acall(messages))
+            assert mock_acompletion.call_args.kwargs["max_tokens"] == 1500
+
+    def test_with_temperature_shares_provider(self, unified_llm):
+        """Test with_temperature returns a bound copy without re-resolving provider"""
+        bound = unified_llm.with_temperature(0.5)
+
+        assert bound is not unified_llm
+        assert bound.temperature == 0.5
+        assert bound.model == unified_llm.model
+        assert bound.api_key == unified_llm.api_key
+        assert unified_llm.temperature == 0.3
+        assert unified_llm.with_temperature(0.5) is bound
+        assert bound.with_temperature(0.5) is bound
+        assert unified_llm.with_temperature(0.5, max_tokens=800) is not bound
+
+    def test_request_config_resolved_once(self, unified_llm, monkeypatch):
+        """Test provider config is resolved at init and not re-read per call"""
+        import asyncio
+        from unittest.mock import AsyncMock
+        from utils.config import get_config
+
+        monkeypatch.setenv("DEEPSEEK_API_KEY", "sk-changed-after-init")
+        get_config.cache_clear()
+
+        with patch(
+            "litellm.acompletion",
+            new=AsyncMock(return_value=create_mock_response("ok")),
+        ) as mock_acompletion:
+            asyncio.run(unified_llm.acall([{"role": "user", "content": "你好"}]))
+
+        assert mock_acompletion.call_args.kwargs["api_key"] == (
+            "sk-test-api-key-for-testing"
+        )
+        assert all(
+            target[1]["api_key"] != unified_llm.api_key
+            for target in unified_llm._fallback_targets
+        )
+
+    def test_token_rate_limit(self, unified_llm):
+        """Test requests reserve estimated prompt + output tokens against TPM"""
+        import asyncio
+        from unittest.mock import AsyncMock
+        from agents.crew_agents import estimate_request_tokens
+        from utils.rate_limiter import AsyncRateLimiter
+
+        messages = [
+            {"role": "system", "content": "你好"},
+            {"role": "user", "content": "abcd"},
+        ]
+        assert estimate_request_tokens(messages, 100) == 106
+
+        unified_llm._rate_limiter = None
+        unified_llm._token_limiter = AsyncRateLimiter(10000, 60.0)
+        with patch(
+            "litellm.acompletion",
+            new=AsyncMock(return_value=create_mock_response("ok")),
+        ):
+            asyncio.run(unified_llm.acall(messages, max_tokens=500))
+
+        assert unified_llm._token_limiter._level == pytest.approx(506, abs=1)
+
+    def test_api_key_pool_rotation(self, monkeypatch):
+        """Test requests rotate across pooled keys, each with its own limiter"""
+        import asyncio
+        from unittest.mock import AsyncMock
+        from utils.config import get_config
+        from agents.crew_agents import UnifiedLLM
+
+        monkeypatch.setenv("LLM_PROVIDER", "deepseek")
+        monkeypatch.setenv("DEEPSEEK_API_KEY", "sk-primary")
+        monkeypatch.setenv("DEEPSEEK_API_KEYS", "sk-primary, sk-second,sk-second")
+        get_config.cache_clear()
+        try:
+            llm = UnifiedLLM()
+        finally:
+            get_config.cache_clear()
+
+        assert len(llm._key_slots) == 2
+        assert llm._key_slots[0][1] is not llm._key_slots[1][1]
+
+        with patch(
+            "litellm.acompletion",
+            new=AsyncMock(return_value=create_mock_response("ok")),
+        ) as mock_acompletion:
+            for _ in range(3):
+                asyncio.run(llm.acall([{"role": "user", "content": "你好"}]))
+
+        used_keys = [call.kwargs["api_key"] for call in mock_acompletion.call_args_list]
+        assert used_keys == ["sk-primary", "sk-second", "sk-primary"]
+
+    def test_fallback_targets_from_env_keys(self, monkeypatch):
+        """Test fallback providers are resolved from their own configured keys"""
+        from utils.config import LLM_PROVIDERS, get_config
+        from agents.crew_agents import UnifiedLLM
+
+        monkeypatch.setenv("LLM_PROVIDER", "deepseek")
+        monkeypatch.setenv("DEEPSEEK_API_KEY", "sk-primary")
+        monkeypatch.setenv("ZHIPU_API_KEY", "sk-zhipu")
+        monkeypatch.setenv("QWEN_API_KEY", "sk-your_qwen_api_key_here")
+        monkeypatch.delenv("MINIMAX_API_KEY", raising=False)
+        get_config.cache_clear()
+        try:
+            llm = UnifiedLLM()
+        finally:
+            get_config.cache_clear()
+
+        assert [name for name, _ in llm._fallback_targets] == [
+            LLM_PROVIDERS["zhipu"]["name"]
+        ]
+        request_config = llm._fallback_targets[0][1]
+        assert request_config["api_key"] == "sk-zhipu"
+        assert request_config["api_base"] == LLM_PROVIDERS["zhipu"]["api_base"]
+
+    def test_fallback_hedges_providers(self, unified_llm):
+        """Test fallback races providers and returns the first success"""
+        import asyncio
+
+        cancelled = []
+
+        async def fake_acompletion(messages, api_key, **kwargs):
+            if api_key == "slow":
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append(api_key)
+                    raise
+            if api_key == "bad":
+                raise RuntimeError("down")
+            return create_mock_response(f"from {api_key}")
+
+        messages = [{"role": "user", "content": "你好"}]
+        unified_llm._config.LLM_FALLBACK_HEDGE = 2
+        unified_llm._fallback_targets = tuple(
+            (key, {"model": "m", "api_key": key, "api_base": "b"})
+            for key in ("slow", "fast", "bad", "last")
+        )
+
+        async def run():
+            content = await unified_llm._call_with_fallback(messages, "test", {})
+            await asyncio.sleep(0)
+            return content
+
+        with patch("litellm.acompletion", side_effect=fake_acompletion):
+            assert asyncio.run(run()) == "from fast"
+            assert cancelled == ["slow"]
+
+            unified_llm._fallback_targets = unified_llm._fallback_targets[2:]
+            assert asyncio.run(run()) == "from last"
+
+            unified_llm._fallback_targets = unified_llm._fallback_targets[:1]
+            assert "所有 LLM 提供商均失败" in asyncio.run(run())
+
+    def test_provider_validated_once(self, unified_llm):
+        """Test provider resolution validates the loaded config only once"""
+        from agents.crew_agents import UnifiedLLM
+
+        with patch.object(
+            type(unified_llm._config),
+            "validate_llm_config",
+            autospec=True,
+            return_value=(True, "sk", None),
+        ) as validate:
+            llm = UnifiedLLM(temperature=0.3)
+
+        assert validate.call_count == 1
+        assert llm.provider == "deepseek"
+
+        with patch.object(
+            type(unified_llm._config),
+            "validate_llm_config",
+            return_value=(False, None, "invalid"),
+        ), pytest.raises(ValueError):
+            UnifiedLLM(temperature=0.3)
+
+    def test_acall_retries_transient_errors(self, unified_llm):
+        """Test transient errors are retried and repeated failures open the breaker"""
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        unified_llm._config.LLM_RETRY_BASE_DELAY = 0
+        unified_llm.fallback = False
+        error = litellm.exceptions.InternalServerError(
+            "boom", llm_provider="deepseek", model="deepseek-chat"
+        )
+        messages = [{"role": "user", "content": "你好"}]
+
+        with patch(
+            "litellm.acompletion",
+            new=AsyncMock(side_effect=[error, create_mock_response("ok")]),
+        ) as mock_acompletion:
+            assert asyncio.run(unified_llm.acall(messages)) == "ok"
+        assert mock_acompletion.await_count == 2
+
+        unified_llm._circuit_breaker.failure_threshold = 1
+        with patch(
+            "litellm.acompletion", new=AsyncMock(side_effect=error)
+        ) as mock_acompletion:
+            with pytest.raises(litellm.exceptions.InternalServerError):
+                asyncio.run(unified_llm.acall(messages))
+            assert mock_acompletion.await_count == 3
+
+            result = asyncio.run(unified_llm.acall(messages))
+            assert result.startswith("无法生成分析")
+            assert mock_acompletion.await_count == 3
+
+    def test_astream_mid_stream_error_trips_breaker(self, unified_llm):
+        """Test errors raised after the first chunk count as breaker failures"""
+        import asyncio
+        from types import SimpleNamespace
+        from unittest.mock import AsyncMock
+
+        error = litellm.exceptions.APIConnectionError(
+            "reset", llm_provider="deepseek", model="deepseek-chat"
+        )
+
+        async def broken_stream():
+            delta = SimpleNamespace(content="部分")
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+            raise error
+
+        async def consume():
+            messages = [{"role": "user", "content": "你好"}]
+            return [delta async for delta in unified_llm.astream(messages)]
+
+        unified_llm._circuit_breaker.failure_threshold = 1
+        with patch("litellm.acompletion", new=AsyncMock(return_value=broken_stream())):
+            with pytest.raises(litellm.exceptions.APIConnectionError):
+                asyncio.run(consume())
+
+        assert unified_llm._circuit_breaker.state == "open"
+
+    def test_retry_delay_jitter_and_retry_after(self, unified_llm):
+        """Test backoff adds bounded jitter and honors Retry-After"""
+        import httpx
+
+        unified_llm._config.LLM_RETRY_BASE_DELAY = 1.0
+        unified_llm._config.LLM_RETRY_MAX_DELAY = 10.0
+        error = litellm.exceptions.InternalServerError(
+            "boom", llm_provider="deepseek", model="deepseek-chat"
+        )
+        delays = {unified_llm._retry_delay(1, error) for _ in range(20)}
+        assert all(2.0 <= d <= 3.0 for d in delays)
+        assert len(delays) > 1
+        assert unified_llm._retry_delay(5, error) == 10.0
+
+        response = httpx.Response(
+            429,
+            headers={"retry-after": "3"},
+            request=httpx.Request("POST", "https://api.deepseek.com"),
+        )
+        rate_limited = litellm.exceptions.RateLimitError(
+            "slow down",
+            llm_provider="deepseek",
+            model="deepseek-chat",
+            response=response,
+        )
+        assert unified_llm._retry_delay(0, rate_limited) == 3.0
+
+    def test_call_is_sync_shim(self, unified_llm):
+        """Test sync call delegates to acall"""
+        from unittest.mock import AsyncMock
+
+        with patch(
+            "litellm.acompletion",
+            new=AsyncMock(return_value=create_mock_response("sync ok")),
+        ):
+            assert unified_llm.call([{"role": "user", "content": "你好"}]) == "sync ok"
+
+    def test_call_reuses_one_event_loop(self, unified_llm):
+        """Test repeated sync calls (also from inside a running loop) share a loop"""
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        loops = []
+
+        async def fake_acompletion(**kwargs):
+            loops.append(asyncio.get_running_loop())
+            return create_mock_response("sync ok")
+
+        async def call_inside_loop():
+            return unified_llm.call([{"role": "user", "content": "你好"}])
+
+        with patch("litellm.acompletion", new=AsyncMock(side_effect=fake_acompletion)):
+            unified_llm.call([{"role": "user", "content": "你好"}])
+            unified_llm.call([{"role": "user", "content": "你好"}])
+            assert asyncio.run(call_inside_loop()) == "sync ok"
+
+        assert len(loops) == 3
+        assert loops[0] is loops[1] is loops[2]
+        assert not loops[0].is_closed()
+
+    def test_close_http_clients(self, monkeypatch):
+        """Test shared pools are closed, cached clients flushed, and reinstallable"""
+        import asyncio
+        from agents.crew_agents import close_http_clients, init_http_clients
+
+        monkeypatch.setattr(litellm, "client_session", None)
+        monkeypatch.setattr(litellm, "aclient_session", None)
+        init_http_clients()
+        sync_client, async_client = litellm.client_session, litellm.aclient_session
+
+        with patch.object(
+            litellm.in_memory_llm_clients_cache, "flush_cache"
+        ) as flush_cache:
+            asyncio.run(close_http_clients())
+
+        flush_cache.assert_called_once()
+        assert sync_client.is_closed and async_client.is_closed
+        assert litellm.client_session is None and litellm.aclient_session is None
+        init_http_clients()
+        assert litellm.aclient_session is not None
+        asyncio.run(close_http_clients())
+
+    def test_prewarm_http_clients(self, monkeypatch):
+        """Test prewarm sends one HEAD to the provider and ignores failures"""
+        import asyncio
+        from unittest.mock import AsyncMock, MagicMock
+        from agents import crew_agents
+
+        session = MagicMock()
+        session.head = AsyncMock()
+        monkeypatch.setattr(litellm, "aclient_session", session)
+        monkeypatch.setattr(
+            crew_agents, "get_llm", lambda: MagicMock(api_base="https://llm.test/v1")
+        )
+
+        asyncio.run(crew_agents.prewarm_http_clients())
+        session.head.assert_awaited_once_with("https://llm.test/v1")
+
+        session.head.side_effect = httpx.ConnectError("offline")
+        asyncio.run(crew_agents.prewarm_http_clients())
+
     def test_get_llm_config(self):
         """Test get_llm_config returns correct structure"""
         from utils.config import config
@@ -0,0 +1,51 @@
+"""
+异步速率限制测试
+"""
+
+import asyncio
+import time
+
+from utils.rate_limiter import AsyncRateLimiter
+
+
+class TestAsyncRateLimiter:
+    """漏桶限流器测试类"""
+
+    def test_burst_within_capacity(self):
+        """测试容量内的请求立即通过"""
+        limiter = AsyncRateLimiter(5, 60.0)
+
+        async def burst():
+            for _ in range(5):
+                await limiter.acquire()
+
+        start = time.monotonic()
+        asyncio.run(burst())
+        assert time.monotonic() - start < 0.1
+        assert not limiter.has_capacity()
+
+    def test_waits_when_full(self):
+        """测试桶满时等待漏出后再放行"""
+        limiter = AsyncRateLimiter(2, 0.2)
+
+        async def over_capacity():
+            for _ in range(3):
+                async with limiter:
+                    pass
+
+        start = time.monotonic()
+        asyncio.run(over_capacity())
+        assert time.monotonic() - start >= 0.08
+
+    def test_oversized_amount_waits_for_empty_bucket(self):
+        """测试超过桶容量的请求在桶清空后放行，而不是永久等待"""
+        limiter = AsyncRateLimiter(10, 0.2)
+
+        async def oversized():
+            await limiter.acquire(4)
+            await limiter.acquire(50)
+
+        start = time.monotonic()
+        asyncio.run(asyncio.wait_for(oversized(), timeout=1))
+        assert time.monotonic() - start >= 0.06
+        assert not limiter.has_capacity()
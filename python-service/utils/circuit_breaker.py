@@ -0,0 +1,74 @@
+"""
+熔断器模块
+
+LLM 提供商持续故障时（连续多次重试后仍失败），在冷却期内直接跳过对该提供商的调用，
+避免每个 Agent 都各自经历一轮完整的重试等待。冷却期结束后放行一次试探调用，
+成功则恢复，失败则重新进入冷却期。
+"""
+
+import time
+
+
+class CircuitBreaker:
+    """
+    连续失败计数熔断器
+
+    状态:
+    - closed: 正常放行
+    - open: 连续失败达到阈值，冷却期内拒绝调用
+    - half_open: 冷却期已过，只放行一个试探调用，其余调用在试探结束前仍被拒绝
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        初始化熔断器
+
+        Args:
+            failure_threshold: 触发熔断的连续失败次数
+            reset_timeout: 熔断冷却时间（秒）
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        # 半开状态下进行中的试探调用的开始时间（试探未上报结果时，
+        # 超过 reset_timeout 后允许重新试探，避免熔断器永远无法恢复）
+        self._probe_started_at = None
+
+    @property
+    def state(self) -> str:
+        """当前状态: closed / open / half_open"""
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        """是否允许发起调用（半开状态下只放行一个进行中的试探调用）"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open":
+            return False
+        now = time.monotonic()
+        if (
+            self._probe_started_at is not None
+            and now - self._probe_started_at < self.reset_timeout
+        ):
+            return False
+        self._probe_started_at = now
+        return True
+
+    def record_success(self) -> None:
+        """记录成功调用，重置失败计数"""
+        self._failures = 0
+        self._opened_at = None
+        self._probe_started_at = None
+
+    def record_failure(self) -> None:
+        """记录失败调用，达到阈值（或试探调用失败）时打开熔断"""
+        self._probe_started_at = None
+        self._failures += 1
+        if self._failures >= self.failure_threshold or self._opened_at is not None:
+            self._opened_at = time.monotonic()
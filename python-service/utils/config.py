@@ -10,8 +10,9 @@
 - 阿里千问 (qwen-turbo/qwen-plus/qwen-max)
 """
 
+import bisect
 import os
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 from functools import lru_cache
 
 
@@ -22,6 +23,8 @@ LLM_PROVIDERS = {
         "models": ["deepseek-chat"],
         "api_base": "https://api.deepseek.com/v1",
         "env_key": "DEEPSEEK_API_KEY",
+        # 支持 response_format={"type": "json_object"}
+        "json_mode": True,
     },
     "minimax": {
         "name": "MiniMax",
@@ -34,12 +37,14 @@ LLM_PROVIDERS = {
         "models": ["glm-4"],
         "api_base": "https://open.bigmodel.cn/api/paas/v4",
         "env_key": "ZHIPU_API_KEY",
+        "json_mode": True,
     },
     "qwen": {
         "name": "阿里千问 (Qwen)",
         "models": ["qwen-turbo", "qwen-plus", "qwen-max"],
         "api_base": "https://dashscope-intl.aliyuncs.com/compatible-mode/v1",
         "env_key": "QWEN_API_KEY",
+        "json_mode": True,
     },
 }
 
@@ -54,6 +59,16 @@ DEFAULT_MODEL_MAP = {
 # 默认提供商
 DEFAULT_PROVIDER = "deepseek"
 
+# .env.example 中的占位 API Key（视为未配置）
+PLACEHOLDER_API_KEYS = frozenset(
+    {
+        "sk-your_deepseek_api_key_here",
+        "sk-your_minimax_api_key_here",
+        "sk-your_zhipu_api_key_here",
+        "sk-your_qwen_api_key_here",
+    }
+)
+
 
 class Config:
     """应用配置类"""
@@ -69,10 +84,71 @@ class Config:
     LLM_PROVIDER: str = DEFAULT_PROVIDER
     LLM_MODEL: str = DEFAULT_MODEL_MAP[DEFAULT_PROVIDER]
     LLM_API_KEY: Optional[str] = None
+    # 同一提供商的全部 API Key（主 Key + {PROVIDER}_API_KEYS），请求在各 Key 间轮换
+    LLM_API_KEYS: Tuple[str, ...] = ()
+    # 各提供商已配置的 API Key（故障转移时使用，不含占位符）
+    PROVIDER_API_KEYS: Dict[str, str] = {}
     LLM_API_BASE: str = LLM_PROVIDERS[DEFAULT_PROVIDER]["api_base"]
     LLM_TEMPERATURE: float = 0.5
     LLM_MAX_TOKENS: int = 2000
 
+    # LLM HTTP 连接池配置（所有 Agent 共享同一连接池）
+    LLM_HTTP_MAX_CONNECTIONS: int = 32
+    LLM_HTTP_MAX_KEEPALIVE: int = 16
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    LLM_HTTP_TIMEOUT: float = 60.0
+    # HTTP/2：同一提供商的并发请求复用一条连接（需安装 h2，未安装时回退到 HTTP/1.1）
+    LLM_HTTP2: bool = True
+    # 服务启动时预热到主提供商的连接，首个分析请求无需再进行 TCP + TLS 握手
+    LLM_PREWARM: bool = True
+
+    # LLM 出站请求限流（每分钟请求数，0 表示不限流）
+    LLM_REQUESTS_PER_MINUTE: int = 500
+    # 每分钟 token 数（输入 + 输出上限，按字符估算），0 表示不限流
+    LLM_TOKENS_PER_MINUTE: int = 0
+
+    # LLM 瞬时错误（429/5xx/连接错误）重试与熔断配置
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BASE_DELAY: float = 1.0
+    LLM_RETRY_MAX_DELAY: float = 10.0
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    LLM_CIRCUIT_RESET_TIMEOUT: float = 30.0
+    # 故障转移时同时请求的备用提供商数量（取最先成功的响应，1 表示逐个尝试）
+    LLM_FALLBACK_HEDGE: int = 2
+
+    # 多股票批量分析的最大并发数
+    ANALYSIS_BATCH_CONCURRENCY: int = 8
+    # 单次批量分析请求允许的最大股票数（超出返回 413）
+    ANALYSIS_BATCH_MAX_SYMBOLS: int = 10
+
+    # 阻塞调用（如 pymongo 保存）使用的共享线程池大小
+    BLOCKING_POOL_SIZE: int = 12
+
+    # Agent 响应缓存配置
+    AGENT_CACHE_ENABLED: bool = True
+    AGENT_CACHE_DIR: str = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache"
+    )
+
+    # CrewAI 逐步执行日志（Agent verbose 输出及调试打印），生产环境默认关闭
+    CREW_VERBOSE: bool = False
+
+    # 合并分析调用：6 个分析 Agent 共用一次 LLM 调用（节省重复上下文 token，
+    # 但单次输出更长，端到端耗时通常高于并发调用）
+    AGENT_BATCH_ANALYSTS: bool = False
+
+    # 批量分析时每次 LLM 调用合并的股票数：同一分析角色的多只股票共用一次调用，
+    # 请求数从 6N 降为约 6·⌈N/k⌉（1 表示逐股票调用；超过 8-16 后收益递减）
+    ANALYSIS_ROWS_PER_PROMPT: int = 1
+
+    # synthesizer 流式输出：首个 token 到达即推送给调用方，关闭时一次性返回完整报告
+    SYNTHESIS_STREAM: bool = True
+
+    # 推测综合：完成的分析Agent达到该数量即提前开始综合（0 表示关闭），
+    # 其余 Agent 完成后综合评分变化不超过 MAX_DELTA 时直接采用推测结果
+    SPECULATIVE_SYNTHESIS_QUORUM: int = 0
+    SPECULATIVE_SYNTHESIS_MAX_DELTA: float = 5.0
+
     # CORS 配置
     CORS_ALLOW_ORIGINS: List[str] = []
     CORS_ALLOW_CREDENTIALS: bool = True
@@ -124,6 +200,7 @@ class Config:
     def __init__(self):
         """从环境变量加载配置"""
         self._load_from_env()
+        self._build_recommendation_cutoffs()
 
     def _load_from_env(self):
         """从环境变量加载配置"""
@@ -134,6 +211,13 @@ class Config:
             self.API_PORT = int(port)
         self.API_DEBUG = os.getenv("API_DEBUG", str(self.API_DEBUG)).lower() == "true"
 
+        # 各提供商的 API Key（故障转移时使用）
+        self.PROVIDER_API_KEYS = {}
+        for provider_id, provider_config in LLM_PROVIDERS.items():
+            api_key = os.getenv(provider_config["env_key"])
+            if api_key and api_key not in PLACEHOLDER_API_KEYS:
+                self.PROVIDER_API_KEYS[provider_id] = api_key
+
         # LLM 提供商配置
         provider = os.getenv("LLM_PROVIDER", DEFAULT_PROVIDER).lower()
         if provider in LLM_PROVIDERS:
@@ -152,8 +236,9 @@ class Config:
 
             # 获取 API key
             env_key = LLM_PROVIDERS[provider]["env_key"]
-            self.LLM_API_KEY = os.getenv(env_key) or os.getenv(
-                f"{provider.upper()}_API_KEY"
+            self._set_api_keys(
+                provider,
+                os.getenv(env_key) or os.getenv(f"{provider.upper()}_API_KEY"),
             )
 
         # LLM 其他配置
@@ -165,6 +250,94 @@ class Config:
         if max_tokens:
             self.LLM_MAX_TOKENS = int(max_tokens)
 
+        max_connections = os.getenv("LLM_HTTP_MAX_CONNECTIONS")
+        if max_connections:
+            self.LLM_HTTP_MAX_CONNECTIONS = int(max_connections)
+
+        max_keepalive = os.getenv("LLM_HTTP_MAX_KEEPALIVE")
+        if max_keepalive:
+            self.LLM_HTTP_MAX_KEEPALIVE = int(max_keepalive)
+
+        keepalive_expiry = os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY")
+        if keepalive_expiry:
+            self.LLM_HTTP_KEEPALIVE_EXPIRY = float(keepalive_expiry)
+
+        http_timeout = os.getenv("LLM_HTTP_TIMEOUT")
+        if http_timeout:
+            self.LLM_HTTP_TIMEOUT = float(http_timeout)
+
+        self.LLM_HTTP2 = os.getenv("LLM_HTTP2", str(self.LLM_HTTP2)).lower() == "true"
+        self.LLM_PREWARM = (
+            os.getenv("LLM_PREWARM", str(self.LLM_PREWARM)).lower() == "true"
+        )
+
+        requests_per_minute = os.getenv("LLM_REQUESTS_PER_MINUTE")
+        if requests_per_minute:
+            self.LLM_REQUESTS_PER_MINUTE = int(requests_per_minute)
+
+        tokens_per_minute = os.getenv("LLM_TOKENS_PER_MINUTE")
+        if tokens_per_minute:
+            self.LLM_TOKENS_PER_MINUTE = int(tokens_per_minute)
+
+        max_llm_retries = os.getenv("LLM_MAX_RETRIES")
+        if max_llm_retries:
+            self.LLM_MAX_RETRIES = int(max_llm_retries)
+
+        retry_base_delay = os.getenv("LLM_RETRY_BASE_DELAY")
+        if retry_base_delay:
+            self.LLM_RETRY_BASE_DELAY = float(retry_base_delay)
+
+        circuit_threshold = os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD")
+        if circuit_threshold:
+            self.LLM_CIRCUIT_FAILURE_THRESHOLD = int(circuit_threshold)
+
+        circuit_reset = os.getenv("LLM_CIRCUIT_RESET_TIMEOUT")
+        if circuit_reset:
+            self.LLM_CIRCUIT_RESET_TIMEOUT = float(circuit_reset)
+
+        fallback_hedge = os.getenv("LLM_FALLBACK_HEDGE")
+        if fallback_hedge:
+            self.LLM_FALLBACK_HEDGE = int(fallback_hedge)
+
+        batch_concurrency = os.getenv("ANALYSIS_BATCH_CONCURRENCY")
+        if batch_concurrency:
+            self.ANALYSIS_BATCH_CONCURRENCY = int(batch_concurrency)
+
+        batch_max_symbols = os.getenv("ANALYSIS_BATCH_MAX_SYMBOLS")
+        if batch_max_symbols:
+            self.ANALYSIS_BATCH_MAX_SYMBOLS = int(batch_max_symbols)
+
+        rows_per_prompt = os.getenv("ANALYSIS_ROWS_PER_PROMPT")
+        if rows_per_prompt:
+            self.ANALYSIS_ROWS_PER_PROMPT = int(rows_per_prompt)
+
+        blocking_pool_size = os.getenv("BLOCKING_POOL_SIZE")
+        if blocking_pool_size:
+            self.BLOCKING_POOL_SIZE = int(blocking_pool_size)
+
+        # Agent 响应缓存配置
+        self.AGENT_CACHE_ENABLED = (
+            os.getenv("AGENT_CACHE_ENABLED", str(self.AGENT_CACHE_ENABLED)).lower()
+            == "true"
+        )
+        self.AGENT_CACHE_DIR = os.getenv("AGENT_CACHE_DIR", self.AGENT_CACHE_DIR)
+        self.CREW_VERBOSE = (
+            os.getenv("CREW_VERBOSE", str(self.CREW_VERBOSE)).lower() == "true"
+        )
+        self.AGENT_BATCH_ANALYSTS = (
+            os.getenv("AGENT_BATCH_ANALYSTS", str(self.AGENT_BATCH_ANALYSTS)).lower()
+            == "true"
+        )
+        self.SYNTHESIS_STREAM = (
+            os.getenv("SYNTHESIS_STREAM", str(self.SYNTHESIS_STREAM)).lower() == "true"
+        )
+        speculative_quorum = os.getenv("SPECULATIVE_SYNTHESIS_QUORUM")
+        if speculative_quorum:
+            self.SPECULATIVE_SYNTHESIS_QUORUM = int(speculative_quorum)
+        speculative_delta = os.getenv("SPECULATIVE_SYNTHESIS_MAX_DELTA")
+        if speculative_delta:
+            self.SPECULATIVE_SYNTHESIS_MAX_DELTA = float(speculative_delta)
+
         # CORS 配置
         cors_origins = os.getenv("CORS_ALLOW_ORIGINS")
         if cors_origins:
@@ -194,13 +367,7 @@ class Config:
             return False, None, f"{self.LLM_PROVIDER.upper()}_API_KEY 未配置"
 
         # 检查占位符
-        placeholders = [
-            "sk-your_deepseek_api_key_here",
-            "sk-your_minimax_api_key_here",
-            "sk-your_zhipu_api_key_here",
-            "sk-your_qwen_api_key_here",
-        ]
-        if api_key in placeholders:
+        if api_key in PLACEHOLDER_API_KEYS:
             return (
                 False,
                 None,
@@ -221,10 +388,22 @@ class Config:
             else:
                 self.LLM_MODEL = models_list[0] if models_list else "default"
             env_key = LLM_PROVIDERS[provider]["env_key"]
-            self.LLM_API_KEY = os.getenv(env_key)
+            self._set_api_keys(provider, os.getenv(env_key))
             return True
         return False
 
+    def _set_api_keys(self, provider: str, primary: Optional[str]) -> None:
+        """设置主 API Key 及 {PROVIDER}_API_KEYS（逗号分隔）中的额外 Key
+
+        多个 Key 去重后保持顺序；未配置主 Key 时使用列表中的第一个。
+        """
+        extra = os.getenv(f"{provider.upper()}_API_KEYS", "")
+        keys = [primary] + [key.strip() for key in extra.split(",")]
+        self.LLM_API_KEYS = tuple(dict.fromkeys(key for key in keys if key))
+        self.LLM_API_KEY = primary or (
+            self.LLM_API_KEYS[0] if self.LLM_API_KEYS else None
+        )
+
     def get_available_providers(self) -> List[Dict]:
         """获取可用的提供商列表"""
         return [
@@ -232,12 +411,18 @@ class Config:
             for k, v in LLM_PROVIDERS.items()
         ]
 
+    def _build_recommendation_cutoffs(self):
+        """将推荐等级映射预处理为升序分数线和对应标签，供二分查找使用"""
+        thresholds = sorted(self.RECOMMENDATION_MAP)
+        self._recommendation_cutoffs = tuple(thresholds)
+        self._recommendation_labels = ("sell",) + tuple(
+            self.RECOMMENDATION_MAP[t] for t in thresholds
+        )
+
     def get_recommendation(self, score: float) -> str:
-        """根据分数获取推荐等级"""
-        for threshold, recommendation in sorted(self.RECOMMENDATION_MAP.items()):
-            if score >= threshold:
-                return recommendation
-        return "sell"
+        """根据分数获取推荐等级（达到的最高分数线对应的等级，低于所有分数线为 sell）"""
+        index = bisect.bisect_right(self._recommendation_cutoffs, score)
+        return self._recommendation_labels[index]
 
     def get_agent_weight(self, agent_role: str) -> float:
         """获取 Agent 权重"""
@@ -0,0 +1,63 @@
+"""
+异步速率限制模块
+
+为出站 LLM 请求提供漏桶式限流，保证单位时间内的请求数不超过提供商配额。
+与 main.py 中按客户端限制入站请求的 RateLimiter 不同，这里的等待是异步的，
+超出配额的调用会排队等待而不是被拒绝。
+"""
+
+import asyncio
+import time
+
+
+class AsyncRateLimiter:
+    """
+    异步漏桶限流器
+
+    桶容量为 max_rate，按 max_rate / time_period 的速度匀速漏出；
+    acquire 时若桶已满则异步等待，不阻塞事件循环。
+    """
+
+    def __init__(self, max_rate: float, time_period: float = 60.0):
+        """
+        初始化限流器
+
+        Args:
+            max_rate: 时间窗口内允许的最大请求数
+            time_period: 时间窗口（秒）
+        """
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._rate_per_sec = max_rate / time_period
+        self._level = 0.0
+        self._last_check = time.monotonic()
+
+    def _leak(self) -> None:
+        """按流逝时间漏出桶内容量"""
+        now = time.monotonic()
+        elapsed = now - self._last_check
+        self._level = max(0.0, self._level - elapsed * self._rate_per_sec)
+        self._last_check = now
+
+    def has_capacity(self, amount: float = 1) -> bool:
+        """当前是否可以立即获取指定容量"""
+        self._leak()
+        return self._level + amount <= self.max_rate
+
+    async def acquire(self, amount: float = 1) -> None:
+        """获取容量，桶满时等待至有足够空间
+
+        超过桶容量的请求按桶容量计，等待桶清空后放行而不是永久等待。
+        """
+        amount = min(amount, self.max_rate)
+        while not self.has_capacity(amount):
+            wait = (self._level + amount - self.max_rate) / self._rate_per_sec
+            await asyncio.sleep(max(wait, 0.001))
+        self._level += amount
+
+    async def __aenter__(self) -> "AsyncRateLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        return None